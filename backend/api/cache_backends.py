@@ -0,0 +1,172 @@
+"""
+Backend cache-i i përbashkët për të gjithë workers në të njëjtin host.
+
+LocMemCache mban të dhënat brenda procesit, prandaj me disa workers (gunicorn)
+rritja e versionit te cache_utils ndikon vetëm worker-in që trajtoi shkrimin.
+Ky backend i ruan çelësat në një skedar SQLite lokal (WAL), që e ndajnë të gjithë
+proceset, pa kërkuar shërbim të jashtëm. `incr` dhe `add` janë atomike mes proceseve.
+
+Përdorimi te settings.py:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache_backends.SQLiteSharedCache',
+            'LOCATION': '/var/tmp/food_delivery_cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+CULL_PROBABILITY = 0.01 # Pastrimi bëhet rrallë, jo në çdo shkrim
+BUSY_TIMEOUT = 5 # sekonda që pret një proces kur një tjetër po shkruan
+
+
+class SQLiteSharedCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local() # Një lidhje për çdo thread
+        self._schema_ready = False
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # Lidhjet SQLite nuk duhet të kalojnë përmes fork() (p.sh. preload te gunicorn)
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            if not self._schema_ready:
+                conn.execute(
+                    'CREATE TABLE IF NOT EXISTS cache_entries ('
+                    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+                )
+                conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)')
+                self._schema_ready = True
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _loads(self, blob):
+        return pickle.loads(blob)
+
+    def _maybe_cull(self, conn):
+        if random.random() >= CULL_PROBABILITY:
+            return
+        conn.execute('DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (time.time(),))
+        (count,) = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()
+        if count > self._max_entries:
+            cull_num = count // self._cull_frequency if self._cull_frequency else count
+            # Hiqen hyrjet që skadojnë më shpejt (ato pa skadim mbeten të fundit)
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (cull_num,),
+            )
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            return default
+        return self._loads(row[0])
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ','.join('?' * len(key_map))
+        rows = self._connection().execute(
+            f'SELECT key, value FROM cache_entries WHERE key IN ({placeholders}) '
+            'AND (expires IS NULL OR expires > ?)',
+            (*key_map, time.time()),
+        ).fetchall()
+        return {key_map[key]: self._loads(value) for key, value in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._dumps(value), self.get_backend_timeout(timeout)),
+        )
+        self._maybe_cull(conn)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        conn = self._connection()
+        # Një INSERT i vetëm: shkruan vetëm nëse çelësi mungon ose ka skaduar
+        cursor = conn.execute(
+            'INSERT INTO cache_entries (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?',
+            (key, self._dumps(value), self.get_backend_timeout(timeout), now),
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        # BEGIN IMMEDIATE merr lock-un e shkrimit, kështu lexim-shtim-shkrim është atomik mes proceseve
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = self._loads(row[0]) + delta
+            conn.execute('UPDATE cache_entries SET value = ? WHERE key = ?', (self._dumps(new_value), key))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return new_value
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        # Lidhja mbahet hapur mes kërkesave; mbyllet vetëm kur mbyllet procesi
+        pass
@@ -0,0 +1,126 @@
+"""
+Numëruesit e cache-it (hit/miss, mbushje, evictions, invalidime sipas shkakut) për çdo namespace.
+
+Çdo proces i numëron në memorie (pa I/O në rrugën e kërkesës) dhe i shton periodikisht
+te cache-i i përbashkët me `incr`, që endpoint-i i adminit të shohë totalin e të gjithë workers.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+FLUSH_INTERVAL = getattr(settings, 'API_CACHE_METRICS_FLUSH_INTERVAL', 10) # sekonda
+KEY_PREFIX = 'cache_metrics_'
+INDEX_KEY = f'{KEY_PREFIX}index' # Emrat e të gjithë numëruesve të njohur
+
+HITS = 'hits'
+MISSES = 'misses'
+FILLS = 'fills'
+FILL_MS = 'fill_ms'
+STALE_SERVED = 'stale_served'
+EVICTIONS = 'evictions'
+INVALIDATIONS = 'invalidations'
+
+TRIGGER_DIRECT = 'direct' # Invalidim i thirrur drejtpërdrejt nga kodi, jo nga një sinjal
+
+
+def _add_to_counter(key, delta, attempts=3):
+    """
+    cache.add nëse çelësi mungon, përndryshe cache.incr. Nëse çelësi skadon ose nxirret mes dy
+    thirrjeve, incr ngre ValueError: provohet sërish add. flush() thirret në rrugën e kërkesës.
+    """
+    for _ in range(attempts):
+        if cache.add(key, delta, timeout=None):
+            return
+        try:
+            cache.incr(key, delta)
+            return
+        except ValueError:
+            continue
+
+
+class CacheMetrics:
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self._pending = Counter() # (namespace, counter, trigger) -> delta që s'është shtuar ende
+        self._known = set()
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + flush_interval
+
+    def record(self, namespace, counter, amount=1, trigger=None):
+        with self._lock:
+            self._pending[(namespace, counter, trigger)] += amount
+            due = time.monotonic() >= self._next_flush
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Shton numëruesit e këtij procesi te cache-i i përbashkët."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._known |= set(pending)
+            known = set(self._known)
+            self._next_flush = time.monotonic() + self.flush_interval
+        if not pending:
+            return
+        for name, delta in pending.items():
+            _add_to_counter(_counter_key(*name), delta)
+        # Indeksi mund të humbasë një emër nga një shkrim paralel; plotësohet në flush-in tjetër
+        index = cache.get(INDEX_KEY) or set()
+        if not known <= index:
+            cache.set(INDEX_KEY, index | known, timeout=None)
+
+    def snapshot(self):
+        """Kthen totalin e të gjithë proceseve, të grupuar sipas namespace."""
+        self.flush()
+        names = sorted(cache.get(INDEX_KEY) or set(), key=str)
+        values = cache.get_many([_counter_key(*name) for name in names])
+        result = {}
+        for namespace, counter, trigger in names:
+            value = values.get(_counter_key(namespace, counter, trigger), 0)
+            stats = result.setdefault(namespace, {HITS: 0, MISSES: 0, FILLS: 0, FILL_MS: 0, STALE_SERVED: 0, EVICTIONS: 0, INVALIDATIONS: {}})
+            if counter == INVALIDATIONS:
+                stats[INVALIDATIONS][trigger] = value
+            else:
+                stats[counter] = value
+        for stats in result.values():
+            lookups = stats[HITS] + stats[MISSES]
+            stats['hit_ratio'] = round(stats[HITS] / lookups, 4) if lookups else None
+            stats['avg_fill_ms'] = round(stats[FILL_MS] / stats[FILLS], 2) if stats[FILLS] else None
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._known = set()
+        names = cache.get(INDEX_KEY) or set()
+        cache.delete_many([_counter_key(*name) for name in names] + [INDEX_KEY])
+
+
+def _counter_key(namespace, counter, trigger):
+    return f"{KEY_PREFIX}{namespace}_{counter}" + (f"_{trigger}" if trigger else '')
+
+
+metrics = CacheMetrics(FLUSH_INTERVAL)
+
+def record_hit(namespace):
+    metrics.record(namespace, HITS)
+
+def record_miss(namespace):
+    metrics.record(namespace, MISSES)
+
+def record_fill(namespace, seconds):
+    metrics.record(namespace, FILLS)
+    metrics.record(namespace, FILL_MS, round(seconds * 1000))
+
+def record_stale_served(namespace):
+    metrics.record(namespace, STALE_SERVED)
+
+def record_eviction(namespace):
+    metrics.record(namespace, EVICTIONS)
+
+def record_invalidation(namespace, trigger):
+    metrics.record(namespace, INVALIDATIONS, trigger=trigger)
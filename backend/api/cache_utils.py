@@ -1,26 +1,279 @@
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connections
+from collections import OrderedDict
 import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from urllib.parse import urlencode
+from . import cache_metrics
+from .db_routing import use_primary
 
-# --- Cuisine Types List Cache ---
-CUISINE_TYPES_LIST_VERSION_KEY = 'cuisine_types_list_version_v1' # Shtova _v1 për të lejuar ndryshime në strukturë pa konflikte
-CUISINE_TYPES_LIST_CACHE_KEY_PREFIX = 'cuisine_types_list_data_v'
+logger = logging.getLogger(__name__)
 
-def get_cuisine_types_list_cache_version():
-    version = cache.get(CUISINE_TYPES_LIST_VERSION_KEY)
+# --- Namespaces e cache-it ---
+# Çdo namespace ka një çelës versioni. Invalidimi bëhet duke rritur versionin,
+# kështu që çelësat e vjetër thjesht nuk lexohen më dhe skadojnë vetë.
+NS_CUISINE_TYPES_LIST = 'cuisine_types_list'
+NS_RESTAURANTS_LIST_PUBLIC = 'restaurants_list_public'
+NS_RESTAURANT_DETAIL = 'restaurant_detail' # Namespace me scope (një version për restorant)
+NS_USER_ORDERS = 'user_orders' # Namespace me scope (një version për përdorues)
+NS_RESTAURANT_MENU = 'restaurant_menu' # Namespace me scope (një version për restorant)
+
+
+# --- L1: cache lokal për proces (LRU) përpara cache-it të konfiguruar të Django-s ---
+# Çdo lexim i cache-it kërkon dy round-trip (versioni + të dhënat). L1 i mban të dyja në
+# memorien e procesit për një kohë të shkurtër:
+#   - versionet mbahen maksimumi L1_VERSION_TTL sekonda, kështu që një invalidim i bërë
+#     nga një proces tjetër shihet nga ky proces brenda këtij intervali (staleness i kufizuar);
+#     procesi që e rrit versionin e sheh menjëherë.
+#   - të dhënat ruhen nën çelësa që përmbajnë versionin, pra nuk ndryshojnë kurrë;
+#     L1_PAYLOAD_TTL kufizon vetëm sa gjatë mbahen në memorie.
+# Vlerat që kthehen nga L1 ndahen mes kërkesave dhe nuk duhet të modifikohen.
+L1_MAX_ENTRIES = getattr(settings, 'API_CACHE_L1_MAX_ENTRIES', 1000)
+L1_VERSION_TTL = getattr(settings, 'API_CACHE_L1_VERSION_TTL', 2) # sekonda
+L1_PAYLOAD_TTL = getattr(settings, 'API_CACHE_L1_PAYLOAD_TTL', 30) # sekonda
+
+
+class LocalLRUCache:
+    """
+    Cache i thjeshtë LRU, i sigurt për thread-e, me TTL për çdo hyrje dhe numërues hit/miss.
+    `on_evict(key)` thirret (jashtë lock-ut) për çdo hyrje që nxirret për të liruar vend.
+    """
+
+    def __init__(self, max_entries, default_ttl, on_evict=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.default_ttl if ttl is None else ttl)
+        evicted = []
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted.append(self._data.popitem(last=False)[0])
+                self.evictions += 1
+        if self.on_evict:
+            for evicted_key in evicted:
+                self.on_evict(evicted_key)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data), 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            }
+
+
+def _namespace_of_key(key):
+    # Prefikset e çelësave (versione dhe të dhëna) janë të definuara më poshtë, për çdo namespace
+    for prefixes, namespace in _KEY_PREFIX_NAMESPACES:
+        if key.startswith(prefixes):
+            return namespace
+    return 'other'
+
+local_cache = LocalLRUCache(
+    L1_MAX_ENTRIES, L1_PAYLOAD_TTL,
+    on_evict=lambda key: cache_metrics.record_eviction(_namespace_of_key(key)),
+)
+
+def clear_local_cache():
+    """Pastron L1 e këtij procesi (p.sh. në teste ose pas një cache.clear())."""
+    local_cache.clear()
+
+def get_cached(key, namespace=None):
+    """
+    Lexon një payload: së pari nga L1, pastaj nga cache-i i përbashkët (dhe e ruan në L1).
+    Nëse jepet `namespace`, leximi numërohet si hit/miss te cache_metrics.
+    """
+    value = local_cache.get(key)
+    if value is None:
+        value = cache.get(key)
+        if value is not None:
+            local_cache.set(key, value)
+    if namespace:
+        if value is None:
+            cache_metrics.record_miss(namespace)
+        else:
+            cache_metrics.record_hit(namespace)
+    return value
+
+def set_cached(key, value, timeout):
+    cache.set(key, value, timeout=timeout)
+    local_cache.set(key, value)
+
+
+# --- Mbrojtja nga stampede gjatë mbushjes së cache-it ---
+# Kur një version rritet (ose një hyrje po skadon), vetëm një kërkesë rillogarit të dhënat:
+#   - single-flight: kërkesa që merr lock-un me cache.add() bën mbushjen; të tjerat marrin
+#     vlerën e mëparshme (çelësi "stale" pa version) ose presin shkurt për mbushjen;
+#   - skadim i hershëm probabilistik (XFetch): sa më afër skadimit dhe sa më e shtrenjtë
+#     llogaritja, aq më e mundshme që një kërkesë ta rillogarisë vlerën para se të skadojë.
+FILL_LOCK_TIMEOUT = 30 # sekonda; lock-u skadon vetë nëse procesi që mbush dështon
+FILL_WAIT_TIMEOUT = 2 # sekonda që pret një kërkesë kur nuk ka vlerë të mëparshme
+FILL_WAIT_INTERVAL = 0.05
+EARLY_RECOMPUTE_BETA = 1.0 # > 1 rillogarit më herët, < 1 më vonë
+STALE_ENTRY_TTL = 60 * 60 * 24 # Vlera e fundit e mirë mbahet gjatë, përdoret vetëm gjatë mbushjes
+
+# --- Stale-while-revalidate ---
+# Për namespaces me staleness maksimale > 0, pas një invalidimi (ose afër skadimit) vlera e fundit
+# e mirë u shërbehet menjëherë të gjitha kërkesave, ndërsa një thread në sfond e rindërton.
+# Vlera e fundit e mirë përdoret vetëm nëse është ndërtuar jo më shumë se N sekonda më parë;
+# përndryshe kërkesa e rindërton sinkronisht si më parë. 0 e çaktivizon për namespace-in.
+# settings.API_CACHE_MAX_STALENESS = {namespace: sekonda} mbishkruan vlerat më poshtë.
+DEFAULT_MAX_STALENESS = {
+    NS_CUISINE_TYPES_LIST: 60 * 60,
+    NS_RESTAURANTS_LIST_PUBLIC: 60 * 5,
+}
+
+def get_max_staleness(namespace):
+    overrides = getattr(settings, 'API_CACHE_MAX_STALENESS', {})
+    return overrides.get(namespace, DEFAULT_MAX_STALENESS.get(namespace, 0))
+
+def _run_refresh(refresh):
+    try:
+        refresh()
+    except Exception:
+        logger.exception("Rifreskimi i cache-it në sfond dështoi")
+    finally:
+        connections.close_all() # Thread-i ka lidhjet e veta me databazën
+
+def _start_background_refresh(refresh):
+    threading.Thread(target=_run_refresh, args=(refresh,), daemon=True, name='cache-refresh').start()
+
+def _should_recompute_early(entry, now, beta=EARLY_RECOMPUTE_BETA):
+    # -log(U) me U ∈ (0, 1] është gjithmonë >= 0
+    return now - entry['delta'] * beta * math.log(1.0 - random.random()) >= entry['expires_at']
+
+def _acquire_fill_lock(cache_key):
+    return cache.add(f"lock_{cache_key}", 1, timeout=FILL_LOCK_TIMEOUT)
+
+def _release_fill_lock(cache_key):
+    cache.delete(f"lock_{cache_key}")
+
+def _fill(cache_key, compute, timeout, stale_key, namespace):
+    started = time.time()
+    try:
+        with use_primary(): # Një replikë me vonesë do të ruante të dhëna të vjetra nën versionin e ri
+            value = compute()
+        now = time.time()
+        if namespace:
+            cache_metrics.record_fill(namespace, now - started)
+        entry = {'value': value, 'delta': now - started, 'expires_at': now + timeout, 'created_at': now}
+        set_cached(cache_key, entry, timeout=timeout)
+        if stale_key:
+            cache.set(stale_key, entry, timeout=STALE_ENTRY_TTL)
+        return value
+    finally:
+        _release_fill_lock(cache_key)
+
+def get_or_compute(cache_key, compute, timeout, stale_key=None, namespace=None):
+    """
+    Kthen vlerën e ruajtur nën `cache_key`, ose e llogarit me `compute()` dhe e ruan.
+    `stale_key` (pa version) mban vlerën e fundit të mirë, që u shërbehet kërkesave
+    të tjera ndërkohë që një kërkesë e vetme e rillogarit pas një invalidimi.
+    Nëse namespace-i ka staleness maksimale (shih DEFAULT_MAX_STALENESS), edhe kërkesa që merr
+    lock-un shërben vlerën e fundit të mirë dhe rindërtimi bëhet në sfond.
+    """
+    max_staleness = get_max_staleness(namespace)
+    fill = lambda: _fill(cache_key, compute, timeout, stale_key, namespace)
+
+    entry = get_cached(cache_key, namespace=namespace)
+    if entry is not None:
+        if not _should_recompute_early(entry, time.time()) or not _acquire_fill_lock(cache_key):
+            return entry['value']
+        if max_staleness:
+            _start_background_refresh(fill)
+            return entry['value']
+        return fill()
+
+    stale_entry = cache.get(stale_key) if stale_key else None
+    if _acquire_fill_lock(cache_key):
+        if not max_staleness or stale_entry is None or time.time() - stale_entry.get('created_at', 0) > max_staleness:
+            return fill()
+        _start_background_refresh(fill) # Stale-while-revalidate
+    # Përndryshe dikush tjetër po e mbush: shërbe vlerën e mëparshme nëse ekziston
+    if stale_entry is not None:
+        if namespace:
+            cache_metrics.record_stale_served(namespace)
+        return stale_entry['value']
+
+    deadline = time.monotonic() + FILL_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(FILL_WAIT_INTERVAL)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return entry['value']
+    # Mbushja po zgjat shumë (ose procesi dështoi): llogarite pa pritur më
+    with use_primary():
+        value = compute()
+    set_cached(cache_key, {'value': value, 'delta': 0, 'expires_at': time.time() + timeout}, timeout=timeout)
+    return value
+
+
+def _get_version(version_key):
+    version = local_cache.get(version_key)
+    if version is not None:
+        return version
+    version = cache.get(version_key)
     if version is None:
         version = 1
-        cache.set(CUISINE_TYPES_LIST_VERSION_KEY, version, timeout=None) # Versioni nuk skadon vetë
+        cache.set(version_key, version, timeout=None) # Versioni nuk skadon vetë
+    local_cache.set(version_key, version, ttl=L1_VERSION_TTL)
     return version
 
-def increment_cuisine_types_list_cache_version():
+def _increment_version(version_key):
     try:
-        version = cache.incr(CUISINE_TYPES_LIST_VERSION_KEY)
+        version = cache.incr(version_key)
     except ValueError: # Nëse çelësi nuk ekziston ose nuk është int
         version = 1
-        cache.set(CUISINE_TYPES_LIST_VERSION_KEY, version, timeout=None)
-    print(f"Cuisine types list cache version incremented to: {version}")
+        cache.set(version_key, version, timeout=None)
+    local_cache.set(version_key, version, ttl=L1_VERSION_TTL) # Ky proces e sheh menjëherë
     return version
 
+
+# --- Cuisine Types List Cache ---
+CUISINE_TYPES_LIST_VERSION_KEY = 'cuisine_types_list_version_v1' # Shtova _v1 për të lejuar ndryshime në strukturë pa konflikte
+CUISINE_TYPES_LIST_CACHE_KEY_PREFIX = 'cuisine_types_list_data_v'
+CUISINE_TYPES_LIST_STALE_KEY = 'cuisine_types_list_stale'
+CUISINE_TYPES_LIST_CACHE_TTL = 60 * 15 # Cache për 15 minuta
+
+def get_cuisine_types_list_cache_version():
+    return _get_version(CUISINE_TYPES_LIST_VERSION_KEY)
+
+def increment_cuisine_types_list_cache_version():
+    return _increment_version(CUISINE_TYPES_LIST_VERSION_KEY)
+
 def get_cuisine_types_list_cache_key():
     version = get_cuisine_types_list_cache_version()
     return f"{CUISINE_TYPES_LIST_CACHE_KEY_PREFIX}{version}"
@@ -31,53 +284,271 @@ RESTAURANTS_LIST_PUBLIC_VERSION_KEY = 'restaurants_list_public_version_v1'
 RESTAURANTS_LIST_PUBLIC_CACHE_KEY_PREFIX = 'restaurants_list_public_data_v'
 RESTAURANT_LIST_CACHE_TTL = 60 * 15 # Cache për 15 minuta
 
+# Parametrat e query-t që ndikojnë në listën publike. Çdo parametër tjetër injorohet,
+# që klientët të mos mund ta fragmentojnë cache-in me parametra arbitrarë.
+RESTAURANTS_LIST_PUBLIC_QUERY_PARAMS = ('page', 'page_size', 'name__icontains', 'cuisine_type_id', 'price_range')
+
 def get_restaurants_list_public_cache_version():
-    version = cache.get(RESTAURANTS_LIST_PUBLIC_VERSION_KEY)
-    if version is None:
-        version = 1
-        cache.set(RESTAURANTS_LIST_PUBLIC_VERSION_KEY, version, timeout=None)
-    return version
+    return _get_version(RESTAURANTS_LIST_PUBLIC_VERSION_KEY)
 
 def increment_restaurants_list_public_cache_version():
-    try:
-        version = cache.incr(RESTAURANTS_LIST_PUBLIC_VERSION_KEY)
-    except ValueError:
-        version = 1
-        cache.set(RESTAURANTS_LIST_PUBLIC_VERSION_KEY, version, timeout=None)
-    print(f"Public restaurants list cache version incremented to: {version}")
-    return version
+    return _increment_version(RESTAURANTS_LIST_PUBLIC_VERSION_KEY)
+
+CASE_SENSITIVE_QUERY_PARAMS = ('cursor',) # Cursor-i i paginimit keyset është base64
+
+def normalize_query_params(query_params, allowed_params, defaults=None):
+    """
+    Kthen një string të qëndrueshëm nga parametrat e lejuar të query-t.
+    Renditja e parametrave, hapësirat dhe shkronjat e mëdha/vogla nuk ndikojnë te rezultati,
+    dhe vlerat default (p.sh. page=1) trajtohen njësoj si mungesa e parametrit.
+    Për një parametër të përsëritur merret vlera e fundit, ajo që lexojnë view-t me query_params.get().
+    """
+    defaults = defaults or {}
+    normalized = []
+    for param in allowed_params:
+        value = (query_params.get(param) or '').strip()
+        if not value:
+            continue
+        if param not in CASE_SENSITIVE_QUERY_PARAMS:
+            value = value.lower()
+        if defaults.get(param) == value:
+            continue
+        normalized.append((param, value))
+    return urlencode(normalized)
+
+def _get_restaurants_list_public_params_hash(request):
+    relevant_query_string = normalize_query_params(
+        request.query_params, RESTAURANTS_LIST_PUBLIC_QUERY_PARAMS, defaults={'page': '1'}
+    )
+    return hashlib.md5(relevant_query_string.encode('utf-8')).hexdigest()[:16]
 
 def get_restaurants_list_public_cache_key(request):
     """
     Gjeneron një çelës cache për listën publike të restoranteve,
-    duke marrë parasysh parametrat e query-t për paginimin dhe filtrat e mundshëm.
+    duke marrë parasysh filtrat publikë, 'page' dhe 'page_size'.
     """
     version = get_restaurants_list_public_cache_version()
-    
-    # Përfshij parametrat relevantë të query-t në çelës për unikalitet
-    # P.sh., 'page', 'cuisine', 'search', etj.
-    # Krijojmë një string të qëndrueshëm nga query params
-    query_params = request.query_params.copy()
-    query_params.pop('format', None) # Hiq formatin nëse është prezent
-    
-    # Rendit parametrat për të siguruar që renditja nuk ndikon te çelësi
-    sorted_query_params = sorted(query_params.items())
-    
-    # Krijo një hash të parametrave të renditur
-    # Përdor një subset të parametrave që realisht ndikojnë në listën publike
-    # Këtu supozojmë se vetëm 'page' është relevant për cache-in publik fillestar.
-    # Nëse keni filtra publikë (p.sh. ?cuisine=Italian), duhet t'i përfshini.
-    
-    page_number = request.query_params.get('page', '1')
-    # Për një implementim më të fortë, mund të bësh hash të gjithë query string-ut relevant
-    # relevant_query_string = "&".join([f"{k}={v}" for k, v in sorted_query_params if k in ['page', 'relevant_filter1']])
-    # query_hash = hashlib.md5(relevant_query_string.encode('utf-8')).hexdigest()[:8]
-    # return f"{RESTAURANTS_LIST_PUBLIC_CACHE_KEY_PREFIX}{version}_params_{query_hash}"
-    
-    # Për thjeshtësi, vetëm me numrin e faqes për këtë shembull
-    return f"{RESTAURANTS_LIST_PUBLIC_CACHE_KEY_PREFIX}{version}_page{page_number}"
+    return f"{RESTAURANTS_LIST_PUBLIC_CACHE_KEY_PREFIX}{version}_params_{_get_restaurants_list_public_params_hash(request)}"
+
+def get_restaurants_list_public_stale_key(request):
+    """Çelësi pa version ku mbahet vlera e fundit e mirë për të njëjtat parametra."""
+    return f"restaurants_list_public_stale_params_{_get_restaurants_list_public_params_hash(request)}"
 
 def get_restaurants_list_public_all_items_cache_key(): # Për rastin kur nuk ka paginim
     version = get_restaurants_list_public_cache_version()
     return f"{RESTAURANTS_LIST_PUBLIC_CACHE_KEY_PREFIX}{version}_all_items"
 
+def invalidate_restaurant_list_cache(trigger=cache_metrics.TRIGGER_DIRECT):
+    return _invalidate(NS_RESTAURANTS_LIST_PUBLIC, None, trigger)
+
+
+# --- Restaurant Detail Cache (një version për çdo restorant) ---
+RESTAURANT_DETAIL_VERSION_KEY_PREFIX = 'restaurant_detail_version_v1_'
+RESTAURANT_DETAIL_CACHE_KEY_PREFIX = 'restaurant_detail_data_v'
+RESTAURANT_DETAIL_CACHE_TTL = 60 * 15
+
+# Varianti 'private' (pronari/admini) përmban të dhënat e pronarit; varianti 'public' jo.
+# Ruhen me çelësa të ndarë që njëri variant të mos i shërbehet kurrë tjetrit.
+RESTAURANT_DETAIL_VARIANT_PUBLIC = 'public'
+RESTAURANT_DETAIL_VARIANT_PRIVATE = 'private'
+RESTAURANT_DETAIL_PRIVATE_FIELDS = ('owner_details',)
+
+def get_restaurant_detail_cache_version(restaurant_id):
+    return _get_version(f"{RESTAURANT_DETAIL_VERSION_KEY_PREFIX}{restaurant_id}")
+
+def get_restaurant_detail_cache_key(restaurant_id, variant):
+    version = get_restaurant_detail_cache_version(restaurant_id)
+    return f"{RESTAURANT_DETAIL_CACHE_KEY_PREFIX}{version}_{restaurant_id}_{variant}"
+
+def increment_restaurant_detail_cache_version(restaurant_id):
+    return _increment_version(f"{RESTAURANT_DETAIL_VERSION_KEY_PREFIX}{restaurant_id}")
+
+def invalidate_restaurant_detail_cache(restaurant_id, trigger=cache_metrics.TRIGGER_DIRECT):
+    return _invalidate(NS_RESTAURANT_DETAIL, restaurant_id, trigger)
+
+
+# --- Restaurant Menu Snapshot Cache (një version për çdo restorant) ---
+# Menuja e serializuar plotësisht ruhet nën versionin e menusë së restorantit, i cili
+# rritet sa herë që ndryshon një MenuItem, një MenuCategory ose vetë restoranti
+# (p.sh. çaktivizimi), kështu që një hit i cache-it nuk ka nevojë të kontrollojë databazën.
+RESTAURANT_MENU_VERSION_KEY_PREFIX = 'restaurant_menu_version_v1_'
+RESTAURANT_MENU_CACHE_KEY_PREFIX = 'restaurant_menu_data_v'
+RESTAURANT_MENU_CACHE_TTL = 60 * 60 # Menuja ndryshon rrallë dhe invalidohet me version
+
+RESTAURANT_MENU_CATEGORIES = 'categories'
+RESTAURANT_MENU_ITEMS = 'items'
+
+def get_restaurant_menu_cache_version(restaurant_id):
+    return _get_version(f"{RESTAURANT_MENU_VERSION_KEY_PREFIX}{restaurant_id}")
+
+def get_restaurant_menu_cache_key(restaurant_id, kind):
+    version = get_restaurant_menu_cache_version(restaurant_id)
+    return f"{RESTAURANT_MENU_CACHE_KEY_PREFIX}{version}_{restaurant_id}_{kind}"
+
+def increment_restaurant_menu_cache_version(restaurant_id):
+    return _increment_version(f"{RESTAURANT_MENU_VERSION_KEY_PREFIX}{restaurant_id}")
+
+
+# --- User Orders Cache (një version për çdo përdorues) ---
+# Lista e porosive ruhet për çdo përdorues, rol dhe filtra. Versioni i përdoruesit rritet
+# për klientin, pronarin e restorantit dhe shoferin sa herë që krijohet ose ndryshon një porosi.
+# Emrat që shfaq lista (email-i i klientit, emri i restorantit/shoferit) nuk e rritin versionin,
+# prandaj mund të vonohen deri në USER_ORDERS_CACHE_TTL.
+USER_ORDERS_VERSION_KEY_PREFIX = 'user_orders_version_v1_'
+USER_ORDERS_CACHE_KEY_PREFIX = 'user_orders_data_v'
+USER_ORDERS_CACHE_TTL = 60 * 5
+
+# Parametrat e query-t që ndikojnë në listën e porosive për secilin rol (shih OrderViewSet.get_queryset)
+USER_ORDERS_PAGINATION_PARAMS = ('page', 'page_size', 'pagination', 'cursor') # Shih pagination.SelectablePagination
+USER_ORDERS_QUERY_PARAMS = {
+    'CUSTOMER': USER_ORDERS_PAGINATION_PARAMS,
+    'RESTAURANT_OWNER': (*USER_ORDERS_PAGINATION_PARAMS, 'restaurant_id'),
+    'DRIVER': (*USER_ORDERS_PAGINATION_PARAMS, 'status__in'),
+}
+
+def get_user_orders_cache_version(user_id):
+    return _get_version(f"{USER_ORDERS_VERSION_KEY_PREFIX}{user_id}")
+
+def get_user_orders_cache_key(user, request):
+    """
+    Çelësi i listës së porosive të `user`. Kthen None për adminët dhe rolet e tjera,
+    listat e të cilëve nuk varen vetëm nga porositë e tyre dhe nuk ruhen në cache.
+    """
+    allowed_params = USER_ORDERS_QUERY_PARAMS.get(user.role)
+    if user.is_staff or allowed_params is None:
+        return None
+    version = get_user_orders_cache_version(user.pk)
+    relevant_query_string = normalize_query_params(request.query_params, allowed_params, defaults={'page': '1'})
+    query_hash = hashlib.md5(relevant_query_string.encode('utf-8')).hexdigest()[:16]
+    return f"{USER_ORDERS_CACHE_KEY_PREFIX}{version}_{user.pk}_{user.role}_params_{query_hash}"
+
+def increment_user_orders_cache_version(user_id):
+    return _increment_version(f"{USER_ORDERS_VERSION_KEY_PREFIX}{user_id}")
+
+def invalidate_cache_for_user_orders(user, trigger=cache_metrics.TRIGGER_DIRECT):
+    if user is None: # P.sh. porosi pa shofer ose klient i fshirë
+        return None
+    return _invalidate(NS_USER_ORDERS, user.pk, trigger)
+
+
+# --- Porositë gati për dërgesë (grid-i hapësinor në memorie, shih dispatch_grid.py) ---
+# Nuk ka të dhëna në cache: versioni u tregon proceseve të tjera që grid-i i tyre duhet rindërtuar.
+READY_ORDERS_VERSION_KEY = 'ready_orders_version_v1'
+
+def get_ready_orders_version():
+    return _get_version(READY_ORDERS_VERSION_KEY)
+
+def increment_ready_orders_version():
+    return _increment_version(READY_ORDERS_VERSION_KEY)
+
+
+# --- Regjistri qendror i invalidimit ---
+# Lidh çdo model me namespaces që ai "ndot" kur ruhet ose fshihet.
+# Sinjalet në signals.py lexojnë këtë regjistër, kështu që view-t nuk kanë nevojë
+# të dinë se cilat cache duhen invaliduar.
+#   when:   funksion (instance) -> bool; nëse kthen False, ndryshimi nuk e prek namespace-in
+#   scopes: funksion (instance) -> iterable ID-sh; vetëm për namespaces me scope
+# Për fshirjet, namespaces llogariten te pre_delete, kur lidhjet ende ekzistojnë.
+INVALIDATION_REGISTRY = {}
+
+# Ruajtjet që prekin vetëm këto fusha nuk ndikojnë në asnjë përgjigje të ruajtur në cache
+# (p.sh. update_last_login i simplejwt në çdo login).
+NON_CACHED_FIELDS = frozenset({'last_login'})
+
+_NAMESPACE_INVALIDATORS = {
+    NS_CUISINE_TYPES_LIST: lambda scope: increment_cuisine_types_list_cache_version(),
+    NS_RESTAURANTS_LIST_PUBLIC: lambda scope: increment_restaurants_list_public_cache_version(),
+    NS_RESTAURANT_DETAIL: increment_restaurant_detail_cache_version,
+    NS_USER_ORDERS: increment_user_orders_cache_version,
+    NS_RESTAURANT_MENU: increment_restaurant_menu_cache_version,
+}
+
+# Prefikset e çelësave të çdo namespace, për t'ia atribuar evictions e L1 namespace-it të duhur
+_KEY_PREFIX_NAMESPACES = (
+    ((CUISINE_TYPES_LIST_VERSION_KEY, CUISINE_TYPES_LIST_CACHE_KEY_PREFIX), NS_CUISINE_TYPES_LIST),
+    ((RESTAURANTS_LIST_PUBLIC_VERSION_KEY, RESTAURANTS_LIST_PUBLIC_CACHE_KEY_PREFIX), NS_RESTAURANTS_LIST_PUBLIC),
+    ((RESTAURANT_DETAIL_VERSION_KEY_PREFIX, RESTAURANT_DETAIL_CACHE_KEY_PREFIX), NS_RESTAURANT_DETAIL),
+    ((RESTAURANT_MENU_VERSION_KEY_PREFIX, RESTAURANT_MENU_CACHE_KEY_PREFIX), NS_RESTAURANT_MENU),
+    ((USER_ORDERS_VERSION_KEY_PREFIX, USER_ORDERS_CACHE_KEY_PREFIX), NS_USER_ORDERS),
+)
+
+def _invalidate(namespace, scope, trigger):
+    cache_metrics.record_invalidation(namespace, trigger)
+    return _NAMESPACE_INVALIDATORS[namespace](scope)
+
+def register_invalidation(model_label, namespace, when=None, scopes=None):
+    """Regjistron që ndryshimet e `model_label` (p.sh. 'api.Restaurant') ndotin `namespace`."""
+    if namespace not in _NAMESPACE_INVALIDATORS:
+        raise ValueError(f"Namespace i panjohur: {namespace}")
+    INVALIDATION_REGISTRY.setdefault(model_label, []).append(
+        {'namespace': namespace, 'when': when, 'scopes': scopes}
+    )
+
+def get_dirtied_namespaces(instance):
+    """Kthen listën e (namespace, scope) që duhen invaliduar për këtë instancë."""
+    dirtied = []
+    for entry in INVALIDATION_REGISTRY.get(instance._meta.label, []):
+        if entry['when'] is not None and not entry['when'](instance):
+            continue
+        if entry['scopes'] is None:
+            dirtied.append((entry['namespace'], None))
+        else:
+            dirtied.extend((entry['namespace'], scope) for scope in entry['scopes'](instance) if scope is not None)
+    return dirtied
+
+def invalidate_for_instance(instance, dirtied=None, trigger=None):
+    """
+    Invalido të gjitha namespaces që ndot instanca, pa dublikime.
+    `dirtied` mund të jepet nëse është llogaritur më herët (p.sh. te pre_delete).
+    `trigger` (p.sh. 'api.Restaurant.save') numërohet te cache_metrics; parazgjedhja është label-i i modelit.
+    """
+    if dirtied is None:
+        dirtied = get_dirtied_namespaces(instance)
+    dirtied = list(dict.fromkeys(dirtied))
+    for namespace, scope in dirtied:
+        _invalidate(namespace, scope, trigger or instance._meta.label)
+    return dirtied
+
+
+def _is_restaurant_address(address):
+    from .models import Restaurant # Import i vonuar për të shmangur importet ciklike
+    return Restaurant.objects.filter(address_id=address.pk).exists()
+
+def _restaurants_of_address(address):
+    # Adresa e restorantit (address_details) ose një nga adresat e pronarit (owner_details.addresses)
+    from .models import Restaurant
+    from django.db.models import Q
+    return Restaurant.objects.filter(Q(address_id=address.pk) | Q(owner_id=address.user_id)).values_list('pk', flat=True)
+
+def _restaurants_of_owner(user):
+    from .models import Restaurant
+    return Restaurant.objects.filter(owner_id=user.pk).values_list('pk', flat=True)
+
+def _restaurants_of_cuisine_type(cuisine_type):
+    return cuisine_type.restaurants.values_list('pk', flat=True)
+
+def _users_of_order(order):
+    # Klienti, pronari i restorantit dhe shoferi i porosisë
+    from .models import Restaurant
+    if order._meta.get_field('restaurant').is_cached(order): # Shmang një query kur restoranti është ngarkuar
+        owner_id = order.restaurant.owner_id if order.restaurant else None
+    else:
+        owner_id = Restaurant.objects.filter(pk=order.restaurant_id).values_list('owner_id', flat=True).first()
+    return [order.customer_id, owner_id, order.driver_id]
+
+register_invalidation('api.Restaurant', NS_RESTAURANTS_LIST_PUBLIC)
+register_invalidation('api.Restaurant', NS_RESTAURANT_DETAIL, scopes=lambda restaurant: [restaurant.pk])
+register_invalidation('api.Address', NS_RESTAURANTS_LIST_PUBLIC, when=_is_restaurant_address) # address_summary
+register_invalidation('api.Address', NS_RESTAURANT_DETAIL, scopes=_restaurants_of_address)
+register_invalidation('api.CuisineType', NS_CUISINE_TYPES_LIST)
+register_invalidation('api.CuisineType', NS_RESTAURANTS_LIST_PUBLIC) # Emrat e kuzhinave shfaqen te lista
+register_invalidation('api.CuisineType', NS_RESTAURANT_DETAIL, scopes=_restaurants_of_cuisine_type)
+register_invalidation('api.OperatingHours', NS_RESTAURANTS_LIST_PUBLIC)
+register_invalidation('api.OperatingHours', NS_RESTAURANT_DETAIL, scopes=lambda hours: [hours.restaurant_id])
+register_invalidation('api.Review', NS_RESTAURANTS_LIST_PUBLIC) # average_rating
+register_invalidation('api.Review', NS_RESTAURANT_DETAIL, scopes=lambda review: [review.restaurant_id])
+register_invalidation('api.User', NS_RESTAURANT_DETAIL, scopes=_restaurants_of_owner) # owner_details
+register_invalidation('api.Restaurant', NS_RESTAURANT_MENU, scopes=lambda restaurant: [restaurant.pk]) # Menuja publike varet nga is_active/is_approved
+register_invalidation('api.MenuCategory', NS_RESTAURANT_MENU, scopes=lambda category: [category.restaurant_id])
+register_invalidation('api.MenuItem', NS_RESTAURANT_MENU, scopes=lambda item: [item.restaurant_id])
+register_invalidation('api.Order', NS_USER_ORDERS, scopes=_users_of_order) # Krijimi dhe çdo ndryshim statusi
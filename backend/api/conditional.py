@@ -0,0 +1,38 @@
+# backend/api/conditional.py
+"""
+Ndihmës për kërkesat GET me kusht (ETag / Last-Modified).
+
+Validatorët llogariten nga çelësat e versionit të cache-it ose nga `updated_at`,
+kështu që një kërkesë me `If-None-Match` / `If-Modified-Since` që përputhet
+kthen 304 pa serializuar asgjë.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def build_etag(*parts):
+    """Ndërton një ETag të dobët (weak) nga pjesët e dhëna (versione, ID, kohë)."""
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return 'W/' + quote_etag(digest)
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified else None
+
+def not_modified_response(request, etag=None, last_modified=None):
+    """
+    Kthen një përgjigje 304 (ose 412 për metodat jo të sigurta) nëse validatorët
+    e klientit përputhen, përndryshe None.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=_timestamp(last_modified))
+    if response is not None:
+        set_validators(response, etag=etag, last_modified=last_modified)
+    return response
+
+def set_validators(response, etag=None, last_modified=None):
+    if etag and not response.has_header('ETag'):
+        response['ETag'] = etag
+    if last_modified and not response.has_header('Last-Modified'):
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
@@ -0,0 +1,140 @@
+# backend/api/db_routing.py
+"""
+Drejtimi i query-ve mes databazës primare ('default') dhe replikave vetëm-lexim.
+
+Vetëm leximet e modeleve të katalogut (restorante, menu, vlerësime; shih REPLICA_MODELS) në kërkesat
+e sigurta (GET/HEAD/OPTIONS) shkojnë te një replikë. Gjithçka tjetër lexohet nga primarja: metodat që
+shkruajnë, query-t brenda një transaksioni, kodi jashtë kërkesave (komandat, thread-et në sfond) dhe
+mbushjet e cache-it (shih use_primary).
+
+Read-your-writes: pas një shkrimi të suksesshëm përdoruesi mbetet te primarja për STICKY_SECONDS,
+me cookie-n STICKY_COOKIE (shfletuesi) dhe me një çelës cache-i sipas claim-it `user_id` të JWT-së
+(klientët që nuk dërgojnë cookie). Vonesa e replikave matet me `manage.py replica_lag`.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+REPLICA_MODELS = frozenset(getattr(settings, 'DATABASE_REPLICA_MODELS', (
+    'api.cuisinetype', 'api.restaurant', 'api.operatinghours', 'api.menucategory', 'api.menuitem',
+    'api.review', 'api.reviewreply',
+)))
+STICKY_SECONDS = getattr(settings, 'DATABASE_PRIMARY_STICKY_SECONDS', 10) # Duhet të jetë më e madhe se vonesa e replikave
+STICKY_COOKIE = 'db_primary_until'
+STICKY_CACHE_KEY_PREFIX = 'db_primary_until_user_'
+
+
+class RoutingState:
+    """Gjendja e drejtimit për kërkesën aktuale (një për kërkesë, te _state)."""
+    __slots__ = ('use_primary',)
+
+    def __init__(self, use_primary):
+        self.use_primary = use_primary
+
+
+_state = ContextVar('db_routing_state', default=None) # None: jashtë një kërkese, gjithçka te primarja
+
+
+def get_replicas():
+    """Aliaset e replikave nga settings.DATABASE_REPLICAS që ekzistojnë te DATABASES."""
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', ()) if alias in settings.DATABASES]
+
+
+@contextmanager
+def use_primary():
+    """Brenda bllokut, edhe leximet e katalogut në këtë kërkesë shkojnë te primarja."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.use_primary = state.use_primary, True
+    try:
+        yield
+    finally:
+        state.use_primary = previous
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db # Relacionet e një objekti lexohen nga e njëjta databazë
+        if model._meta.label_lower not in REPLICA_MODELS:
+            return None
+        state = _state.get()
+        if state is None or state.use_primary or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None # select_for_update dhe leximet para një shkrimi duhet të shohin primaren
+        replicas = get_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.use_primary = True # Pas një shkrimi, pjesa tjetër e kërkesës lexon nga primarja
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True # Të njëjtat të dhëna, vetëm kopje të ndryshme
+        return None
+
+
+def _jwt_user_id(request):
+    """`user_id` nga access token-i në header, pa query në databazë (None nëse mungon ose është i pavlefshëm)."""
+    header = request.META.get(jwt_settings.AUTH_HEADER_NAME, '').split()
+    if len(header) != 2 or header[0] not in jwt_settings.AUTH_HEADER_TYPES:
+        return None
+    try:
+        return AccessToken(header[1]).get(jwt_settings.USER_ID_CLAIM)
+    except TokenError:
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Cakton për çdo kërkesë nëse leximet e katalogut mund të shkojnë te replikat, dhe pas një
+    shkrimi të suksesshëm e mban përdoruesin te primarja për STICKY_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not get_replicas():
+            return self.get_response(request)
+        writes = request.method not in SAFE_METHODS
+        token = _state.set(RoutingState(use_primary=writes or self.is_sticky(request)))
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if writes and response.status_code < 400:
+            self.stick_to_primary(request, response)
+        return response
+
+    def is_sticky(self, request):
+        now = time.time()
+        try:
+            if float(request.COOKIES.get(STICKY_COOKIE, 0)) > now:
+                return True
+        except ValueError:
+            pass
+        user_id = _jwt_user_id(request)
+        return user_id is not None and cache.get(f"{STICKY_CACHE_KEY_PREFIX}{user_id}", 0) > now
+
+    def stick_to_primary(self, request, response):
+        until = time.time() + STICKY_SECONDS
+        response.set_cookie(STICKY_COOKIE, f"{until:.3f}", max_age=STICKY_SECONDS, httponly=True, samesite='Lax')
+        user_id = _jwt_user_id(request)
+        if user_id is not None:
+            cache.set(f"{STICKY_CACHE_KEY_PREFIX}{user_id}", until, timeout=STICKY_SECONDS)
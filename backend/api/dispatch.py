@@ -0,0 +1,213 @@
+# backend/api/dispatch.py
+"""
+Dispatch në grup: cakton porositë READY_FOR_PICKUP pa shofer te shoferët e lirë, si alternativë e
+pranimit manual (accept-delivery / claim-next). Ekzekutohet periodikisht me `manage.py dispatch_orders`.
+
+Për çdo shofer merren CANDIDATES_PER_DRIVER porositë më të afërta brenda MAX_PICKUP_KM (me
+dispatch_grid.ReadyOrderGrid). Kostoja e një çifti është koha e udhëtimit deri te restoranti plus
+një penalitet për porositë që kanë pritur më pak (shih pickup_cost), që porositë e vjetra të mos
+mbeten pas kur ka më pak shoferë se porosi. Caktimi me kosto totale minimale zgjidhet me algoritmin
+hungarez (rrugë rritëse më të shkurtra me potenciale, mbi harqet e kandidatëve, jo mbi matricën e plotë).
+
+Caktimet ruhen në një transaksion përmes Order.transition_to, pra me të njëjtat kontrolle dhe
+sinjale si claim-i manual; një porosi ose shofer që u zu ndërkohë thjesht kapërcehet.
+"""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .dispatch_grid import ReadyOrderGrid, distance_km
+from .models import Order, OrderTransitionConflict
+
+User = get_user_model()
+
+AVERAGE_SPEED_KMH = getattr(settings, 'DISPATCH_AVERAGE_SPEED_KMH', 25)
+MAX_PICKUP_KM = getattr(settings, 'DISPATCH_MAX_PICKUP_KM', 10)
+CANDIDATES_PER_DRIVER = getattr(settings, 'DISPATCH_CANDIDATES_PER_DRIVER', 15)
+WAIT_WEIGHT = getattr(settings, 'DISPATCH_WAIT_WEIGHT', 0.5) # Minuta udhëtimi që "vlen" një minutë pritje e porosisë
+LOCATION_MAX_AGE = getattr(settings, 'DISPATCH_LOCATION_MAX_AGE', 300) # sekonda: shoferët me pozicion më të vjetër injorohen
+MAX_BATCH_ORDERS = getattr(settings, 'DISPATCH_MAX_BATCH_ORDERS', 5000)
+UNASSIGNED_COST = 1e9 # Më e madhe se kostoja totale e çdo caktimi të mundshëm
+
+
+def travel_minutes(km):
+    return km / AVERAGE_SPEED_KMH * 60
+
+
+def pickup_cost(km, waited_minutes, max_waited_minutes):
+    """Kosto jo-negative: udhëtimi deri te restoranti + penaliteti për pritjen më të shkurtër se maksimumi."""
+    return travel_minutes(km) + WAIT_WEIGHT * (max_waited_minutes - waited_minutes)
+
+
+def build_candidates(drivers, orders):
+    """
+    drivers: [(lat, lon)], orders: [(lat, lon, minuta_pritje)].
+    Kthen për çdo shofer listën [(kosto, indeksi_i_porosisë)] të kandidatëve të tij.
+    """
+    grid = ReadyOrderGrid()
+    grid.replace((index, lat, lon, None) for index, (lat, lon, _) in enumerate(orders))
+    max_waited = max((waited for _, _, waited in orders), default=0)
+    candidates = []
+    for lat, lon in drivers:
+        candidates.append([
+            (pickup_cost(km, orders[index][2], max_waited), index)
+            for km, index in grid.nearest(lat, lon, CANDIDATES_PER_DRIVER, max_km=MAX_PICKUP_KM)
+        ])
+    return candidates
+
+
+def solve_assignment(candidates, order_count):
+    """
+    Caktim me kosto minimale mbi harqet (shofer, porosi) te `candidates` (kosto >= 0): secili shofer
+    merr më së shumti një porosi dhe anasjelltas. Kthen {indeksi_i_shoferit: indeksi_i_porosisë}.
+
+    Shoferët shtohen një nga një; për secilin gjendet me Dijkstra (mbi kostot e reduktuara
+    kosto - u[shofer] - v[porosi] >= 0) rruga më e lirë deri te një porosi e lirë, duke rikaktuar
+    shoferët e mëparshëm gjatë rrugës. Çdo shofer ka edhe një kolonë fiktive "pa porosi" me kosto
+    UNASSIGNED_COST, kështu që caktohen sa më shumë shoferë të jetë e mundur dhe, ndër ato
+    zgjidhje, ajo me koston më të vogël (një shofer i hershëm mund t'ia lërë vendin një më të afërti).
+    """
+    driver_count = len(candidates)
+    unassigned_cost = UNASSIGNED_COST
+    driver_potential = [0.0] * driver_count
+    order_potential = [0.0] * (order_count + driver_count) # Kolona order_count + i: shoferi i mbetet pa porosi
+    owner = [None] * (order_count + driver_count) # porosi -> shofer
+    assignment = {}
+    for start, arcs in enumerate(candidates):
+        if not arcs:
+            continue
+        best = {} # porosi -> distanca më e mirë deri tani
+        previous = {} # porosi -> shoferi nga i cili u arrit
+        finalized = {}
+        heap = []
+
+        def relax(driver, base):
+            for cost, order in (*candidates[driver], (unassigned_cost, order_count + driver)):
+                if order in finalized:
+                    continue
+                distance = base + cost - driver_potential[driver] - order_potential[order]
+                if distance < best.get(order, float('inf')):
+                    best[order] = distance
+                    previous[order] = driver
+                    heapq.heappush(heap, (distance, order))
+
+        relax(start, 0.0)
+        free_order = None
+        while heap:
+            distance, order = heapq.heappop(heap)
+            if order in finalized:
+                continue
+            finalized[order] = distance
+            if owner[order] is None:
+                free_order = order
+                break
+            relax(owner[order], distance) # Harku i caktuar ka kosto të reduktuar 0
+        if free_order is None:
+            continue
+
+        # Potencialet: harqet e caktuara mbeten me kosto të reduktuar 0, të tjerat jo-negative
+        total = finalized[free_order]
+        driver_potential[start] += total
+        for order, distance in finalized.items():
+            order_potential[order] -= total - distance
+            if owner[order] is not None:
+                driver_potential[owner[order]] += total - distance
+
+        order = free_order
+        while True: # Rritja: çdo shofer në rrugë kalon te porosia nga e cila u arrit tjetri
+            driver = previous[order]
+            next_order = assignment.get(driver)
+            owner[order] = driver
+            assignment[driver] = order
+            if driver == start:
+                break
+            order = next_order
+    return {driver: order for driver, order in assignment.items() if order < order_count}
+
+
+def plan(drivers, orders):
+    """[(indeksi_i_shoferit, indeksi_i_porosisë, km)] për drivers [(lat, lon)] dhe orders [(lat, lon, minuta_pritje)]."""
+    assignment = solve_assignment(build_candidates(drivers, orders), len(orders))
+    return [
+        (driver, order, distance_km(*drivers[driver], *orders[order][:2]))
+        for driver, order in sorted(assignment.items())
+    ]
+
+
+def ready_orders():
+    """Porositë e lira me koordinata restoranti, nga më e vjetra (indeksi order_claimable_idx)."""
+    return (
+        Order.objects.filter(
+            status=Order.OrderStatus.READY_FOR_PICKUP, driver__isnull=True,
+            restaurant__address__latitude__isnull=False, restaurant__address__longitude__isnull=False,
+        )
+        .select_related('restaurant__address') # Edhe sinjali i grid-it e lexon adresën pa query shtesë
+        .order_by('ready_for_pickup_at', 'created_at', 'pk')[:MAX_BATCH_ORDERS]
+    )
+
+
+def available_drivers(now):
+    """Shoferët aktivë, të disponueshëm, me pozicion të freskët dhe pa dërgesë aktive."""
+    active_delivery = Order.objects.filter(driver=OuterRef('pk'), status__in=Order.DRIVER_ACTIVE_STATUSES)
+    return (
+        User.objects.filter(
+            role=User.Role.DRIVER, is_active=True, is_available_for_delivery=True,
+            driver_profile__current_location_lat__isnull=False, driver_profile__current_location_lon__isnull=False,
+            driver_profile__location_updated_at__gte=now - timedelta(seconds=LOCATION_MAX_AGE),
+        )
+        .exclude(Exists(active_delivery))
+        .select_related('driver_profile')
+        .order_by('pk')
+    )
+
+
+def commit_assignments(pairs):
+    """
+    Ruan çiftet [(shofer, porosi)] në një transaksion. Shoferët bllokohen si te claim_for_driver dhe
+    rikontrollohen për dërgesa aktive me një query; çdo porosi kalon në CONFIRMED me UPDATE-in e
+    kushtëzuar të transition_to. Kthen porositë e caktuara.
+    """
+    if not pairs:
+        return []
+    driver_ids = [driver.pk for driver, _ in pairs]
+    assigned = []
+    with transaction.atomic():
+        list(User.objects.select_for_update().filter(pk__in=driver_ids).order_by('pk').values_list('pk', flat=True))
+        busy = set(Order.objects.filter(driver_id__in=driver_ids, status__in=Order.DRIVER_ACTIVE_STATUSES).values_list('driver_id', flat=True))
+        for driver, order in pairs:
+            if driver.pk in busy:
+                continue # Pranoi një porosi manualisht ndërkohë
+            try:
+                # Dispatch-i vepron në emër të shoferit: i njëjti tranzicion si te accept-delivery
+                order.transition_to(Order.OrderStatus.CONFIRMED, Order.Actor.DRIVER, expected={'driver__isnull': True}, driver=driver)
+            except OrderTransitionConflict:
+                continue # E mori dikush tjetër ndërkohë
+            assigned.append(order)
+    return assigned
+
+
+def run_batch(now=None, dry_run=False):
+    """Një raund dispatch-i. Kthen (porositë_gati, shoferët_e_lirë, [(shofer, porosi, km)] të caktuara)."""
+    now = now or timezone.now()
+    orders = list(ready_orders())
+    drivers = list(available_drivers(now)) if orders else []
+    if not orders or not drivers:
+        return orders, drivers, []
+    planned = plan(
+        [(float(driver.driver_profile.current_location_lat), float(driver.driver_profile.current_location_lon)) for driver in drivers],
+        [
+            (order.restaurant.address.latitude, order.restaurant.address.longitude,
+             (now - (order.ready_for_pickup_at or order.created_at)).total_seconds() / 60)
+            for order in orders
+        ],
+    )
+    pairs = [(drivers[driver], orders[order], km) for driver, order, km in planned]
+    if not dry_run:
+        committed = {order.pk for order in commit_assignments([(driver, order) for driver, order, _ in pairs])}
+        pairs = [pair for pair in pairs if pair[1].pk in committed]
+    return orders, drivers, pairs
@@ -0,0 +1,219 @@
+# backend/api/dispatch_grid.py
+"""
+Indeks hapësinor në memorie i porosive READY_FOR_PICKUP pa shofer, për /orders/available-for-driver/.
+
+Porositë ruhen në kova sipas qelizës geohash të restorantit (GEOHASH_PRECISION = 6, rreth 1.2 x 0.6 km).
+Një kovë identifikohet me indekset (x, y) të qelizës, pra bitet e gjatësisë dhe të gjerësisë së
+geohash-it para ndërthurjes, që qelizat fqinje të gjenden me aritmetikë të thjeshtë. K më të afërtat
+gjenden duke kontrolluar unazat e qelizave rreth shoferit, nga më e afërta, derisa asnjë qelizë e
+pakontrolluar nuk mund të ketë një porosi më afër se e K-ta e gjetur. Kostoja varet nga porositë
+përreth, jo nga numri total i tyre.
+
+Grid-i përditësohet nga sinjali order_status_changed pas commit-it (shih signals.py). Çdo proces ka
+kopjen e vet: një ndryshim rrit versionin e përbashkët në cache (cache_utils.READY_ORDERS_VERSION_KEY)
+dhe proceset e tjera e rindërtojnë grid-in nga databaza në leximin e radhës, jo më shpesh se
+MIN_REBUILD_INTERVAL. Pas MAX_AGE rindërtohet gjithsesi, për ndryshimet që anashkalojnë tranzicionet
+(p.sh. bulk_create). Kandidatët verifikohen në databazë para se t'i kthehen shoferit.
+"""
+import heapq
+import math
+import threading
+import time
+
+from django.conf import settings
+
+from . import cache_utils
+
+GEOHASH_PRECISION = 6
+MIN_REBUILD_INTERVAL = getattr(settings, 'DISPATCH_GRID_MIN_REBUILD_INTERVAL', 2) # sekonda
+MAX_AGE = getattr(settings, 'DISPATCH_GRID_MAX_AGE', 60) # sekonda
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Distanca haversine në kilometra."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class ReadyOrderGrid:
+    """Porositë e lira sipas qelizës geohash: {(x, y): {order_id: (lat, lon)}}."""
+
+    def __init__(self, precision=GEOHASH_PRECISION):
+        bits = 5 * precision
+        self.lon_cells = 1 << ((bits + 1) // 2) # Geohash-i nis me gjatësinë: ajo merr bitin tek
+        self.lat_cells = 1 << (bits // 2)
+        self.cell_height_km = 180.0 / self.lat_cells * KM_PER_DEGREE
+        self.cell_width_deg = 360.0 / self.lon_cells
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.cells = {} # order_id -> qeliza
+        self.unlocated = {} # order_id -> ready_at, për restorantet pa koordinata
+
+    def __len__(self):
+        return len(self.cells) + len(self.unlocated)
+
+    def cell_of(self, lat, lon):
+        x = min(int((lon + 180.0) / 360.0 * self.lon_cells), self.lon_cells - 1)
+        y = min(int((lat + 90.0) / 180.0 * self.lat_cells), self.lat_cells - 1)
+        return x, y
+
+    def add(self, order_id, lat, lon, ready_at=None):
+        with self.lock:
+            self._discard(order_id)
+            if lat is None or lon is None:
+                self.unlocated[order_id] = ready_at
+                return
+            cell = self.cell_of(lat, lon)
+            self.buckets.setdefault(cell, {})[order_id] = (lat, lon)
+            self.cells[order_id] = cell
+
+    def remove(self, order_id):
+        with self.lock:
+            self._discard(order_id)
+
+    def replace(self, rows):
+        """Zëvendëson gjithë përmbajtjen me rreshtat (order_id, lat, lon, ready_at)."""
+        buckets, cells, unlocated = {}, {}, {}
+        for order_id, lat, lon, ready_at in rows:
+            if lat is None or lon is None:
+                unlocated[order_id] = ready_at
+            else:
+                cell = self.cell_of(lat, lon)
+                buckets.setdefault(cell, {})[order_id] = (lat, lon)
+                cells[order_id] = cell
+        with self.lock: # Leximet paralele shohin ose grid-in e vjetër ose të riun, kurrë gjysmë të ndërtuar
+            self.buckets, self.cells, self.unlocated = buckets, cells, unlocated
+
+    def _discard(self, order_id):
+        cell = self.cells.pop(order_id, None)
+        if cell is not None:
+            bucket = self.buckets[cell]
+            del bucket[order_id]
+            if not bucket:
+                del self.buckets[cell]
+        self.unlocated.pop(order_id, None)
+
+    def nearest(self, lat, lon, k, max_km=None):
+        """Deri në `k` çifte (distanca_km, order_id), nga më e afërta, vetëm për porositë me koordinata."""
+        if k <= 0:
+            return []
+        with self.lock:
+            buckets = self.buckets
+            cx, cy = self.cell_of(lat, lon)
+            best = [] # max-heap me (-distanca, order_id)
+            seen = 0
+            ring = 0
+            while seen < len(self.cells):
+                bound_km = self._ring_bound_km(lat, ring)
+                if len(best) == k and -best[0][0] <= bound_km:
+                    break
+                if max_km is not None and bound_km > max_km:
+                    break
+                if (2 * ring + 1) ** 2 > len(buckets): # Më shumë qeliza të kontrolluara se kova jo-bosh: kontrolloji direkt
+                    cells = [cell for cell in buckets if self._cell_distance(cell, cx, cy) >= ring]
+                    ring = None
+                else:
+                    cells = self._ring(cx, cy, ring)
+                for cell in cells:
+                    bucket = buckets.get(cell)
+                    if not bucket:
+                        continue
+                    seen += len(bucket)
+                    for order_id, (order_lat, order_lon) in bucket.items():
+                        distance = distance_km(lat, lon, order_lat, order_lon)
+                        if max_km is not None and distance > max_km:
+                            continue
+                        if len(best) < k:
+                            heapq.heappush(best, (-distance, order_id))
+                        elif distance < -best[0][0]:
+                            heapq.heapreplace(best, (-distance, order_id))
+                if ring is None:
+                    break
+                ring += 1
+        return sorted((-negative, order_id) for negative, order_id in best)
+
+    def _ring_bound_km(self, lat, ring):
+        """Distanca minimale nga pika te çdo porosi në unazën `ring` ose më larg."""
+        if ring <= 1:
+            return 0.0
+        cells = ring - 1 # Pika mund të jetë në skajin e qelizës së vet
+        # Gjerësia e qelizave ngushtohet drejt poleve: merret gjerësia gjeografike më e largët që arrin unaza
+        farthest_lat = min(abs(lat) + ring * self.cell_height_km / KM_PER_DEGREE, 90.0)
+        cell_width_km = self.cell_width_deg * KM_PER_DEGREE * math.cos(math.radians(farthest_lat))
+        return cells * min(self.cell_height_km, cell_width_km)
+
+    def _cell_distance(self, cell, cx, cy):
+        dx = abs(cell[0] - cx)
+        return max(min(dx, self.lon_cells - dx), abs(cell[1] - cy))
+
+    def _ring(self, cx, cy, ring):
+        """Qelizat në distancë Chebyshev `ring` nga (cx, cy); x mbështillet rreth meridianit 180."""
+        if ring == 0:
+            return [(cx, cy)]
+        cells = []
+        for dx in range(-ring, ring + 1):
+            x = (cx + dx) % self.lon_cells
+            for dy in ((-ring, ring) if abs(dx) != ring else range(-ring, ring + 1)):
+                y = cy + dy
+                if 0 <= y < self.lat_cells:
+                    cells.append((x, y))
+        return cells
+
+    def oldest_unlocated(self, k):
+        """Porositë pa koordinata, nga më e vjetra."""
+        with self.lock:
+            return [order_id for order_id, _ in sorted(self.unlocated.items(), key=lambda item: (item[1] is None, item[1], item[0]))[:k]]
+
+
+grid = ReadyOrderGrid()
+_sync_lock = threading.Lock()
+_synced_version = None
+_synced_at = 0.0
+
+
+def ready_order_rows():
+    """(order_id, lat, lon, ready_at) për porositë e lira, me një query (indeksi order_claimable_idx)."""
+    from .models import Order
+    return Order.objects.filter(status=Order.OrderStatus.READY_FOR_PICKUP, driver__isnull=True).values_list(
+        'pk', 'restaurant__address__latitude', 'restaurant__address__longitude', 'ready_for_pickup_at',
+    )
+
+
+def rebuild():
+    global _synced_version, _synced_at
+    with _sync_lock:
+        version = cache_utils.get_ready_orders_version()
+        grid.replace(ready_order_rows())
+        _synced_version, _synced_at = version, time.monotonic()
+
+
+def ensure_fresh():
+    """Rindërton grid-in nëse një proces tjetër e ka ndryshuar bashkësinë e porosive, ose nëse është shumë i vjetër."""
+    age = time.monotonic() - _synced_at
+    if _synced_version is None or age >= MAX_AGE:
+        rebuild()
+    elif age >= MIN_REBUILD_INTERVAL and cache_utils.get_ready_orders_version() != _synced_version:
+        rebuild()
+    return grid
+
+
+def _publish_change():
+    global _synced_version
+    with _sync_lock:
+        version = cache_utils.increment_ready_orders_version()
+        if _synced_version == version - 1: # Asnjë ndryshim tjetër në mes: ky proces mbetet i sinkronizuar
+            _synced_version = version
+
+
+def order_ready(order_id, lat, lon, ready_at=None):
+    grid.add(order_id, lat, lon, ready_at)
+    _publish_change()
+
+
+def order_unavailable(order_id):
+    grid.remove(order_id)
+    _publish_change()
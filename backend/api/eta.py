@@ -0,0 +1,128 @@
+# backend/api/eta.py
+"""
+Parashikimi i Order.estimated_delivery_time nga historiku i kohëzgjatjeve.
+
+Për çdo restorant, dhe për të gjitha bashkë, mbahen sketch-e kuantilesh të dy fazave:
+PREP (created_at -> ready_for_pickup_at) dhe DELIVERY (ready_for_pickup_at -> actual_delivery_time).
+Sketch-i ndan kohëzgjatjet në kova logaritmike me gabim relativ RELATIVE_ACCURACY (si DDSketch),
+kështu që madhësia e tij varet nga diapazoni i kohëve, jo nga numri i porosive. Kur numri kalon
+MAX_SAMPLES, numëruesit përgjysmohen: porositë e fundit peshojnë më shumë.
+
+Sketch-et përditësohen pas commit-it të tranzicioneve READY_FOR_PICKUP dhe DELIVERED (shih signals.py)
+dhe ruajnë kuantilin ETA_QUANTILE te EtaSketch.estimate_seconds. Krijimi i porosisë lexon vetëm
+këto vlera (një query me indeks): restoranti me më pak se MIN_SAMPLES porosi përdor sketch-in e
+përgjithshëm, dhe pa asnjë të dhënë përdoren DEFAULT_STAGE_SECONDS. `manage.py rebuild_eta_sketches`
+i rindërton nga porositë ekzistuese.
+"""
+import math
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import EtaSketch, Order
+
+RELATIVE_ACCURACY = 0.02
+MAX_SAMPLES = getattr(settings, 'ETA_MAX_SAMPLES', 1000)
+MIN_SAMPLES = getattr(settings, 'ETA_MIN_SAMPLES', 20)
+ETA_QUANTILE = getattr(settings, 'ETA_QUANTILE', 0.5)
+DEFAULT_STAGE_SECONDS = {EtaSketch.Stage.PREP: 20 * 60, EtaSketch.Stage.DELIVERY: 20 * 60}
+# Faza që mbyllet kur porosia hyn në status: (faza, fusha e fillimit, fusha e mbarimit)
+STAGE_FOR_STATUS = {
+    Order.OrderStatus.READY_FOR_PICKUP: (EtaSketch.Stage.PREP, 'created_at', 'ready_for_pickup_at'),
+    Order.OrderStatus.DELIVERED: (EtaSketch.Stage.DELIVERY, 'ready_for_pickup_at', 'actual_delivery_time'),
+}
+
+
+class QuantileSketch:
+    """Numërues sipas kovës ceil(log_gamma(sekonda)); kova 0 mban kohëzgjatjet <= 1 sekondë."""
+
+    gamma = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self, bins=None):
+        self.bins = {int(index): count for index, count in (bins or {}).items()}
+        self.count = sum(self.bins.values())
+
+    def add(self, seconds):
+        index = max(0, math.ceil(math.log(seconds) / self.log_gamma)) if seconds > 1 else 0
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        if self.count > MAX_SAMPLES:
+            self.bins = {index: count // 2 for index, count in self.bins.items() if count > 1}
+            self.count = sum(self.bins.values())
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                # Mesi i kovës (gamma^(i-1), gamma^i], me gabim relativ <= RELATIVE_ACCURACY
+                return 2 * self.gamma ** index / (self.gamma + 1) if index else 1.0
+        return None
+
+    def to_json(self):
+        return {str(index): count for index, count in sorted(self.bins.items())}
+
+
+def _row(restaurant_id, stage, lock):
+    """Rreshti i sketch-it të fazës (krijohet nëse mungon), i bllokuar me select_for_update nëse `lock`."""
+    rows = EtaSketch.objects.filter(restaurant_id=restaurant_id, stage=stage) # restaurant_id=None: sketch-i i përgjithshëm
+    if lock:
+        rows = rows.select_for_update()
+    row = rows.first()
+    if row is None:
+        # Një transaksion paralel mund ta ketë krijuar ndërkohë
+        EtaSketch.objects.bulk_create([EtaSketch(restaurant_id=restaurant_id, stage=stage)], ignore_conflicts=True)
+        row = rows.get()
+    return row
+
+
+def _add_to_row(row, seconds):
+    sketch = QuantileSketch(row.bins)
+    sketch.add(seconds)
+    EtaSketch.objects.filter(pk=row.pk).update(
+        bins=sketch.to_json(), count=sketch.count, estimate_seconds=sketch.quantile(ETA_QUANTILE),
+    )
+
+
+def record_duration(restaurant_id, stage, seconds):
+    """
+    Shton kohëzgjatjen te sketch-i i restorantit (i bllokuar: asnjë kohëzgjatje nuk humbet) dhe te ai
+    i përgjithshëm. Ky i fundit përditësohet pa bllokim, që tranzicionet e të gjitha restoranteve të mos
+    serializohen në një rresht: dy shtime njëkohësisht mund të humbasin njërën, gjë e pranueshme për
+    një rezervë që mban qindra mostra. `manage.py rebuild_eta_sketches` e rindërton saktësisht.
+    """
+    with transaction.atomic():
+        _add_to_row(_row(restaurant_id, stage, lock=True), seconds)
+    _add_to_row(_row(None, stage, lock=False), seconds)
+
+
+def record_transition(order, new_status):
+    """Regjistron fazën që mbyllet me `new_status`, nëse porosia i ka të dyja kohët."""
+    stage_fields = STAGE_FOR_STATUS.get(new_status)
+    if stage_fields is None or order.restaurant_id is None:
+        return
+    stage, start_field, end_field = stage_fields
+    start, end = getattr(order, start_field), getattr(order, end_field)
+    if start is not None and end is not None and end >= start:
+        record_duration(order.restaurant_id, stage, (end - start).total_seconds())
+
+
+def estimate_delivery_time(restaurant_id, start):
+    """start + kuantili i secilës fazë, nga vlerat e ruajtura te EtaSketch (një query, pa agregime)."""
+    rows = EtaSketch.objects.filter(Q(restaurant_id=restaurant_id) | Q(restaurant__isnull=True)).values_list(
+        'restaurant_id', 'stage', 'count', 'estimate_seconds',
+    )
+    estimates = {(row_restaurant_id is None, stage): (count, seconds) for row_restaurant_id, stage, count, seconds in rows}
+    total = 0.0
+    for stage in EtaSketch.Stage.values:
+        count, seconds = estimates.get((False, stage), (0, None))
+        if count < MIN_SAMPLES or seconds is None:
+            count, seconds = estimates.get((True, stage), (0, None))
+        total += seconds if count and seconds is not None else DEFAULT_STAGE_SECONDS[stage]
+    return start + timedelta(seconds=total)
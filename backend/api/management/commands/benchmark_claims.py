@@ -0,0 +1,131 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.utils import timezone
+
+from api.models import Order, Restaurant
+
+User = get_user_model()
+
+MAX_ERRORS_PER_DRIVER = 50 # Një shofer ndalet pas kaq gabimesh (p.sh. "database is locked" në SQLite)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mat sa claim-e në sekondë bën Order.claim_for_driver kur shumë shoferë marrin porosi njëkohësisht. "
+        "Krijon të dhëna të përkohshme (shoferë, një restorant, porosi READY_FOR_PICKUP), i fshin në fund "
+        "dhe verifikon që asnjë porosi nuk u mor dy herë."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=100, help="Sa shoferë të simuluar marrin porosi.")
+        parser.add_argument('--orders', type=int, default=None, help="Sa porosi gati për dërgesë krijohen (parazgjedhja: 5 për shofer).")
+        parser.add_argument('--concurrency', type=int, default=None, help="Sa shoferë punojnë njëkohësisht (parazgjedhja: të gjithë).")
+        parser.add_argument('--keep', action='store_true', help="Mos i fshi të dhënat e krijuara në fund.")
+
+    def handle(self, *args, **options):
+        drivers_count = options['drivers']
+        orders_count = options['orders'] if options['orders'] is not None else drivers_count * 5
+        self.concurrency = options['concurrency'] or drivers_count
+        if drivers_count < 1 or orders_count < 1 or self.concurrency < 1:
+            raise CommandError("--drivers, --orders dhe --concurrency duhet të jenë >= 1.")
+
+        tag = f"bench-claims-{uuid.uuid4().hex[:8]}"
+        drivers, restaurant = self.create_fixtures(tag, drivers_count, orders_count)
+        self.latencies = []
+        self.claimed = []
+        self.errors = 0
+        self.stats_lock = threading.Lock()
+        self.start = threading.Event() # Sinjal i vetëm nisjeje: funksionon për çdo --drivers, edhe kur nuk plotpjesëtohet me --concurrency
+
+        try:
+            started = time.monotonic()
+            if self.concurrency > 1:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                    try:
+                        futures = [executor.submit(self.drive, driver) for driver in drivers]
+                    finally:
+                        self.start.set() # Thread-et e para nisin njëkohësisht, që matja të jetë nën konkurrencë
+                    for future in futures:
+                        future.result()
+            else:
+                self.start.set()
+                for driver in drivers:
+                    self.drive(driver)
+            elapsed = time.monotonic() - started
+            self.report(drivers_count, orders_count, elapsed, restaurant)
+        finally:
+            if not options['keep']:
+                Order.objects.filter(restaurant=restaurant).delete()
+                restaurant.delete()
+                User.objects.filter(email__startswith=tag).delete()
+
+    def create_fixtures(self, tag, drivers_count, orders_count):
+        owner = User.objects.create_user(email=f"{tag}-owner@example.com", password=None, role=User.Role.RESTAURANT_OWNER)
+        restaurant = Restaurant.objects.create(owner=owner, name=tag, phone_number="000", is_active=True, is_approved=True)
+        drivers = User.objects.bulk_create([
+            User(email=f"{tag}-driver{i}@example.com", role=User.Role.DRIVER)
+            for i in range(drivers_count)
+        ])
+        now = timezone.now()
+        Order.objects.bulk_create([
+            Order(
+                customer=owner, restaurant=restaurant, order_total="10.00", status=Order.OrderStatus.READY_FOR_PICKUP,
+                ready_for_pickup_at=now, delivery_address_street="Rruga", delivery_address_city="Prishtinë",
+                delivery_address_postal_code="10000",
+            )
+            for _ in range(orders_count)
+        ], batch_size=500)
+        return drivers, restaurant
+
+    def drive(self, driver):
+        """Një shofer merr porosi njëra pas tjetrës derisa nuk mbetet asnjë e lirë."""
+        self.start.wait()
+        errors = 0
+        try:
+            while errors < MAX_ERRORS_PER_DRIVER:
+                started = time.monotonic()
+                try:
+                    order = Order.claim_for_driver(driver)
+                except DatabaseError:
+                    errors += 1
+                    continue
+                if order is None:
+                    return
+                with self.stats_lock:
+                    self.latencies.append(time.monotonic() - started)
+                    self.claimed.append(order.pk)
+                # Dërgesa e simuluar mbaron menjëherë, që shoferi të jetë i lirë për claim-in tjetër
+                Order.objects.filter(pk=order.pk).update(status=Order.OrderStatus.DELIVERED)
+        finally:
+            with self.stats_lock:
+                self.errors += errors
+            if self.concurrency > 1:
+                connections.close_all() # Çdo thread hap lidhjet e veta me databazën
+
+    def report(self, drivers_count, orders_count, elapsed, restaurant):
+        claims = len(self.claimed)
+        assigned = Order.objects.filter(restaurant=restaurant, driver__isnull=False).count()
+        self.stdout.write(
+            f"{drivers_count} shoferë, {orders_count} porosi, {self.concurrency} njëkohësisht "
+            f"({connections['default'].vendor})"
+        )
+        self.stdout.write(f"claims: {claims} në {elapsed:.2f}s = {claims / elapsed if elapsed else 0:.1f} claims/s")
+        if self.latencies:
+            latencies_ms = sorted(latency * 1000 for latency in self.latencies)
+            p95 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))]
+            self.stdout.write(f"vonesa: p50 {statistics.median(latencies_ms):.1f} ms, p95 {p95:.1f} ms")
+        self.stdout.write(f"gabime: {self.errors}")
+
+        if len(set(self.claimed)) != claims or assigned != claims:
+            raise CommandError(f"Porosi të marra dy herë: {claims} claims, {len(set(self.claimed))} unike, {assigned} me shofer.")
+        if claims != orders_count:
+            self.stdout.write(self.style.WARNING(f"{orders_count - claims} porosi mbetën pa u marrë."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Çdo porosi u mor saktësisht një herë."))
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from api import dispatch
+
+
+class Command(BaseCommand):
+    help = (
+        "Cakton porositë READY_FOR_PICKUP pa shofer te shoferët e disponueshëm me pozicion të freskët "
+        "(shih api/dispatch.py). Pa --interval ekzekuton një raund; me --interval përsëritet derisa të ndalet "
+        "(p.sh. si shërbim systemd). Pranimi manual (accept-delivery, claim-next) vazhdon të funksionojë paralelisht."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help="Sekonda mes raundeve (0: vetëm një raund).")
+        parser.add_argument('--dry-run', action='store_true', help="Shfaq caktimet pa i ruajtur.")
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if interval < 0:
+            raise CommandError("--interval duhet të jetë >= 0.")
+        while True:
+            started = time.monotonic()
+            self.run_round(options['dry_run'])
+            if not interval:
+                return
+            connections.close_all() # Lidhjet nuk mbahen hapur mes raundeve
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def run_round(self, dry_run):
+        started = time.monotonic()
+        orders, drivers, pairs = dispatch.run_batch(dry_run=dry_run)
+        elapsed_ms = (time.monotonic() - started) * 1000
+        verb = "do të caktoheshin" if dry_run else "u caktuan"
+        average_km = sum(km for _, _, km in pairs) / len(pairs) if pairs else 0
+        self.stdout.write(
+            f"{len(orders)} porosi gati, {len(drivers)} shoferë të lirë: {len(pairs)} {verb} "
+            f"(mesatarisht {average_km:.2f} km deri te restoranti) në {elapsed_ms:.0f} ms"
+        )
+        if dry_run:
+            for driver, order, km in pairs:
+                self.stdout.write(f"  porosia #{order.pk} -> {driver.email} ({km:.2f} km)")
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from api.models import MenuItem, Order, PageViewLog, Restaurant
+from api.views import MenuItemViewSet, OrderViewSet, RestaurantViewSet
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Shfaq planin EXPLAIN për queryset-et e views kryesore (porositë sipas rolit, lista publike e restoranteve, "
+        "menuja, claim-i i shoferit, vizitat e faqes), që të verifikohet se përdoren indekset e Meta.indexes. "
+        "Ekzekutoje mbi një databazë me vëllim real (p.sh. 10M porosi): me pak rreshta planifikuesi zgjedh skanim të plotë."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--analyze', action='store_true', help="EXPLAIN ANALYZE (e ekzekuton query-n; vetëm PostgreSQL).")
+        parser.add_argument('--no-seqscan', action='store_true',
+                            help="SET LOCAL enable_seqscan = off, për të parë cilin indeks do të zgjidhte planifikuesi (vetëm PostgreSQL).")
+        parser.add_argument('--only', help="Shfaq vetëm rastet që e përmbajnë këtë tekst në emër.")
+
+    def handle(self, *args, **options):
+        postgres = connection.vendor == 'postgresql'
+        if (options['analyze'] or options['no_seqscan']) and not postgres:
+            raise CommandError("--analyze dhe --no-seqscan mbështeten vetëm në PostgreSQL.")
+
+        self.factory = APIRequestFactory()
+        cases = [case for case in self.cases() if not options['only'] or options['only'] in case[0]]
+        if not cases:
+            raise CommandError("Asnjë rast për t'u shfaqur (mungojnë të dhënat ose --only nuk përputhet).")
+
+        index_names = {
+            index.name
+            for model in (Order, MenuItem, Restaurant, PageViewLog)
+            for index in model._meta.indexes
+        }
+        explain_options = {'analyze': True, 'buffers': True} if options['analyze'] else {}
+        with transaction.atomic(): # SET LOCAL vlen vetëm brenda transaksionit
+            if options['no_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            for label, queryset in cases:
+                plan = queryset.explain(**explain_options)
+                used = sorted(name for name in index_names if name in plan)
+                self.stdout.write(self.style.MIGRATE_HEADING(label))
+                self.stdout.write(plan)
+                summary = f"indekset: {', '.join(used)}" if used else "indekset: asnjë nga Meta.indexes"
+                self.stdout.write((self.style.SUCCESS if used else self.style.WARNING)(summary) + "\n")
+
+    def cases(self):
+        """(emri, queryset) për çdo view, me një përdorues/restorant shembull nga databaza."""
+        customer = User.objects.filter(role=User.Role.CUSTOMER).first()
+        owner = User.objects.filter(role=User.Role.RESTAURANT_OWNER).first()
+        driver = User.objects.filter(role=User.Role.DRIVER).first()
+        restaurant = Restaurant.objects.filter(is_active=True, is_approved=True).first() or Restaurant.objects.first()
+
+        yield 'restaurants: lista publike', self.view_queryset(RestaurantViewSet, 'list', AnonymousUser())
+        if customer:
+            yield 'orders: lista e klientit', self.view_queryset(OrderViewSet, 'list', customer)
+        if owner:
+            params = {'restaurant_id': restaurant.pk} if restaurant else {}
+            yield 'orders: lista e restorantit', self.view_queryset(OrderViewSet, 'list', owner, params=params)
+        if driver:
+            yield 'orders: dërgesat aktive të shoferit', self.view_queryset(
+                OrderViewSet, 'list', driver, params={'status__in': 'CONFIRMED,ON_THE_WAY'},
+            )
+            yield 'orders: dërgesa aktive (claim)', Order.objects.filter(driver=driver, status__in=Order.DRIVER_ACTIVE_STATUSES).order_by()
+        yield 'orders: kandidatët për claim', (
+            Order.objects.filter(status=Order.OrderStatus.READY_FOR_PICKUP, driver__isnull=True)
+            .order_by('ready_for_pickup_at', 'created_at', 'pk')[:1]
+        )
+        if restaurant:
+            yield 'menu-items: menuja publike', (
+                MenuItem.objects.filter(restaurant=restaurant, is_available=True)
+                .select_related('category').order_by('category__display_order', 'name')
+            )
+            yield 'menu-items: lista e restorantit', self.view_queryset(
+                MenuItemViewSet, 'list', AnonymousUser(), kwargs={'restaurant_pk': restaurant.pk},
+            )
+            yield 'page views: 30 ditët e fundit', PageViewLog.objects.filter(
+                restaurant=restaurant, viewed_at__gte=timezone.now() - timedelta(days=30),
+            )
+
+    def view_queryset(self, viewset_class, action, user, kwargs=None, params=None):
+        """Queryset-i që view do të lexonte për faqen e parë (get_queryset + filter_queryset + paginimi)."""
+        view = viewset_class(action_map={'get': action})
+        view.args, view.kwargs, view.format_kwarg = (), kwargs or {}, None
+        view.request = view.initialize_request(self.factory.get('/', params or {}))
+        view.request.user = user
+        queryset = view.filter_queryset(view.get_queryset())
+        paginator = view.paginator
+        page_size = paginator.get_page_size(view.request) if paginator is not None else None
+        return queryset[:page_size] if page_size else queryset
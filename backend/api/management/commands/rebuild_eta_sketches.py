@@ -0,0 +1,47 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.eta import ETA_QUANTILE, STAGE_FOR_STATUS, QuantileSketch
+from api.models import EtaSketch, Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Rindërton sketch-et e ETA-së (api/eta.py) nga kohët e porosive ekzistuese, nga më e vjetra te më e reja. "
+        "Sketch-et mbahen në rregull nga tranzicionet; kjo komandë përdoret në nisje ose pas ndryshimit të "
+        "ETA_MAX_SAMPLES, ose kur kohët janë ndryshuar jashtë Order.transition_to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Sa porosi lexohen nga databaza njëherësh.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size duhet të jetë >= 1.")
+        sketches = defaultdict(QuantileSketch) # (restaurant_id ose None, faza) -> sketch
+        fields = {field for _, start_field, end_field in STAGE_FOR_STATUS.values() for field in (start_field, end_field)}
+        orders = Order.objects.filter(restaurant__isnull=False).order_by('created_at', 'pk').values('restaurant_id', *fields)
+        samples = 0
+        for order in orders.iterator(chunk_size=options['chunk_size']):
+            for stage, start_field, end_field in STAGE_FOR_STATUS.values():
+                start, end = order[start_field], order[end_field]
+                if start is None or end is None or end < start:
+                    continue
+                seconds = (end - start).total_seconds()
+                sketches[(order['restaurant_id'], stage)].add(seconds)
+                sketches[(None, stage)].add(seconds)
+                samples += 1
+
+        with transaction.atomic():
+            EtaSketch.objects.all().delete()
+            EtaSketch.objects.bulk_create([
+                EtaSketch(
+                    restaurant_id=restaurant_id, stage=stage, bins=sketch.to_json(), count=sketch.count,
+                    estimate_seconds=sketch.quantile(ETA_QUANTILE),
+                )
+                for (restaurant_id, stage), sketch in sketches.items()
+            ], batch_size=500)
+        restaurants = len({restaurant_id for restaurant_id, _ in sketches if restaurant_id is not None})
+        self.stdout.write(self.style.SUCCESS(f"{samples} kohëzgjatje nga {restaurants} restorante, {len(sketches)} sketch-e u rindërtuan."))
@@ -0,0 +1,80 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from api import cache_utils
+from api.models import Restaurant, Review
+
+STARS = range(1, 6)
+RATING_FIELDS = Restaurant.RATING_AGGREGATE_FIELDS
+
+
+def rating_aggregates(reviews):
+    """{restaurant_id: {fusha: vlera}} për RATING_FIELDS, me një GROUP BY mbi vlerësimet e dhëna."""
+    rows = reviews.order_by().values('restaurant_id').annotate(
+        rating_sum=Sum('rating'),
+        rating_count=Count('id'),
+        **{f'rating_count_{stars}': Count('id', filter=Q(rating=stars)) for stars in STARS},
+    )
+    aggregates = {}
+    for row in rows:
+        restaurant_id = row.pop('restaurant_id')
+        row['average_rating'] = (Decimal(row['rating_sum']) / row['rating_count']).quantize(Decimal('0.01'), ROUND_HALF_UP)
+        aggregates[restaurant_id] = row
+    return aggregates
+
+
+class Command(BaseCommand):
+    help = (
+        "Rindërton rating_sum, rating_count, histogramin e yjeve dhe average_rating të restoranteve nga tabela Review. "
+        "Agregatet mbahen në rregull nga Review.save dhe sinjali post_delete; kjo komandë korrigjon devijimet nga "
+        "shkrimet që i anashkalojnë (bulk_create, update me queryset, SQL i drejtpërdrejtë)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Sa restorante kontrollohen (dhe bllokohen) për transaksion.")
+        parser.add_argument('--dry-run', action='store_true', help="Vetëm numëro restorantet me agregate të gabuara, pa i ndryshuar.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size duhet të jetë >= 1.")
+        dry_run = options['dry_run']
+
+        restaurant_ids = list(Restaurant.objects.order_by('pk').values_list('pk', flat=True))
+        checked = fixed = 0
+        for start in range(0, len(restaurant_ids), batch_size):
+            batch = restaurant_ids[start:start + batch_size]
+            with transaction.atomic():
+                # Rreshtat bllokohen para se të numërohen vlerësimet: një Review.save paralel ose ka përfunduar
+                # (dhe numërohet këtu), ose pret bllokimin dhe e aplikon ndryshimin e vet mbi vlerat e korrigjuara.
+                restaurants = Restaurant.objects.filter(pk__in=batch).only('pk', 'updated_at', *RATING_FIELDS)
+                if not dry_run:
+                    restaurants = restaurants.select_for_update()
+                restaurants = list(restaurants)
+                aggregates = rating_aggregates(Review.objects.filter(restaurant_id__in=batch))
+
+                changed = []
+                now = timezone.now() # bulk_update nuk prek auto_now
+                for restaurant in restaurants:
+                    expected = aggregates.get(restaurant.pk) or dict.fromkeys(RATING_FIELDS, 0)
+                    if any(getattr(restaurant, field) != expected[field] for field in RATING_FIELDS):
+                        for field in RATING_FIELDS:
+                            setattr(restaurant, field, expected[field])
+                        restaurant.updated_at = now
+                        changed.append(restaurant)
+                if changed and not dry_run:
+                    Restaurant.objects.bulk_update(changed, [*RATING_FIELDS, 'updated_at'])
+                    # bulk_update nuk dërgon sinjale: cache-i i detajeve invalidohet këtu, lista në fund
+                    for restaurant in changed:
+                        transaction.on_commit(lambda pk=restaurant.pk: cache_utils.invalidate_restaurant_detail_cache(pk))
+            checked += len(restaurants)
+            fixed += len(changed)
+
+        if fixed and not dry_run:
+            cache_utils.invalidate_restaurant_list_cache()
+        verb = "do të korrigjoheshin" if dry_run else "u korrigjuan"
+        self.stdout.write(self.style.SUCCESS(f"{checked} restorante u kontrolluan, {fixed} {verb}."))
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from api.db_routing import get_replicas
+from api.models import ReplicationHeartbeat
+
+HEARTBEAT_PK = 1
+
+
+class Command(BaseCommand):
+    help = (
+        "Mat vonesën e replikave: shkruan një heartbeat te primarja dhe mat sa kohë duhet që të shfaqet "
+        "te secila replikë (settings.DATABASE_REPLICAS). Në PostgreSQL shfaq edhe vonesën sipas "
+        "pg_last_xact_replay_timestamp(). Vonesa duhet të mbetet nën DATABASE_PRIMARY_STICKY_SECONDS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--timeout', type=float, default=10.0, help="Sa sekonda pritet heartbeat-i te një replikë.")
+        parser.add_argument('--interval', type=float, default=0.05, help="Sa shpesh (sekonda) kontrollohet replika.")
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError("Asnjë replikë e konfiguruar (settings.DATABASE_REPLICAS).")
+
+        lagging = []
+        for alias in replicas:
+            lag = self.measure(alias, options['timeout'], options['interval'])
+            if lag is None:
+                lagging.append(alias)
+                self.stdout.write(self.style.ERROR(f"{alias}: heartbeat-i nuk u pa pas {options['timeout']:.1f}s"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{alias}: vonesa {lag * 1000:.1f} ms"))
+            if connections[alias].vendor == 'postgresql':
+                self.stdout.write(f"{alias}: pg_last_xact_replay_timestamp {self.replay_lag(alias)}")
+        if lagging:
+            raise CommandError(f"Replikat me vonesë mbi {options['timeout']:.1f}s: {', '.join(lagging)}")
+
+    def measure(self, alias, timeout, interval):
+        """Sekondat derisa heartbeat-i i ri shfaqet te `alias`, ose None pas `timeout`."""
+        beat_at = timezone.now()
+        ReplicationHeartbeat.objects.using(DEFAULT_DB_ALIAS).update_or_create(pk=HEARTBEAT_PK, defaults={'beat_at': beat_at})
+        started = time.monotonic()
+        while True:
+            if ReplicationHeartbeat.objects.using(alias).filter(pk=HEARTBEAT_PK, beat_at__gte=beat_at).exists():
+                return time.monotonic() - started
+            if time.monotonic() - started > timeout:
+                return None
+            time.sleep(interval)
+
+    def replay_lag(self, alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT pg_is_in_recovery(), now() - pg_last_xact_replay_timestamp()")
+            in_recovery, lag = cursor.fetchone()
+        return lag if in_recovery else "(nuk është replikë në recovery)"
@@ -0,0 +1,111 @@
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import dispatch
+from api.dispatch_grid import KM_PER_DEGREE, distance_km
+
+CENTER = (42.6629, 21.1655) # Prishtina
+HANDOFF_MINUTES = 2 # Marrja e porosisë te restoranti dhe dorëzimi te klienti
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulon dispatch-in në memorie (pa databazë) dhe raporton pritjen e porosive te restoranti: "
+        "nga READY_FOR_PICKUP deri sa arrin shoferi. Porositë bëhen gati gjatë --duration minutave në "
+        "restorante të rastësishme; shoferët nisin nga pika të rastësishme dhe pas dorëzimit mbeten te klienti. "
+        "--policy batch përdor api.dispatch.plan çdo --interval sekonda; --policy oldest imiton claim-next "
+        "(çdo shofer i lirë merr porosinë më të vjetër, pavarësisht distancës)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--drivers', type=int, default=300)
+        parser.add_argument('--restaurants', type=int, default=150)
+        parser.add_argument('--duration', type=float, default=60, help="Minutat gjatë të cilave porositë bëhen gati.")
+        parser.add_argument('--area-km', type=float, default=12, help="Brinja e katrorit të qytetit në km.")
+        parser.add_argument('--interval', type=float, default=30, help="Sekonda mes raundeve të dispatch-it.")
+        parser.add_argument('--policy', choices=('batch', 'oldest', 'both'), default='both')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if min(options['orders'], options['drivers'], options['restaurants']) < 1 or options['interval'] <= 0:
+            raise CommandError("--orders, --drivers, --restaurants dhe --interval duhet të jenë pozitivë.")
+        policies = ('batch', 'oldest') if options['policy'] == 'both' else (options['policy'],)
+        for policy in policies:
+            self.report(policy, *self.simulate(policy, options))
+
+    def random_point(self, rng, area_km):
+        half = area_km / 2 / KM_PER_DEGREE
+        return CENTER[0] + rng.uniform(-half, half), CENTER[1] + rng.uniform(-half, half) / math.cos(math.radians(CENTER[0]))
+
+    def simulate(self, policy, options):
+        rng = random.Random(options['seed']) # E njëjta ngarkesë për çdo politikë
+        area_km = options['area_km']
+        restaurants = [self.random_point(rng, area_km) for _ in range(options['restaurants'])]
+        orders = sorted(
+            (rng.uniform(0, options['duration']), rng.choice(restaurants), self.random_point(rng, area_km))
+            for _ in range(options['orders'])
+        ) # (gati_në_minutë, restoranti, klienti)
+        drivers = [[0.0, self.random_point(rng, area_km)] for _ in range(options['drivers'])] # [i_lirë_në_minutë, pozicioni]
+        step = options['interval'] / 60
+
+        waits, pickup_km, solve_ms = [], [], []
+        next_order = 0
+        waiting = [] # Indekset e porosive gati pa shofer, nga më e vjetra
+        now = 0.0
+        while next_order < len(orders) or waiting:
+            while next_order < len(orders) and orders[next_order][0] <= now:
+                waiting.append(next_order)
+                next_order += 1
+            idle = [index for index, (free_at, _) in enumerate(drivers) if free_at <= now]
+            pairs = []
+            if waiting and idle:
+                started = time.perf_counter()
+                if policy == 'batch':
+                    planned = dispatch.plan(
+                        [drivers[index][1] for index in idle],
+                        [(*orders[order][1], now - orders[order][0]) for order in waiting],
+                    )
+                    pairs = [(idle[driver], waiting[order]) for driver, order, _ in planned]
+                else:
+                    pairs = list(zip(idle, waiting))
+                solve_ms.append((time.perf_counter() - started) * 1000)
+                for driver, order in pairs:
+                    ready_at, restaurant, customer = orders[order]
+                    km = distance_km(*drivers[driver][1], *restaurant)
+                    arrival = now + dispatch.travel_minutes(km)
+                    waits.append(arrival - ready_at)
+                    pickup_km.append(km)
+                    delivered = arrival + dispatch.travel_minutes(distance_km(*restaurant, *customer)) + HANDOFF_MINUTES
+                    drivers[driver] = [delivered, customer]
+                taken = {order for _, order in pairs}
+                waiting = [order for order in waiting if order not in taken]
+            if not pairs and next_order == len(orders) and len(idle) == len(drivers):
+                # Asgjë nuk ndryshon më: porositë e mbetura janë përtej MAX_PICKUP_KM nga çdo shofer
+                break
+            now += step
+        return waits, pickup_km, solve_ms, now, len(waiting)
+
+    def report(self, policy, waits, pickup_km, solve_ms, finished_at, unassigned):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"policy={policy}"))
+        if unassigned:
+            self.stdout.write(self.style.WARNING(
+                f"{unassigned} porosi mbetën pa shofer: asnjë shofer brenda {dispatch.MAX_PICKUP_KM} km"
+            ))
+        if not waits:
+            return
+        waits.sort()
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+        self.stdout.write(
+            f"pritja te restoranti: mesatarja {statistics.mean(waits):.1f} min, p50 {statistics.median(waits):.1f} min, "
+            f"p95 {p95:.1f} min, maks. {waits[-1]:.1f} min"
+        )
+        self.stdout.write(f"distanca deri te restoranti: mesatarja {statistics.mean(pickup_km):.2f} km")
+        self.stdout.write(
+            f"{len(solve_ms)} raunde, caktimi mesatarisht {statistics.mean(solve_ms):.1f} ms (maks. {max(solve_ms):.1f} ms); "
+            f"porosia e fundit u mor në minutën {finished_at:.0f}"
+        )
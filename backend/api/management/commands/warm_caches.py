@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from rest_framework.test import APIRequestFactory
+
+from api import cache_utils
+from api.models import Restaurant
+from api.views import CuisineTypeViewSet, RestaurantViewSet
+
+NAMESPACES = (
+    cache_utils.NS_CUISINE_TYPES_LIST,
+    cache_utils.NS_RESTAURANTS_LIST_PUBLIC,
+    cache_utils.NS_RESTAURANT_DETAIL,
+    cache_utils.NS_RESTAURANT_MENU,
+)
+
+
+class RateLimiter:
+    """Shpërndan kërkesat në kohë që të mos kalohen `rate` kërkesa në sekondë (mes të gjithë thread-eve)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Command(BaseCommand):
+    help = (
+        "Mbush cache-in (lloje kuzhinash, faqet e para të listës së restoranteve, detajet dhe menutë) "
+        "pas një deploy ose pastrimi të cache-it, duke kaluar nga të njëjtat views që përdorin klientët."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=3, help="Sa faqe të listës publike të restoranteve të mbushen.")
+        parser.add_argument('--page-size', type=int, default=None, help="page_size për faqet e listës (parazgjedhja e API-së nëse mungon).")
+        parser.add_argument('--batch-size', type=int, default=200, help="Sa restorante lexohen nga databaza në një hap.")
+        parser.add_argument('--concurrency', type=int, default=4, help="Sa kërkesa ekzekutohen njëkohësisht.")
+        parser.add_argument('--rate', type=float, default=0, help="Maksimumi i kërkesave në sekondë (0 = pa kufi).")
+        parser.add_argument('--host', default='localhost', help="Host-i që përdoret për URL-të absolute në përgjigje.")
+        parser.add_argument('--namespace', action='append', choices=NAMESPACES, dest='namespaces',
+                            help="Mbush vetëm këtë namespace (mund të përsëritet).")
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--concurrency dhe --batch-size duhet të jenë >= 1.")
+        self.factory = APIRequestFactory(SERVER_NAME=options['host'], HTTP_HOST=options['host'])
+        self.limiter = RateLimiter(options['rate'])
+        self.concurrency = options['concurrency']
+        namespaces = options['namespaces'] or NAMESPACES
+
+        self.stats = {namespace: {'requests': 0, 'errors': 0, 'seconds': 0.0} for namespace in namespaces}
+        self.stats_lock = threading.Lock()
+
+        if cache_utils.NS_CUISINE_TYPES_LIST in namespaces:
+            self.run(cache_utils.NS_CUISINE_TYPES_LIST, [(CuisineTypeViewSet.as_view({'get': 'list'}), '/api/cuisine-types/', {}, None)])
+
+        if cache_utils.NS_RESTAURANTS_LIST_PUBLIC in namespaces:
+            self.run(cache_utils.NS_RESTAURANTS_LIST_PUBLIC, self.list_page_calls(options['pages'], options['page_size']))
+
+        detail_view = RestaurantViewSet.as_view({'get': 'retrieve'})
+        menu_items_view = RestaurantViewSet.as_view({'get': 'menu_items_for_restaurant'})
+        menu_categories_view = RestaurantViewSet.as_view({'get': 'menu_categories_for_restaurant'})
+        for batch in self.public_restaurant_batches(options['batch_size']):
+            if cache_utils.NS_RESTAURANT_DETAIL in namespaces:
+                self.run(cache_utils.NS_RESTAURANT_DETAIL, [
+                    (detail_view, f'/api/restaurants/{pk}/', {'pk': pk}, None) for pk in batch
+                ])
+            if cache_utils.NS_RESTAURANT_MENU in namespaces:
+                self.run(cache_utils.NS_RESTAURANT_MENU, [
+                    (view, f'/api/restaurants/{pk}/{path}/', {'pk': pk}, None)
+                    for pk in batch
+                    for view, path in ((menu_items_view, 'menu-items'), (menu_categories_view, 'menu-categories'))
+                ])
+
+        for namespace, stat in self.stats.items():
+            line = f"{namespace}: {stat['requests']} kërkesa, {stat['errors']} gabime, {stat['seconds']:.2f}s"
+            self.stdout.write(self.style.ERROR(line) if stat['errors'] else self.style.SUCCESS(line))
+
+    def list_page_calls(self, pages, page_size):
+        view = RestaurantViewSet.as_view({'get': 'list'})
+        restaurant_count = Restaurant.objects.filter(is_active=True, is_approved=True).count()
+        per_page = page_size or RestaurantViewSet.pagination_class.page_size or restaurant_count or 1
+        last_page = max(1, min(pages, -(-restaurant_count // per_page)))
+        calls = []
+        for page in range(1, last_page + 1):
+            params = {'page': page}
+            if page_size:
+                params['page_size'] = page_size
+            calls.append((view, '/api/restaurants/', {}, params))
+        return calls
+
+    def public_restaurant_batches(self, batch_size):
+        # Paginim sipas pk, që çdo hap të jetë një query e shkurtër edhe me shumë restorante
+        last_pk = 0
+        while True:
+            batch = list(
+                Restaurant.objects.filter(is_active=True, is_approved=True, pk__gt=last_pk)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1]
+
+    def request(self, call):
+        view, path, kwargs, params = call
+        self.limiter.wait()
+        request = self.factory.get(path, params)
+        request.user = AnonymousUser() # Variantet publike, të njëjtat që marrin klientët
+        try:
+            response = view(request, **kwargs)
+            return response.status_code < 400
+        except Exception as exc:
+            self.stderr.write(f"{path}: {exc}")
+            return False
+        finally:
+            if self.concurrency > 1:
+                connections.close_all() # Çdo thread hap lidhjet e veta me databazën
+
+    def run(self, namespace, calls):
+        started = time.monotonic()
+        if self.concurrency > 1:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                results = list(executor.map(self.request, calls))
+        else:
+            results = [self.request(call) for call in calls]
+        with self.stats_lock:
+            stat = self.stats[namespace]
+            stat['requests'] += len(results)
+            stat['errors'] += results.count(False)
+            stat['seconds'] += time.monotonic() - started
@@ -0,0 +1,131 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Index
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """
+    AddIndex që në PostgreSQL ndërtohet me CREATE INDEX CONCURRENTLY: tabela mbetet e shkrueshme
+    gjatë ndërtimit. Nuk importon django.contrib.postgres, që migrimi të funksionojë edhe në SQLite.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _is_postgresql(schema_editor):
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _is_postgresql(schema_editor):
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
+
+
+class DropForeignKeyIndexConcurrently(migrations.AlterField):
+    """
+    AlterField(db_index=False) për një FK: në PostgreSQL indeksi i vjetër hiqet me DROP INDEX CONCURRENTLY
+    (rikrijohet me CREATE INDEX CONCURRENTLY në rollback); në databazat e tjera sillet si AlterField.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            column = model._meta.get_field(self.name).column
+            meta_index_names = {index.name for index in model._meta.indexes}
+            for index_name in schema_editor._constraint_names(model, [column], index=True, type_=Index.suffix, exclude=meta_index_names):
+                schema_editor.execute(schema_editor._delete_index_sql(model, index_name, concurrently=True))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            field = model._meta.get_field(self.name)
+            schema_editor.execute(schema_editor._create_index_sql(model, fields=[field], concurrently=True))
+
+
+class Migration(migrations.Migration):
+    """
+    Tabela api_order mund të ketë miliona rreshta, prandaj indekset ndërtohen dhe hiqen CONCURRENTLY
+    (pa transaksion: atomic = False), pa bllokuar porositë e reja gjatë ndërtimit. Nëse një CREATE INDEX
+    CONCURRENTLY dështon, PostgreSQL lë një indeks INVALID: fshijeni me DROP INDEX CONCURRENTLY dhe
+    ekzekutoni sërish `migrate`. Indekset e FK-ve hiqen vetëm pasi janë ndërtuar indekset e përbëra
+    që i zëvendësojnë (e njëjta kolonë në fillim), që query-t të kenë gjithmonë një indeks.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('api', '0010_order_confirmed_at_order_delivery_fee_and_more'),
+    ]
+
+    # Indekset e përbëra krijohen para se të hiqen indekset e veçanta të FK-ve
+    operations = [
+        AddIndexConcurrently(
+            model_name='menuitem',
+            index=models.Index(fields=['restaurant', 'is_available'], name='menuitem_rest_available_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['restaurant', '-created_at'], name='order_restaurant_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['driver', 'status'], name='order_driver_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(condition=models.Q(('driver__isnull', True), ('status', 'READY_FOR_PICKUP')), fields=['ready_for_pickup_at', 'created_at'], name='order_claimable_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='pageviewlog',
+            index=models.Index(fields=['restaurant', '-viewed_at'], name='pageview_rest_viewed_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='restaurant',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_approved', True)), fields=['name'], name='restaurant_public_name_idx'),
+        ),
+        DropForeignKeyIndexConcurrently(
+            model_name='menuitem',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, help_text='Restoranti të cilit i përket ky artikull', on_delete=django.db.models.deletion.CASCADE, related_name='all_menu_items', to='api.restaurant'),
+        ),
+        DropForeignKeyIndexConcurrently(
+            model_name='order',
+            name='customer',
+            field=models.ForeignKey(db_index=False, help_text='Klienti që bëri porosinë', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to=settings.AUTH_USER_MODEL),
+        ),
+        DropForeignKeyIndexConcurrently(
+            model_name='order',
+            name='driver',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Shoferi i caktuar për dërgesën (opsional)', limit_choices_to={'role': 'DRIVER'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to=settings.AUTH_USER_MODEL),
+        ),
+        DropForeignKeyIndexConcurrently(
+            model_name='order',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, help_text='Restoranti nga i cili u porosit', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='api.restaurant'),
+        ),
+        DropForeignKeyIndexConcurrently(
+            model_name='pageviewlog',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='page_views', to='api.restaurant'),
+        ),
+    ]
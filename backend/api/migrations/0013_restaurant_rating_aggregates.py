@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:14
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    # Vlerat fillestare nga vlerësimet ekzistuese; më pas i mban Review.save / post_delete
+    Restaurant = apps.get_model('api', 'Restaurant')
+    Review = apps.get_model('api', 'Review')
+    rows = Review.objects.order_by().values('restaurant_id').annotate(
+        total=Sum('rating'), count=Count('id'),
+        **{f'stars_{stars}': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)},
+    )
+    for row in rows:
+        Restaurant.objects.filter(pk=row['restaurant_id']).update(
+            rating_sum=row['total'], rating_count=row['count'], average_rating=(Decimal(row['total']) / row['count']).quantize(Decimal('0.01'), ROUND_HALF_UP),
+            **{f'rating_count_{stars}': row[f'stars_{stars}'] for stars in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_review_restaurant_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, help_text='Numri i vlerësimeve'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_count_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, help_text='Shuma e yjeve të të gjitha vlerësimeve'),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:34
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_address_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='driverprofile',
+            name='current_location_lat',
+            field=models.DecimalField(blank=True, decimal_places=6, help_text='Gjerësia gjeografike aktuale', max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='driverprofile',
+            name='current_location_lon',
+            field=models.DecimalField(blank=True, decimal_places=6, help_text='Gjatësia gjeografike aktuale', max_digits=9, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddField(
+            model_name='driverprofile',
+            name='location_updated_at',
+            field=models.DateTimeField(blank=True, help_text='Kur u përditësua pozicioni për herë të fundit.', null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_driver_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtaSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(choices=[('PREP', 'Përgatitja (krijimi -> gati për marrje)'), ('DELIVERY', 'Dërgesa (gati për marrje -> dërguar)')], max_length=20)),
+                ('bins', models.JSONField(default=dict, help_text='Numëruesit e sketch-it sipas indeksit logaritmik.')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('estimate_seconds', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('restaurant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='eta_sketches', to='api.restaurant')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurant', 'stage'), name='eta_sketch_restaurant_stage_uniq'), models.UniqueConstraint(condition=models.Q(('restaurant__isnull', True)), fields=('stage',), name='eta_sketch_global_stage_uniq')],
+            },
+        ),
+    ]
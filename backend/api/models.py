@@ -1,8 +1,10 @@
 # backend/api/models.py
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.conf import settings # Për AUTH_USER_MODEL te ForeignKey
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.dispatch import Signal
 from django.utils import timezone # SHTO KËTË
 
 class UserManager(BaseUserManager):
@@ -71,6 +73,7 @@ class User(AbstractUser):
     profile_picture = models.ImageField(upload_to='profile_pictures/', null=True, blank=True, help_text="Fotoja e profilit.")
 
     is_available_for_delivery = models.BooleanField(default=False, help_text="A është shoferi aktualisht i disponueshëm për të marrë dërgesa?") 
+    updated_at = models.DateTimeField(auto_now=True) # Validatorët e përgjigjeve që përfshijnë përdoruesin (p.sh. detajet e porosisë)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name'] # Kërkohen vetëm gjatë `createsuperuser`
@@ -99,6 +102,9 @@ class Address(models.Model):
     state_province = models.CharField(max_length=100, blank=True, null=True, help_text="Shteti/Provinca/Rajoni (opsionale).")
     postal_code = models.CharField(max_length=20, help_text="Kodi postar.")
     country = models.CharField(max_length=100, default='Kosovo', help_text="Shteti.")
+    # Koordinatat (WGS84): për restorantet përdoren nga grid-i i porosive gati për dërgesë (shih dispatch_grid.py)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)], help_text="Gjerësia gjeografike.")
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)], help_text="Gjatësia gjeografike.")
     
     is_default_shipping = models.BooleanField(default=False, help_text="A është kjo adresa primare e dërgesës për përdoruesin?")
     # is_primary_location = models.BooleanField(default=False) # Për restorantet, do ta shtojmë kur të kemi modelin Restaurant
@@ -164,6 +170,15 @@ class Restaurant(models.Model):
     )
     
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00, help_text="Vlerësimi mesatar nga klientët")
+    # Agregatet e vlerësimeve, të mbajtura nga Review.save / sinjali post_delete (shih apply_rating_change)
+    # dhe të rindërtueshme me `manage.py reconcile_ratings`
+    rating_sum = models.PositiveIntegerField(default=0, help_text="Shuma e yjeve të të gjitha vlerësimeve")
+    rating_count = models.PositiveIntegerField(default=0, help_text="Numri i vlerësimeve")
+    rating_count_1 = models.PositiveIntegerField(default=0)
+    rating_count_2 = models.PositiveIntegerField(default=0)
+    rating_count_3 = models.PositiveIntegerField(default=0)
+    rating_count_4 = models.PositiveIntegerField(default=0)
+    rating_count_5 = models.PositiveIntegerField(default=0)
     delivery_time_estimate = models.CharField(max_length=50, blank=True, null=True, help_text="Koha e përafërt e dërgesës (p.sh., '25-35 min')")
     price_range = models.CharField(max_length=10, blank=True, null=True, choices=[('€', '€ (Lirë)'), ('€€', '€€ (Mesatare)'), ('€€€', '€€€ (Shtrenjtë)')], help_text="Gama e çmimeve")
 
@@ -180,10 +195,66 @@ class Restaurant(models.Model):
         verbose_name = "Restorant"
         verbose_name_plural = "Restorantet"
         ordering = ['name']
+        indexes = [
+            # Lista publike: vetëm restorantet aktive dhe të aprovuara, të renditura sipas emrit
+            models.Index(fields=['name'], condition=models.Q(is_active=True, is_approved=True), name='restaurant_public_name_idx'),
+        ]
+
+    # Shkruhen vetëm me apply_rating_change / reconcile_ratings, ose kur jepen shprehimisht te update_fields
+    RATING_AGGREGATE_FIELDS = (
+        'rating_sum', 'rating_count', *(f'rating_count_{stars}' for stars in range(1, 6)), 'average_rating',
+    )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, update_fields=None, **kwargs):
+        """
+        Një save() pa update_fields mbi një restorant ekzistues nuk i shkruan agregatet e vlerësimeve:
+        vlerat në memorie mund të jenë të vjetra dhe do të mbishkruanin një vlerësim paralel.
+        """
+        if update_fields is None and not self._state.adding and not args and not kwargs.get('force_insert'):
+            skipped = set(self.RATING_AGGREGATE_FIELDS) | self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped and field.attname not in skipped
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    @property
+    def rating_histogram(self):
+        """{yje: numri i vlerësimeve} për 1..5."""
+        return {stars: getattr(self, f'rating_count_{stars}') for stars in range(1, 6)}
+
+    @classmethod
+    def apply_rating_change(cls, restaurant_id, added=None, removed=None):
+        """
+        Shton dhe/ose heq një vlerësim (numri i yjeve) nga agregatet e restorantit me një UPDATE të vetëm me F(),
+        pa lexuar rreshtin: dy vlerësime njëkohësisht nuk ia mbishkruajnë njëri-tjetrit ndryshimin.
+        Thirret brenda transaksionit të shkrimit të Review. Në SET, F() lexon vlerat para UPDATE-it,
+        prandaj average_rating llogaritet nga vlerat e vjetra plus ndryshimi.
+        """
+        if added == removed: # Asgjë për të ndryshuar (p.sh. u modifikua vetëm komenti)
+            return
+        sum_delta = (added or 0) - (removed or 0)
+        count_delta = int(added is not None) - int(removed is not None)
+        updates = {}
+        if added is not None:
+            updates[f'rating_count_{added}'] = models.F(f'rating_count_{added}') + 1
+        if removed is not None:
+            updates[f'rating_count_{removed}'] = models.F(f'rating_count_{removed}') - 1
+        new_count = models.F('rating_count') + count_delta
+        updates.update(
+            rating_sum=models.F('rating_sum') + sum_delta,
+            rating_count=new_count,
+            average_rating=Cast(
+                Coalesce(Cast(models.F('rating_sum') + sum_delta, models.FloatField()) / NullIf(new_count, 0), 0.0),
+                models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+        )
+        # update() anashkalon auto_now: updated_at ngrihet këtu që validatorët (ETag/Last-Modified) ta shohin ndryshimin
+        cls.objects.filter(pk=restaurant_id).update(**updates, updated_at=timezone.now())
+
 class OperatingHours(models.Model):
     """Orari i punës për një restorant."""
     class DayOfWeek(models.IntegerChoices):
@@ -233,7 +304,7 @@ class MenuItem(models.Model):
     category = models.ForeignKey(MenuCategory, on_delete=models.CASCADE, related_name='menu_items', help_text="Kategoria së cilës i përket ky artikull")
     # Për qasje më të lehtë, mund të shtojmë edhe një ForeignKey direkt te Restaurant,
     # edhe pse mund të arrihet përmes category.restaurant. Kjo mund të ndihmojë në query.
-    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='all_menu_items', help_text="Restoranti të cilit i përket ky artikull") # SHTO KËTË
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='all_menu_items', db_index=False, help_text="Restoranti të cilit i përket ky artikull") # Indeksi është te Meta.indexes
 
     name = models.CharField(max_length=255, help_text="Emri i artikullit të menusë")
     description = models.TextField(blank=True, null=True, help_text="Përshkrimi i artikullit")
@@ -251,6 +322,9 @@ class MenuItem(models.Model):
 
     class Meta:
         ordering = ['category__display_order', 'category__name', 'name'] # Rendit sipas kategorisë dhe pastaj emrit
+        indexes = [
+            models.Index(fields=['restaurant', 'is_available'], name='menuitem_rest_available_idx'), # Menuja publike e restorantit
+        ]
         verbose_name = "Artikull Menuje"
         verbose_name_plural = "Artikujt e Menuve"
 
@@ -284,7 +358,15 @@ class Cart(models.Model):
 
     @property
     def total_amount(self):
-        return sum(item.subtotal for item in self.items.all())
+        # Me artikujt e prefetch-uar (shih CartViewSet.cart_read_queryset): një kalim në memorie;
+        # përndryshe një SUM në databazë, jo një query për çdo artikull
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum((item.subtotal for item in self.items.all()), 0)
+        total = self.items.aggregate(total=models.Sum(
+            models.F('quantity') * models.F('menu_item__price'),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ))['total']
+        return total or 0
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
@@ -321,10 +403,29 @@ class Review(models.Model):
         ordering = ['-created_at']
         # Siguron që një përdorues mund të lërë vetëm një vlerësim për restorant
         unique_together = ('restaurant', 'user') 
+        indexes = [
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='review_rest_created_idx'), # Lista e vlerësimeve (keyset)
+        ]
 
     def __str__(self):
         return f"Review by {self.user.get_full_name() or self.user.email} for {self.restaurant.name} - {self.rating} stars"
 
+    def save(self, *args, **kwargs):
+        # Agregatet e restorantit ndryshojnë në të njëjtin transaksion me vlerësimin.
+        # Fshirja trajtohet nga sinjali post_delete (mbulon edhe fshirjet me queryset dhe kaskadë).
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Review.objects.select_for_update().filter(pk=self.pk).values_list('restaurant_id', 'rating').first()
+            super().save(*args, **kwargs)
+            if previous is None:
+                Restaurant.apply_rating_change(self.restaurant_id, added=self.rating)
+            elif previous[0] != self.restaurant_id:
+                Restaurant.apply_rating_change(previous[0], removed=previous[1])
+                Restaurant.apply_rating_change(self.restaurant_id, added=self.rating)
+            else:
+                Restaurant.apply_rating_change(self.restaurant_id, added=self.rating, removed=previous[1])
+
 
 class ReviewReply(models.Model):
     review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='replies')
@@ -344,6 +445,19 @@ class ReviewReply(models.Model):
         return f"Reply by {self.user.email} to review for '{self.review.restaurant.name}'"
 
 
+# Dërgohet pas çdo tranzicioni të suksesshëm të Order.transition_to (UPDATE-i nuk dërgon post_save).
+# Argumentet: instance, old_status, new_status
+order_status_changed = Signal()
+
+
+class OrderTransitionError(Exception):
+    """Tranzicioni i kërkuar nuk lejohet nga statusi aktual ose nga ky aktor."""
+
+
+class OrderTransitionConflict(OrderTransitionError):
+    """Porosia u ndryshua nga një kërkesë tjetër ndërkohë (statusi në databazë nuk është më ai i pritur)."""
+
+
 class Order(models.Model):
     class OrderStatus(models.TextChoices):
         PENDING = 'PENDING', 'Në Pritje' # Porosia sapo është bërë nga klienti
@@ -356,6 +470,10 @@ class Order(models.Model):
         CANCELLED_BY_RESTAURANT = 'CANCELLED_BY_RESTAURANT', 'Anuluar nga Restoranti'
         FAILED_DELIVERY = 'FAILED_DELIVERY', 'Dërgesa Dështoi'
 
+    class Actor(models.TextChoices):
+        RESTAURANT = 'RESTAURANT', 'Restoranti'
+        DRIVER = 'DRIVER', 'Shoferi'
+
     class PaymentMethod(models.TextChoices):
         CASH_ON_DELIVERY = 'CASH_ON_DELIVERY', 'Para në Dorë'
         CARD_ONLINE = 'CARD_ONLINE', 'Kartë Online' # Për të ardhmen
@@ -365,9 +483,10 @@ class Order(models.Model):
         PAID = 'PAID', 'Paguar'
         FAILED = 'FAILED', 'Dështuar'
 
-    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='orders', help_text="Klienti që bëri porosinë")
-    restaurant = models.ForeignKey(Restaurant, on_delete=models.SET_NULL, null=True, related_name='orders', help_text="Restoranti nga i cili u porosit")
-    driver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='deliveries', limit_choices_to={'role': User.Role.DRIVER}, help_text="Shoferi i caktuar për dërgesën (opsional)")
+    # Indekset e FK-ve janë te Meta.indexes (të përbëra me created_at/status), jo të veçanta
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, db_index=False, related_name='orders', help_text="Klienti që bëri porosinë")
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.SET_NULL, null=True, db_index=False, related_name='orders', help_text="Restoranti nga i cili u porosit")
+    driver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='deliveries', limit_choices_to={'role': User.Role.DRIVER}, help_text="Shoferi i caktuar për dërgesën (opsional)")
     
     # Detajet e adresës së dërgesës (mund të kopjohen nga Adresa e userit në momentin e porosisë)
     delivery_address_street = models.CharField(max_length=255, help_text="Rruga e dërgesës")
@@ -402,22 +521,141 @@ class Order(models.Model):
         ordering = ['-created_at']
         verbose_name = "Porosi"
         verbose_name_plural = "Porositë"
+        indexes = [
+            models.Index(fields=['customer', '-created_at'], name='order_customer_created_idx'), # Porositë e klientit
+            models.Index(fields=['restaurant', '-created_at'], name='order_restaurant_created_idx'), # Paneli i restorantit
+            models.Index(fields=['driver', 'status'], name='order_driver_status_idx'), # Dërgesat e shoferit / dërgesa aktive
+            # Vetëm porositë që presin shofer (pak rreshta edhe me miliona porosi): claim_for_driver
+            models.Index(
+                fields=['ready_for_pickup_at', 'created_at'],
+                condition=models.Q(status='READY_FOR_PICKUP', driver__isnull=True),
+                name='order_claimable_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Porosia #{self.id} nga {self.customer.email if self.customer else 'N/A'} te {self.restaurant.name if self.restaurant else 'N/A'}"
 
+    # Tabela e tranzicioneve: (statusi aktual, statusi i ri) -> aktorët që mund ta bëjnë
+    TRANSITIONS = {
+        (OrderStatus.PENDING, OrderStatus.CONFIRMED): {Actor.RESTAURANT},
+        (OrderStatus.PENDING, OrderStatus.CANCELLED_BY_RESTAURANT): {Actor.RESTAURANT},
+        (OrderStatus.CONFIRMED, OrderStatus.PREPARING): {Actor.RESTAURANT},
+        (OrderStatus.CONFIRMED, OrderStatus.CANCELLED_BY_RESTAURANT): {Actor.RESTAURANT},
+        (OrderStatus.PREPARING, OrderStatus.READY_FOR_PICKUP): {Actor.RESTAURANT},
+        (OrderStatus.PREPARING, OrderStatus.CANCELLED_BY_RESTAURANT): {Actor.RESTAURANT},
+        (OrderStatus.READY_FOR_PICKUP, OrderStatus.CONFIRMED): {Actor.DRIVER}, # Shoferi pranon dërgesën
+        (OrderStatus.CONFIRMED, OrderStatus.ON_THE_WAY): {Actor.DRIVER},
+        (OrderStatus.ON_THE_WAY, OrderStatus.DELIVERED): {Actor.DRIVER},
+        (OrderStatus.ON_THE_WAY, OrderStatus.FAILED_DELIVERY): {Actor.DRIVER},
+    }
+    FINAL_STATUSES = (
+        OrderStatus.DELIVERED, OrderStatus.FAILED_DELIVERY,
+        OrderStatus.CANCELLED_BY_USER, OrderStatus.CANCELLED_BY_RESTAURANT,
+    )
+    # Kolona e kohës që vendoset kur porosia hyn në një status
+    STATUS_TIMESTAMP_FIELDS = {
+        OrderStatus.CONFIRMED: 'confirmed_at',
+        OrderStatus.PREPARING: 'preparation_started_at',
+        OrderStatus.READY_FOR_PICKUP: 'ready_for_pickup_at',
+        OrderStatus.ON_THE_WAY: 'picked_up_by_driver_at',
+        OrderStatus.DELIVERED: 'actual_delivery_time',
+    }
+    # Statuset në të cilat porosia e zë shoferin (një shofer mund të ketë vetëm një dërgesë aktive)
+    DRIVER_ACTIVE_STATUSES = (OrderStatus.CONFIRMED, OrderStatus.ON_THE_WAY)
+    CLAIM_CANDIDATES = 20 # Sa kandidatë provohen në SQLite para se të dorëzohet claim-i
+
+    @classmethod
+    def statuses_for_actor(cls, actor):
+        return {new for (_, new), actors in cls.TRANSITIONS.items() if actor in actors}
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statusi i lexuar nga databaza, që save() të dallojë ndryshimin pa një SELECT shtesë
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def transition_to(self, new_status, actor, expected=None, **fields):
+        """
+        Kalon porosinë në `new_status` me një UPDATE të vetëm të kushtëzuar:
+        UPDATE ... SET status, <koha e statusit>, updated_at, **fields WHERE id=? AND status=<aktual> AND **expected.
+        Ngre OrderTransitionError nëse tabela nuk e lejon tranzicionin dhe OrderTransitionConflict
+        nëse porosia ndryshoi ndërkohë (asnjë rresht nuk u përditësua).
+        """
+        old_status = self.status
+        if actor not in self.TRANSITIONS.get((old_status, new_status), ()):
+            if new_status not in self.statuses_for_actor(actor):
+                raise OrderTransitionError(f"Statusi '{new_status}' nuk është valid ose nuk lejohet të vendoset nga {self.Actor(actor).label.lower()}.")
+            if old_status in self.FINAL_STATUSES:
+                raise OrderTransitionError(f"Porosia tashmë është në statusin '{self.get_status_display()}' dhe nuk mund të ndryshohet më tej.")
+            raise OrderTransitionError(f"Nuk mund të kalohet nga statusi '{old_status}' direkt në '{new_status}'.")
+
+        now = timezone.now()
+        values = {'status': new_status, 'updated_at': now, **fields} # updated_at: UPDATE nuk e vendos vetë (auto_now), ETag-ët varen nga ai
+        timestamp_field = self.STATUS_TIMESTAMP_FIELDS.get(new_status)
+        if timestamp_field:
+            values[timestamp_field] = now
+        updated = Order.objects.filter(pk=self.pk, status=old_status, **(expected or {})).update(**values)
+        if not updated:
+            raise OrderTransitionConflict("Porosia u ndryshua nga një kërkesë tjetër. Rifreskoni dhe provoni përsëri.")
+
+        for field_name, value in values.items():
+            setattr(self, field_name, value)
+        self._loaded_status = new_status
+        order_status_changed.send(sender=Order, instance=self, old_status=old_status, new_status=new_status)
+
+    @classmethod
+    def claim_for_driver(cls, driver, order_id=None):
+        """
+        Cakton atomikisht shoferin te një porosi READY_FOR_PICKUP pa shofer (ose te `order_id` nëse jepet),
+        duke zgjedhur më të vjetrën. Kthen porosinë e marrë, ose None nëse nuk ka kandidat të lirë.
+        Kontrolli "një dërgesë aktive për shofer" bëhet në të njëjtin transaksion; nëse shoferi
+        ka tashmë një dërgesë aktive ngrihet OrderTransitionError.
+
+        PostgreSQL: kandidati bllokohet me SELECT ... FOR UPDATE SKIP LOCKED, kështu shoferët paralelë
+        marrin porosi të ndryshme pa pritur njëri-tjetrin. SQLite (pa FOR UPDATE): provohen kandidatët
+        me UPDATE-in e kushtëzuar të transition_to dhe kalohet te tjetri kur dikush e ka marrë.
+        Në SQLite përdorni OPTIONS {'transaction_mode': 'IMMEDIATE'}, përndryshe transaksionet paralele
+        dështojnë me "database is locked" kur kalojnë nga leximi te shkrimi.
+        """
+        with transaction.atomic():
+            # Rreshti i shoferit bllokohet që dy claim-e paralele të të njëjtit shofer të serializohen
+            # (në SQLite select_for_update nuk ka efekt; shkrimet atje serializohen nga vetë databaza)
+            list(User.objects.select_for_update().filter(pk=driver.pk).values_list('pk', flat=True))
+            if cls.objects.filter(driver=driver, status__in=cls.DRIVER_ACTIVE_STATUSES).exists():
+                raise OrderTransitionError("Ju tashmë keni një dërgesë aktive. Përfundoni atë para se të pranoni një tjetër.")
+
+            candidates = cls.objects.filter(status=cls.OrderStatus.READY_FOR_PICKUP, driver__isnull=True)
+            if order_id is not None:
+                candidates = candidates.filter(pk=order_id)
+            candidates = candidates.order_by('ready_for_pickup_at', 'created_at', 'pk')
+
+            if transaction.get_connection().features.has_select_for_update_skip_locked:
+                order = candidates.select_for_update(skip_locked=True).first()
+                if order is None:
+                    return None
+                order.transition_to(cls.OrderStatus.CONFIRMED, cls.Actor.DRIVER, expected={'driver__isnull': True}, driver=driver)
+                return order
+
+            for order in candidates[:cls.CLAIM_CANDIDATES]:
+                try:
+                    order.transition_to(cls.OrderStatus.CONFIRMED, cls.Actor.DRIVER, expected={'driver__isnull': True}, driver=driver)
+                except OrderTransitionConflict:
+                    continue # E mori një shofer tjetër ndërkohë
+                return order
+            return None
+
     def save(self, *args, **kwargs):
-        # Përditëso kohët e statusit nëse statusi ndryshon
-        is_new = self._state.adding
-        if not is_new: # Nëse është një update
-            old_order = Order.objects.get(pk=self.pk)
-            if old_order.status != self.status:
-                if self.status == self.OrderStatus.CONFIRMED: self.confirmed_at = timezone.now()
-                elif self.status == self.OrderStatus.PREPARING: self.preparation_started_at = timezone.now()
-                elif self.status == self.OrderStatus.READY_FOR_PICKUP: self.ready_for_pickup_at = timezone.now()
-                elif self.status == self.OrderStatus.ON_THE_WAY: self.picked_up_by_driver_at = timezone.now()
-                elif self.status == self.OrderStatus.DELIVERED: self.actual_delivery_time = timezone.now()
+        # Përditëso kohët e statusit nëse statusi ndryshon (p.sh. nga admini); tranzicionet e zakonshme
+        # kalojnë nga transition_to. Statusi i mëparshëm vjen nga from_db, pa lexuar databazën përsëri.
+        loaded_status = getattr(self, '_loaded_status', None)
+        if not self._state.adding and loaded_status is not None and self.status != loaded_status:
+            timestamp_field = self.STATUS_TIMESTAMP_FIELDS.get(self.status)
+            if timestamp_field:
+                setattr(self, timestamp_field, timezone.now())
         super().save(*args, **kwargs)
+        self._loaded_status = self.status
 
 
 class OrderItem(models.Model):
@@ -463,10 +701,10 @@ class DriverProfile(models.Model):
         unique=True, # Targa duhet të jetë unike ose null
         help_text="Targa e mjetit (nëse ka)"
     )
-    # current_location_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Gjerësia gjeografike aktuale")
-    # current_location_lon = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Gjatësia gjeografike aktuale")
-    # Për lokacionin, mund të përdorni PostGIS ose një zgjidhje më të thjeshtë me dy fusha Decimal.
-    # Për momentin, i komentojmë pasi kërkojnë më shumë konfigurim dhe përditësime të shpeshta.
+    # Pozicioni i fundit i dërguar nga aplikacioni i shoferit; përdoret nga dispatch-i në grup (shih dispatch.py)
+    current_location_lat = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)], help_text="Gjerësia gjeografike aktuale")
+    current_location_lon = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)], help_text="Gjatësia gjeografike aktuale")
+    location_updated_at = models.DateTimeField(null=True, blank=True, help_text="Kur u përditësua pozicioni për herë të fundit.")
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -479,7 +717,7 @@ class DriverProfile(models.Model):
         return f"Profil për shoferin: {self.user.email}"
 
 class PageViewLog(models.Model):
-    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='page_views')
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='page_views', db_index=False) # Indeksi është te Meta.indexes
     viewed_at = models.DateTimeField(auto_now_add=True)
     # mund të shtosh user (nëse është i kyçur) ose IP address për më shumë detaje
     # user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
@@ -487,8 +725,47 @@ class PageViewLog(models.Model):
 
     class Meta:
         ordering = ['-viewed_at']
+        indexes = [
+            models.Index(fields=['restaurant', '-viewed_at'], name='pageview_rest_viewed_idx'),
+        ]
         verbose_name = "Restaurant Page View Log"
         verbose_name_plural = "Restaurant Page View Logs"
 
     def __str__(self):
-        return f"View for {self.restaurant.name} at {self.viewed_at.strftime('%Y-%m-%d %H:%M')}"
\ No newline at end of file
+        return f"View for {self.restaurant.name} at {self.viewed_at.strftime('%Y-%m-%d %H:%M')}"
+
+class ReplicationHeartbeat(models.Model):
+    """
+    Një rresht i vetëm që `manage.py replica_lag` e shkruan te primarja dhe pret ta shohë te replikat,
+    për të matur vonesën e replikimit (shih api/db_routing.py).
+    """
+    beat_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Heartbeat {self.beat_at.isoformat()}"
+
+class EtaSketch(models.Model):
+    """
+    Sketch kuantilesh (shih api/eta.py) i kohëzgjatjeve të një faze të porosisë, për një restorant
+    ose për të gjitha restorantet (restaurant=None). Përditësohet në tranzicionet e porosive;
+    estimate_seconds mban kuantilin e parashikimit, që krijimi i porosisë të mos llogarisë asgjë.
+    """
+    class Stage(models.TextChoices):
+        PREP = 'PREP', 'Përgatitja (krijimi -> gati për marrje)'
+        DELIVERY = 'DELIVERY', 'Dërgesa (gati për marrje -> dërguar)'
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, null=True, blank=True, related_name='eta_sketches')
+    stage = models.CharField(max_length=20, choices=Stage.choices)
+    bins = models.JSONField(default=dict, help_text="Numëruesit e sketch-it sipas indeksit logaritmik.")
+    count = models.PositiveIntegerField(default=0)
+    estimate_seconds = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['restaurant', 'stage'], name='eta_sketch_restaurant_stage_uniq'),
+            models.UniqueConstraint(fields=['stage'], condition=models.Q(restaurant__isnull=True), name='eta_sketch_global_stage_uniq'),
+        ]
+
+    def __str__(self):
+        return f"ETA {self.stage} për {self.restaurant_id or 'të gjitha restorantet'} ({self.count})"
@@ -0,0 +1,150 @@
+# backend/api/pagination.py
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class StandardResultsSetPagination(PageNumberPagination):
+    """
+    Paginimi standard me numër faqeje, por lejon klientin të zgjedhë `page_size`
+    brenda një kufiri, që një kërkesë të mos e ngarkojë databazën pa limit.
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginim keyset mbi (created_at, id), nga më e reja te më e vjetra:
+    WHERE created_at <= c AND (created_at < c OR id < i) ORDER BY created_at DESC, id DESC LIMIT n + 1.
+    Pa OFFSET dhe pa COUNT(*): faqja e 1000-të kushton sa e para. `cursor` është i errët për klientin;
+    përgjigja ka `next` dhe `previous`, por jo `count`.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    invalid_cursor_message = "Cursor i pavlefshëm."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request)
+
+        if self.reverse: # Faqja e mëparshme: lexohet në rend të kundërt dhe kthehet në fund
+            queryset = queryset.order_by('created_at', 'id')
+            if position is not None:
+                created_at, pk = position
+                queryset = queryset.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk), created_at__gte=created_at)
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+            if position is not None:
+                created_at, pk = position
+                # created_at__lte e mban kushtin të përdorshëm nga indeksi i created_at
+                queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk), created_at__lte=created_at)
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(requested, self.max_page_size) if requested > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            return (datetime.fromisoformat(data['c']), int(data['i'])), bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        data = {'c': row.created_at.isoformat(), 'i': row.pk}
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page: # Përtej fundit: kthehu te faqja e parë
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SelectablePagination(BasePagination):
+    """
+    Numër faqeje si parazgjedhje (me `count`), ose keyset kur kërkesa ka `?pagination=keyset`
+    ose një `cursor`. Një view mund ta kufizojë keyset-in me `allows_keyset_pagination()`.
+    """
+    pagination_query_param = 'pagination'
+    page_size = StandardResultsSetPagination.page_size
+
+    def uses_keyset(self, request, view=None):
+        wanted = (
+            request.query_params.get(self.pagination_query_param) == 'keyset'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+        allows = getattr(view, 'allows_keyset_pagination', None)
+        return wanted and (allows is None or allows())
+
+    def select(self, request, view=None):
+        return KeysetPagination() if self.uses_keyset(request, view) else StandardResultsSetPagination()
+
+    def get_page_size(self, request):
+        return self.select(request).get_page_size(request)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.delegate = self.select(request, view)
+        return self.delegate.paginate_queryset(queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        return self.delegate.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return StandardResultsSetPagination().get_paginated_response_schema(schema)
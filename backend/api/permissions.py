@@ -64,6 +64,11 @@ class IsRestaurantOwnerOrAdmin(permissions.BasePermission):
             # Për add_reply, has_object_permission do të bëjë kontrollin
             return True 
 
+        # Actions e restorantit mbi një porosi (p.sh. update_status_restaurant) ose mbi vetë restorantin
+        # (p.sh. toggle_active_status, update): pronësinë e kontrollon has_object_permission
+        if view.basename == 'order' or (view.basename == 'restaurant' and view.kwargs.get('pk')):
+            return request.user.role == User.Role.RESTAURANT_OWNER
+
         if restaurant_pk:
             from .models import Restaurant # Import i vonuar
             try:
@@ -95,7 +100,7 @@ class IsRestaurantOwnerOrAdmin(permissions.BasePermission):
             # target_restaurant = obj.restaurant
 
         if target_restaurant:
-            return target_restaurant.owner == request.user
+            return target_restaurant.owner_id == request.user.pk # Pa ngarkuar pronarin
         return False
 
 class IsCustomer(permissions.BasePermission):
@@ -1,6 +1,9 @@
 # backend/api/serializers.py
+from decimal import Decimal
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
 from rest_framework_simplejwt.exceptions import AuthenticationFailed # Importo këtë
 from .models import (
@@ -9,6 +12,7 @@ from .models import (
     Order, OrderItem, # Shto Order, OrderItem
     Cart, CartItem # SHTO MODELET E REJA
 )
+from . import eta
 
 User = get_user_model()
 
@@ -17,7 +21,7 @@ class AddressSerializer(serializers.ModelSerializer):
     class Meta:
         model = Address
         # Përfshijmë 'id' që të mund të përdoret si nested dhe për update
-        fields = ('id', 'street', 'city', 'state_province', 'postal_code', 'country', 'is_default_shipping')
+        fields = ('id', 'street', 'city', 'state_province', 'postal_code', 'country', 'latitude', 'longitude', 'is_default_shipping')
         # 'user' do të vendoset nga view
         # 'is_primary_location' mund të menaxhohet nga RestaurantSerializer
 
@@ -174,7 +178,7 @@ class OperatingHoursSerializer(serializers.ModelSerializer):
 class MenuItemSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     category = serializers.PrimaryKeyRelatedField(queryset=MenuCategory.objects.all(), write_only=False)
-    restaurant_id = serializers.IntegerField(source='restaurant.id', read_only=True) # SHTO KËTË
+    restaurant_id = serializers.IntegerField(read_only=True) # Lexohet nga FK, pa ngarkuar restorantin
 
     class Meta:
         model = MenuItem
@@ -186,7 +190,9 @@ class MenuItemSerializer(serializers.ModelSerializer):
         # 'restaurant' do të lidhet automatikisht ose nga view
 
 class MenuCategorySerializer(serializers.ModelSerializer):
-    # Për të shfaqur artikujt brenda kategorisë (vetëm për lexim)
+    # Për të shfaqur artikujt brenda kategorisë (vetëm për lexim).
+    # Queryset-i i kategorive duhet të ketë prefetch të artikujve (shih views.menu_items_prefetch),
+    # përndryshe bëhet një query për çdo kategori.
     menu_items = MenuItemSerializer(many=True, read_only=True) 
 
     class Meta:
@@ -211,7 +217,7 @@ class RestaurantListSerializer(serializers.ModelSerializer):
             'id', 'name', 
             'main_image_url', # NDRESHA KETU, perdor emrin e ri te fushes
             'cuisine_types', 
-            'average_rating', 'delivery_time_estimate', 'price_range',
+            'average_rating', 'rating_count', 'delivery_time_estimate', 'price_range',
             'address_summary', 
             'is_active', 'is_approved' 
         )
@@ -246,6 +252,7 @@ class RestaurantDetailSerializer(serializers.ModelSerializer):
         required=False
     )
     main_image_url = serializers.ImageField(source='main_image', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True) # {yje: numri}, nga Restaurant.rating_count_N
 
     class Meta:
         model = Restaurant
@@ -253,12 +260,12 @@ class RestaurantDetailSerializer(serializers.ModelSerializer):
             'id', 'owner_details', 'owner_id', 'name', 'description', 'phone_number',
             'main_image', 'main_image_url', 
             'cuisine_types_details', 'cuisine_type_ids',
-            'price_range', 'delivery_time_estimate', 'average_rating',
+            'price_range', 'delivery_time_estimate', 'average_rating', 'rating_count', 'rating_histogram',
             'is_approved', 'is_active', 'created_at', 'updated_at',
             'address_details', 'address', 
             'operating_hours_details', 'operating_hours'
         ]
-        read_only_fields = ['id', 'average_rating', 'created_at', 'updated_at', 'owner_details', 'address_details', 'cuisine_types_details', 'operating_hours_details', 'main_image_url']
+        read_only_fields = ['id', 'average_rating', 'rating_count', 'created_at', 'updated_at', 'owner_details', 'address_details', 'cuisine_types_details', 'operating_hours_details', 'main_image_url']
         extra_kwargs = {
             'main_image': {'write_only': True, 'required': False, 'allow_null': True} # Lejo të jetë null
         }
@@ -448,8 +455,11 @@ class DriverProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = DriverProfile
-        fields = ['user', 'user_email', 'vehicle_type', 'license_plate', 'is_available_for_delivery', 'created_at', 'updated_at']
-        read_only_fields = ['user_email', 'is_available_for_delivery', 'created_at', 'updated_at']
+        fields = [
+            'user', 'user_email', 'vehicle_type', 'license_plate', 'is_available_for_delivery',
+            'current_location_lat', 'current_location_lon', 'location_updated_at', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['user_email', 'is_available_for_delivery', 'location_updated_at', 'created_at', 'updated_at']
         # 'user' do të jetë ID-ja e userit (shoferit) gjatë krijimit/përditësimit.
         # Bëjmë user writeable për të lejuar caktimin gjatë krijimit.
         # Por duhet të sigurohemi që useri i caktuar ka rolin DRIVER.
@@ -568,11 +578,14 @@ class CartSerializer(serializers.ModelSerializer):
 class OrderItemSerializer(serializers.ModelSerializer):
     # Mund të shfaqësh më shumë detaje për menu_item nëse dëshiron (read-only)
     menu_item_details = MenuItemSerializer(source='menu_item', read_only=True, required=False) # Opsionale
+    # Vetëm ID-ja: artikujt ngarkohen të gjithë me një query te OrderDetailSerializer.validate, jo një nga një
+    menu_item = serializers.IntegerField(source='menu_item_id', min_value=1)
 
     class Meta:
         model = OrderItem
-        fields = ('id', 'menu_item', 'item_name_at_purchase', 'item_price_at_purchase', 'quantity', 'subtotal')
-        read_only_fields = ('id', 'item_name_at_purchase', 'item_price_at_purchase', 'subtotal')
+        fields = ('id', 'menu_item', 'menu_item_details', 'item_name_at_purchase', 'item_price_at_purchase', 'quantity', 'subtotal')
+        read_only_fields = ('id', 'menu_item_details', 'item_name_at_purchase', 'item_price_at_purchase', 'subtotal')
+        extra_kwargs = {'quantity': {'min_value': 1}}
         # 'menu_item' do të jetë ID kur dërgohet, 'order' lidhet automatikisht
 
 class OrderListSerializer(serializers.ModelSerializer): # Për listim (më pak detaje)
@@ -634,13 +647,35 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         # 'delivery_address_street', 'city', 'postal_code' do të jenë read_only pasi të krijohen,
         # pasi ato kopjohen nga Address me ID-në e dhënë.
 
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if self.instance is not None: # Artikujt nuk modifikohen pas krijimit (shih update)
+            return attrs
+        items_data = attrs.get('items')
+        if not items_data:
+            raise serializers.ValidationError({'items': "Porosia duhet të ketë të paktën një artikull."})
+        restaurant_instance = attrs.get('restaurant')
+
+        # Të gjithë artikujt e menusë me një query, pastaj kontrollet bëhen në memorie
+        menu_items = MenuItem.objects.select_related('category').order_by().in_bulk({item['menu_item_id'] for item in items_data})
+        for item_data in items_data:
+            menu_item = menu_items.get(item_data['menu_item_id'])
+            if menu_item is None or not menu_item.is_available:
+                name = menu_item.name if menu_item else 'i panjohur'
+                raise serializers.ValidationError({'items': f"Artikulli '{name}' nuk është i disponueshëm ose sasia është invalide."})
+            if menu_item.restaurant_id != restaurant_instance.pk:
+                raise serializers.ValidationError({'items': f"Artikulli '{menu_item.name}' nuk i përket restorantit të zgjedhur."})
+            item_data['menu_item'] = menu_item
+        return attrs
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
+        customer = self.context['request'].user
         # Adresa do të merret nga delivery_address_id
         address_instance = validated_data.pop('delivery_address') # Ky ishte source i delivery_address_id
         
         # Sigurohu që adresa i përket përdoruesit të kyçur
-        if address_instance.user != self.context['request'].user:
+        if address_instance.user_id != customer.pk:
             raise serializers.ValidationError("Adresa e zgjedhur nuk ju përket juve.")
 
         # Restoranti mund të vijë nga restaurant_id ose nga URL (nëse është nested view)
@@ -653,44 +688,33 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         validated_data['delivery_address_postal_code'] = address_instance.postal_code
         # validated_data['delivery_address_country'] = address_instance.country # Nëse e ke këtë fushë te Order
 
-        # Kalkulo totalin e porosisë bazuar te artikujt
-        calculated_sub_total = 0
-        for item_data in items_data:
-            menu_item = item_data.get('menu_item')
-            quantity = item_data.get('quantity')
-            if not menu_item or not quantity or not menu_item.is_available:
-                raise serializers.ValidationError(f"Artikulli '{menu_item.name if menu_item else 'i panjohur'}' nuk është i disponueshëm ose sasia është invalide.")
-            if menu_item.restaurant != restaurant_instance:
-                raise serializers.ValidationError(f"Artikulli '{menu_item.name}' nuk i përket restorantit të zgjedhur.")
-            calculated_sub_total += menu_item.price * quantity
+        # Totali kalkulohet nga artikujt e validuar te validate (menu_item është instanca nga in_bulk)
+        calculated_sub_total = sum((item['menu_item'].price * item['quantity'] for item in items_data), Decimal('0.00'))
         
         # Shto tarifat (nëse ka)
-        delivery_fee_value = 2.00 # Shembull: tarifa e dërgesës mund të vijë nga restoranti ose të jetë fikse
-        # validated_data['delivery_fee'] = delivery_fee
+        delivery_fee_value = Decimal('2.00') # Shembull: tarifa e dërgesës mund të vijë nga restoranti ose të jetë fikse
 
         validated_data['sub_total'] = calculated_sub_total
         validated_data['delivery_fee'] = delivery_fee_value
         validated_data['order_total'] = calculated_sub_total + delivery_fee_value
+        # Parashikimi nga sketch-et e restorantit (shih eta.py), jo nga klienti
+        validated_data['estimated_delivery_time'] = eta.estimate_delivery_time(restaurant_instance.pk, timezone.now())
         
-        # Përdoruesi që bën kërkesën është klienti
-        order = Order.objects.create(
-            customer=self.context['request'].user, 
-            restaurant=restaurant_instance, 
-            **validated_data
-        )
-
-        for item_data in items_data:
-            menu_item_instance = item_data.get('menu_item')
-            OrderItem.objects.create(
-                order=order, 
-                menu_item=menu_item_instance,
-                item_name_at_purchase=menu_item_instance.name,
-                item_price_at_purchase=menu_item_instance.price,
-                quantity=item_data.get('quantity')
-            )
-        
-        # Pastro shportën e përdoruesit pas krijimit të porosisë
-        Cart.objects.filter(user=self.context['request'].user).delete()
+        # Porosia, artikujt dhe pastrimi i shportës ruhen bashkë ose aspak
+        with transaction.atomic():
+            order = Order.objects.create(customer=customer, restaurant=restaurant_instance, **validated_data)
+            OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    menu_item=item['menu_item'],
+                    item_name_at_purchase=item['menu_item'].name,
+                    item_price_at_purchase=item['menu_item'].price,
+                    quantity=item['quantity'],
+                )
+                for item in items_data
+            ])
+            # Pastro shportën e përdoruesit pas krijimit të porosisë
+            Cart.objects.filter(user=customer).delete()
         
         return order
 
@@ -1,30 +1,136 @@
-from django.core.cache import cache
-from django.db.models.signals import post_save, post_delete
+from django.apps import apps
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Restaurant, CuisineType
+from django.utils import timezone
+from .models import Restaurant, Cart, CartItem, Order, Review, order_status_changed
 from . import cache_utils # Importo modulin tonë ndihmës
+from . import dispatch_grid
+from . import eta
 
 
-@receiver([post_save, post_delete], sender=Restaurant)
-def invalidate_restaurant_related_cache(sender, instance, **kwargs):
+def invalidate_on_commit(instance, trigger, dirtied=None):
     """
-    Ky sinjal thirret kur një restorant ruhet ose fshihet.
-    Incrementon versionin e cache-it për listën publike të restoranteve.
+    Namespaces e ndotura llogariten tani (lidhjet lexohen brenda transaksionit), por versionet
+    rriten vetëm pas commit-it: përndryshe një lexues paralel mund ta rimbushte cache-in me të
+    dhënat e vjetra mes invalidimit dhe commit-it, dhe ato do të mbeteshin deri në TTL.
+    Jashtë transaksionit on_commit ekzekutohet menjëherë.
     """
-    print(f"Sinjal: Restoranti '{instance.name}' u modifikua.")
-    cache_utils.increment_restaurants_list_public_cache_version()
-    
-    # Nëse keni cache për restorante individuale (p.sh., GET /api/restaurants/{id}/),
-    # do të duhej të fshinit edhe atë çelës specifik këtu.
-    # P.sh.: individual_restaurant_cache_key = f"restaurant_detail_{instance.pk}_v1"
-    # cache.delete(individual_restaurant_cache_key)
+    if dirtied is None:
+        dirtied = cache_utils.get_dirtied_namespaces(instance)
+    transaction.on_commit(lambda: cache_utils.invalidate_for_instance(instance, dirtied=dirtied, trigger=trigger))
 
-@receiver([post_save, post_delete], sender=CuisineType)
-def invalidate_cuisine_type_related_cache(sender, instance, **kwargs):
+
+def invalidate_registered_caches(sender, instance, **kwargs):
+    """
+    Ky sinjal thirret kur ruhet ose fshihet një model i regjistruar te
+    cache_utils.INVALIDATION_REGISTRY dhe invalidon namespaces që ai ndot.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= cache_utils.NON_CACHED_FIELDS:
+        return
+    # Për fshirjet përdorim namespaces e llogaritura te pre_delete (lidhjet tani mund të mos ekzistojnë)
+    dirtied = getattr(instance, '_cache_dirtied_namespaces', None)
+    event = 'delete' if kwargs.get('signal') is post_delete else 'save'
+    invalidate_on_commit(instance, f"{sender._meta.label}.{event}", dirtied=dirtied)
+
+def collect_registered_caches_before_delete(sender, instance, **kwargs):
+    instance._cache_dirtied_namespaces = cache_utils.get_dirtied_namespaces(instance)
+
+for model_label in cache_utils.INVALIDATION_REGISTRY:
+    model = apps.get_model(model_label)
+    post_save.connect(invalidate_registered_caches, sender=model, dispatch_uid=f'cache_invalidation_save_{model_label}')
+    pre_delete.connect(collect_registered_caches_before_delete, sender=model, dispatch_uid=f'cache_invalidation_pre_delete_{model_label}')
+    post_delete.connect(invalidate_registered_caches, sender=model, dispatch_uid=f'cache_invalidation_delete_{model_label}')
+
+
+@receiver(m2m_changed, sender=Restaurant.cuisine_types.through)
+def invalidate_restaurant_cuisine_types_cache(sender, instance, action, **kwargs):
+    """
+    Ndryshimi i llojeve të kuzhinës së një restoranti nuk shkakton post_save te Restaurant,
+    prandaj e trajtojmë veçmas.
+    """
+    if action == 'pre_clear' and not isinstance(instance, Restaurant):
+        # post_clear nuk e jep listën e restoranteve, prandaj e ruajmë tani
+        instance._cleared_restaurant_ids = list(instance.restaurants.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    trigger = 'api.Restaurant.cuisine_types'
+    if isinstance(instance, Restaurant):
+        invalidate_on_commit(instance, trigger)
+    else: # Ndryshimi u bë nga ana e CuisineType (cuisine.restaurants.add(...))
+        pk_set = kwargs.get('pk_set') or getattr(instance, '_cleared_restaurant_ids', [])
+        for restaurant in Restaurant.objects.filter(pk__in=pk_set):
+            invalidate_on_commit(restaurant, trigger)
+
+
+@receiver([post_save, post_delete], sender=CartItem)
+def touch_cart_on_item_change(sender, instance, **kwargs):
+    """
+    Përditëson Cart.updated_at kur ndryshon një artikull i shportës, që ETag/Last-Modified
+    i my-cart të mund të llogaritet pa lexuar artikujt.
+    """
+    origin = kwargs.get('origin') # Vetëm te post_delete: instanca ose queryset-i që nisi fshirjen
+    if origin is not None and getattr(origin, 'model', type(origin)) is Cart:
+        return # E gjithë shporta po fshihet (p.sh. pas checkout): pa një UPDATE për çdo artikull
+    if isinstance(origin, QuerySet): # Fshirje me queryset (p.sh. clear): një UPDATE për shportë, jo për artikull
+        touched = vars(origin).setdefault('_touched_cart_ids', set())
+        if instance.cart_id in touched:
+            return
+        touched.add(instance.cart_id)
+    Cart.objects.filter(pk=instance.cart_id).update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_restaurant_rating(sender, instance, **kwargs):
     """
-    Ky sinjal thirret kur një lloj kuzhine ruhet ose fshihet.
-    Incrementon versionin e cache-it për listën e llojeve të kuzhinave.
+    Heq vlerësimin e fshirë nga agregatet e restorantit (shih Restaurant.apply_rating_change).
+    post_delete dërgohet brenda transaksionit të fshirjes, edhe për fshirjet me queryset
+    dhe kaskadat (p.sh. kur fshihet përdoruesi).
     """
-    print(f"Sinjal: Lloji i kuzhinës '{instance.name}' u modifikua.")
-    cache_utils.increment_cuisine_types_list_cache_version()
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is Restaurant:
+        return # Restoranti vetë po fshihet
+    Restaurant.apply_rating_change(instance.restaurant_id, removed=instance.rating)
+
+
+@receiver(order_status_changed, sender=Order)
+def invalidate_caches_on_order_transition(sender, instance, old_status, new_status, **kwargs):
+    """
+    Tranzicionet e statusit bëhen me një UPDATE të kushtëzuar (shih Order.transition_to),
+    i cili nuk dërgon post_save, prandaj invalidimi i regjistruar thirret këtu, pas commit-it.
+    """
+    invalidate_on_commit(instance, 'api.Order.transition')
+
 
+@receiver(order_status_changed, sender=Order)
+def update_dispatch_grid_on_order_transition(sender, instance, old_status, new_status, **kwargs):
+    """
+    Mban grid-in e porosive të lira (shih dispatch_grid) në rregull: shtohet kur porosia bëhet
+    READY_FOR_PICKUP pa shofer, hiqet kur del nga ai status (e mori një shofer, u anulua...).
+    Grid-i përditësohet vetëm pas commit-it, që një rollback të mos lërë porosi fantazmë.
+    """
+    ready = Order.OrderStatus.READY_FOR_PICKUP
+    if new_status == ready and instance.driver_id is None:
+        if Order.restaurant.is_cached(instance) and Restaurant.address.is_cached(instance.restaurant):
+            address = instance.restaurant.address # E ngarkuar nga view-i (select_related), pa query shtesë
+            latitude, longitude = (address.latitude, address.longitude) if address else (None, None)
+        else:
+            latitude, longitude = Restaurant.objects.filter(pk=instance.restaurant_id).order_by().values_list(
+                'address__latitude', 'address__longitude',
+            ).first() or (None, None)
+        transaction.on_commit(lambda: dispatch_grid.order_ready(instance.pk, latitude, longitude, instance.ready_for_pickup_at))
+    elif old_status == ready:
+        transaction.on_commit(lambda: dispatch_grid.order_unavailable(instance.pk))
+
+
+@receiver(order_status_changed, sender=Order)
+def record_eta_durations_on_transition(sender, instance, old_status, new_status, **kwargs):
+    """
+    Shton kohëzgjatjen e fazës që sapo u mbyll (përgatitja ose dërgesa) te sketch-et e ETA-së
+    (shih eta.py). Pas commit-it, që tranzicionet e anuluara të mos numërohen.
+    """
+    if new_status in eta.STAGE_FOR_STATUS:
+        transaction.on_commit(lambda: eta.record_transition(instance, new_status))
@@ -0,0 +1,58 @@
+import multiprocessing
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from api.cache_backends import SQLiteSharedCache
+
+
+def _incr_many(location, times):
+    backend = SQLiteSharedCache(location, {})
+    for _ in range(times):
+        backend.incr('counter')
+
+
+class SQLiteSharedCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.location = os.path.join(self.tmpdir.name, 'cache.sqlite3')
+        self.cache = SQLiteSharedCache(self.location, {})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_set_get_delete(self):
+        self.cache.set('a', {'x': [1, 2]}, timeout=60)
+        self.assertEqual(self.cache.get('a'), {'x': [1, 2]})
+        self.assertTrue(self.cache.delete('a'))
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_expired_entry_is_missing_and_can_be_added_again(self):
+        self.cache.set('a', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('a'))
+        self.assertTrue(self.cache.add('a', 2, timeout=60))
+        self.assertFalse(self.cache.add('a', 3, timeout=60))
+        self.assertEqual(self.cache.get('a'), 2)
+
+    def test_second_instance_sees_same_data(self):
+        # Një instancë tjetër (si një worker tjetër) lexon të njëjtin skedar
+        self.cache.set('version', 1, timeout=None)
+        other = SQLiteSharedCache(self.location, {})
+        other.incr('version')
+        self.assertEqual(self.cache.get('version'), 2)
+
+    def test_incr_missing_key_raises(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0, timeout=None)
+        ctx = multiprocessing.get_context('fork')
+        workers = [ctx.Process(target=_incr_many, args=(self.location, 50)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.cache.get('counter'), 200)
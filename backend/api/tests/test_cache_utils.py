@@ -0,0 +1,257 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from api import cache_metrics, cache_utils
+from api.models import CuisineType, Restaurant, Address, Review
+
+User = get_user_model()
+
+
+class RestaurantsListPublicCacheKeyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.factory = APIRequestFactory()
+
+    def key_for(self, query_string):
+        return cache_utils.get_restaurants_list_public_cache_key(Request(self.factory.get(f'/api/restaurants/?{query_string}')))
+
+    def test_param_order_and_irrelevant_params_do_not_change_key(self):
+        key = self.key_for('page=2&page_size=20&cuisine_type_id=3')
+        self.assertEqual(key, self.key_for('cuisine_type_id=3&page_size=20&page=2&format=json&utm=x'))
+
+    def test_repeated_param_is_keyed_on_the_value_the_view_reads(self):
+        # query_params.get() kthen vlerën e fundit, prandaj renditja e vlerave ndryshon rezultatin
+        self.assertNotEqual(self.key_for('cuisine_type_id=1&cuisine_type_id=2'), self.key_for('cuisine_type_id=2&cuisine_type_id=1'))
+        self.assertEqual(self.key_for('cuisine_type_id=1&cuisine_type_id=2'), self.key_for('cuisine_type_id=2'))
+
+    def test_default_page_is_same_as_no_page(self):
+        self.assertEqual(self.key_for(''), self.key_for('page=1'))
+
+    def test_filters_and_page_size_change_key(self):
+        base = self.key_for('page=2')
+        self.assertNotEqual(base, self.key_for('page=2&page_size=50'))
+        self.assertNotEqual(base, self.key_for('page=2&name__icontains=pica'))
+        self.assertNotEqual(base, self.key_for('page=3'))
+
+    def test_version_bump_changes_key(self):
+        key = self.key_for('page=2')
+        cache_utils.invalidate_restaurant_list_cache()
+        self.assertNotEqual(key, self.key_for('page=2'))
+
+
+class InvalidationRegistryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.owner = User.objects.create_user(email='owner@example.com', password='password123', role=User.Role.RESTAURANT_OWNER)
+        self.customer = User.objects.create_user(email='customer@example.com', password='password123')
+        self.address = Address.objects.create(user=self.owner, street='1 Main', city='Test', postal_code='10000')
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name='R', address=self.address, phone_number='1', is_active=True, is_approved=True)
+
+    def test_registered_models_bump_public_list_version(self):
+        cuisine = CuisineType.objects.create(name='Italian')
+        for change in (
+            lambda: self.restaurant.save(),
+            lambda: self.address.save(),
+            lambda: self.restaurant.cuisine_types.add(cuisine),
+            lambda: cuisine.save(),
+            lambda: self.restaurant.operating_hours.create(day_of_week=1, is_closed=True),
+            lambda: Review.objects.create(restaurant=self.restaurant, user=self.customer, rating=4),
+        ):
+            version = cache_utils.get_restaurants_list_public_cache_version()
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertGreater(cache_utils.get_restaurants_list_public_cache_version(), version)
+
+    def test_customer_address_does_not_dirty_public_list(self):
+        version = cache_utils.get_restaurants_list_public_cache_version()
+        Address.objects.create(user=self.customer, street='2 Side', city='Test', postal_code='10000')
+        self.assertEqual(cache_utils.get_restaurants_list_public_cache_version(), version)
+
+    def test_cuisine_type_dirties_cuisine_list(self):
+        version = cache_utils.get_cuisine_types_list_cache_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            CuisineType.objects.create(name='Mexican')
+        self.assertGreater(cache_utils.get_cuisine_types_list_cache_version(), version)
+
+    def test_versions_are_bumped_only_after_commit(self):
+        version = cache_utils.get_restaurants_list_public_cache_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.save()
+            # Para commit-it një lexues paralel do të rimbushte cache-in nën versionin e vjetër
+            self.assertEqual(cache_utils.get_restaurants_list_public_cache_version(), version)
+        self.assertGreater(cache_utils.get_restaurants_list_public_cache_version(), version)
+
+
+class LocalLRUCacheTests(TestCase):
+
+    def test_size_based_eviction_and_counters(self):
+        lru = cache_utils.LocalLRUCache(max_entries=2, default_ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1) # 'a' bëhet më i fundit i përdorur
+        lru.set('c', 3) # nxjerr 'b'
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+        self.assertEqual(lru.stats(), {'entries': 2, 'max_entries': 2, 'hits': 2, 'misses': 1, 'evictions': 1})
+
+    def test_entries_expire_after_ttl(self):
+        lru = cache_utils.LocalLRUCache(max_entries=10, default_ttl=60)
+        lru.set('version', 1, ttl=0)
+        self.assertIsNone(lru.get('version'))
+
+
+class TwoTierVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+
+    def test_version_reads_are_served_from_l1(self):
+        version = cache_utils.get_restaurants_list_public_cache_version()
+        cache.set(cache_utils.RESTAURANTS_LIST_PUBLIC_VERSION_KEY, version + 10) # Ndryshim nga një proces tjetër
+        self.assertEqual(cache_utils.get_restaurants_list_public_cache_version(), version)
+
+    def test_other_process_bump_is_seen_after_version_ttl(self):
+        version = cache_utils.get_restaurants_list_public_cache_version()
+        cache.incr(cache_utils.RESTAURANTS_LIST_PUBLIC_VERSION_KEY) # Ndryshim nga një proces tjetër
+        cache_utils.local_cache.set(cache_utils.RESTAURANTS_LIST_PUBLIC_VERSION_KEY, version, ttl=0) # Simulo skadimin e TTL
+        self.assertEqual(cache_utils.get_restaurants_list_public_cache_version(), version + 1)
+
+    def test_local_bump_is_seen_immediately(self):
+        version = cache_utils.get_restaurants_list_public_cache_version()
+        cache_utils.invalidate_restaurant_list_cache()
+        self.assertEqual(cache_utils.get_restaurants_list_public_cache_version(), version + 1)
+
+    def test_payload_hit_in_l1_skips_shared_cache(self):
+        cache_utils.set_cached('payload', {'x': 1}, timeout=60)
+        cache.delete('payload')
+        self.assertEqual(cache_utils.get_cached('payload'), {'x': 1})
+
+
+class GetOrComputeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f"value-{self.calls}"
+
+    def test_miss_fills_once_and_releases_lock(self):
+        self.assertEqual(cache_utils.get_or_compute('k_v1', self.compute, timeout=60, stale_key='k_stale'), 'value-1')
+        self.assertEqual(cache_utils.get_or_compute('k_v1', self.compute, timeout=60, stale_key='k_stale'), 'value-1')
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(cache.get('lock_k_v1'))
+
+    def test_concurrent_miss_is_served_previous_value(self):
+        cache_utils.get_or_compute('k_v1', self.compute, timeout=60, stale_key='k_stale')
+        cache.add('lock_k_v2', 1) # Një kërkesë tjetër po mbush versionin e ri
+        self.assertEqual(cache_utils.get_or_compute('k_v2', self.compute, timeout=60, stale_key='k_stale'), 'value-1')
+        self.assertEqual(self.calls, 1)
+
+    def test_entry_near_expiry_is_recomputed_early_by_one_request(self):
+        cache_utils.set_cached('k_v1', {'value': 'old', 'delta': 1000, 'expires_at': 0}, timeout=60)
+        cache.add('lock_k_v1', 1)
+        self.assertEqual(cache_utils.get_or_compute('k_v1', self.compute, timeout=60), 'old') # Lock-u i zënë
+        cache.delete('lock_k_v1')
+        self.assertEqual(cache_utils.get_or_compute('k_v1', self.compute, timeout=60), 'value-1')
+
+
+class CacheMetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        cache_metrics.metrics.reset()
+
+    def test_hits_misses_fills_and_invalidations_are_counted(self):
+        cache_utils.get_or_compute('k_v1', lambda: 'value', timeout=60, namespace='test_ns')
+        cache_utils.get_or_compute('k_v1', lambda: 'value', timeout=60, namespace='test_ns')
+        cache_utils.invalidate_restaurant_list_cache()
+
+        stats = cache_metrics.metrics.snapshot()
+        self.assertEqual(stats['test_ns']['hits'], 1)
+        self.assertEqual(stats['test_ns']['misses'], 1)
+        self.assertEqual(stats['test_ns']['fills'], 1)
+        self.assertEqual(stats['test_ns']['hit_ratio'], 0.5)
+        self.assertEqual(
+            stats[cache_utils.NS_RESTAURANTS_LIST_PUBLIC]['invalidations'],
+            {cache_metrics.TRIGGER_DIRECT: 1},
+        )
+
+    def test_flush_survives_counter_expiring_between_add_and_incr(self):
+        cache_metrics.record_hit('test_ns')
+        cache_metrics.metrics.flush()
+        cache_metrics.record_hit('test_ns')
+        key = cache_metrics._counter_key('test_ns', cache_metrics.HITS, '')
+        incr = cache.incr
+
+        def expire_then_incr(*args, **kwargs):
+            cache.delete(key) # Çelësi nxirret pasi add() e pa ende të pranishëm
+            return incr(*args, **kwargs)
+
+        with mock.patch.object(cache, 'incr', side_effect=expire_then_incr):
+            cache_metrics.metrics.flush()
+        self.assertEqual(cache.get(key), 1)
+
+    def test_signal_invalidations_are_counted_by_trigger(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            CuisineType.objects.create(name="Metrika")
+        stats = cache_metrics.metrics.snapshot()
+        self.assertEqual(stats[cache_utils.NS_CUISINE_TYPES_LIST]['invalidations'], {'api.CuisineType.save': 1})
+
+    def test_l1_evictions_are_attributed_to_namespace(self):
+        lru = cache_utils.LocalLRUCache(max_entries=1, default_ttl=60, on_evict=lambda key: cache_metrics.record_eviction(cache_utils._namespace_of_key(key)))
+        lru.set(cache_utils.get_restaurant_menu_cache_key(1, cache_utils.RESTAURANT_MENU_ITEMS), 'a')
+        lru.set('other_key', 'b')
+        stats = cache_metrics.metrics.snapshot()
+        self.assertEqual(stats[cache_utils.NS_RESTAURANT_MENU]['evictions'], 1)
+
+
+@override_settings(API_CACHE_MAX_STALENESS={'swr_ns': 60})
+class StaleWhileRevalidateTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.refreshes = []
+        patcher = mock.patch.object(cache_utils, '_start_background_refresh', side_effect=self.refreshes.append)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, key, value):
+        return cache_utils.get_or_compute(key, lambda: value, timeout=60, stale_key='swr_stale', namespace='swr_ns')
+
+    def test_version_change_serves_last_good_value_and_refreshes_in_background(self):
+        self.assertEqual(self.get('swr_v1', 'old'), 'old') # Mbushja e parë është sinkrone
+        self.assertEqual(self.refreshes, [])
+
+        self.assertEqual(self.get('swr_v2', 'new'), 'old')
+        self.assertEqual(len(self.refreshes), 1)
+        self.assertEqual(self.get('swr_v2', 'new'), 'old') # Rifreskimi është ende në punë (lock-u i zënë)
+        self.assertEqual(len(self.refreshes), 1)
+
+        self.refreshes[0]()
+        self.assertEqual(self.get('swr_v2', 'new'), 'new')
+
+    def test_value_older_than_max_staleness_is_rebuilt_synchronously(self):
+        self.get('swr_v1', 'old')
+        with mock.patch.object(cache_utils.time, 'time', return_value=time.time() + 120):
+            self.assertEqual(self.get('swr_v2', 'new'), 'new')
+        self.assertEqual(self.refreshes, [])
+
+    def test_namespace_without_staleness_is_not_served_stale(self):
+        cache_utils.get_or_compute('plain_v1', lambda: 'old', timeout=60, stale_key='plain_stale', namespace='plain_ns')
+        value = cache_utils.get_or_compute('plain_v2', lambda: 'new', timeout=60, stale_key='plain_stale', namespace='plain_ns')
+        self.assertEqual(value, 'new')
@@ -0,0 +1,155 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import cache_utils
+from api.models import CuisineType, EtaSketch, Restaurant, MenuCategory, MenuItem, Order, Review
+
+User = get_user_model()
+
+
+class WarmCachesCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.owner = User.objects.create_user(email="warm@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        CuisineType.objects.create(name="Italiane")
+        self.restaurants = [
+            Restaurant.objects.create(owner=self.owner, name=f"R{i}", phone_number="111", is_active=True, is_approved=True)
+            for i in range(3)
+        ]
+        category = MenuCategory.objects.create(restaurant=self.restaurants[0], name="Pica")
+        MenuItem.objects.create(category=category, restaurant=self.restaurants[0], name="Margherita", price="5.00")
+
+    def test_warmed_reads_are_served_without_queries(self):
+        out = StringIO()
+        call_command('warm_caches', '--concurrency', '1', '--batch-size', '2', stdout=out)
+        for namespace in ('cuisine_types_list', 'restaurants_list_public', 'restaurant_detail', 'restaurant_menu'):
+            self.assertIn(f"{namespace}:", out.getvalue())
+        self.assertIn("restaurant_detail: 3 kërkesa, 0 gabime", out.getvalue())
+
+        client = APIClient()
+        restaurant = self.restaurants[0]
+        with self.assertNumQueries(0):
+            client.get(reverse('cuisinetype-list'))
+            client.get(reverse('restaurant-list'))
+            client.get(reverse('restaurant-detail', kwargs={'pk': restaurant.pk}))
+            client.get(reverse('restaurant-menu-items-for-restaurant', kwargs={'pk': restaurant.pk}))
+
+    def test_namespace_option_limits_warm_up(self):
+        out = StringIO()
+        call_command('warm_caches', '--concurrency', '1', '--namespace', cache_utils.NS_CUISINE_TYPES_LIST, stdout=out)
+        self.assertNotIn('restaurant_detail', out.getvalue())
+
+
+class BenchmarkClaimsCommandTests(TestCase):
+    def test_every_order_is_claimed_once_and_fixtures_are_removed(self):
+        out = StringIO()
+        call_command('benchmark_claims', '--drivers', '3', '--orders', '7', '--concurrency', '1', stdout=out)
+        self.assertIn("claims: 7 në", out.getvalue())
+        self.assertIn("gabime: 0", out.getvalue())
+        self.assertFalse(User.objects.filter(email__startswith='bench-claims-').exists())
+        self.assertFalse(Restaurant.objects.filter(name__startswith='bench-claims-').exists())
+
+
+class ExplainQueriesCommandTests(TestCase):
+    def test_hot_queries_use_composite_indexes(self):
+        owner = User.objects.create_user(email="explain-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        User.objects.create_user(email="explain-customer@test.com", password="password")
+        Restaurant.objects.create(owner=owner, name="Explain", phone_number="111", is_active=True, is_approved=True)
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        for index_name in ('restaurant_public_name_idx', 'order_customer_created_idx', 'order_restaurant_created_idx',
+                           'menuitem_rest_available_idx', 'pageview_rest_viewed_idx'):
+            self.assertIn(index_name, out.getvalue())
+
+
+class ReconcileRatingsCommandTests(TestCase):
+    def test_rebuilds_aggregates_written_around_review_save(self):
+        owner = User.objects.create_user(email="reconcile-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        restaurant = Restaurant.objects.create(owner=owner, name="Reconcile", phone_number="111")
+        untouched = Restaurant.objects.create(owner=owner, name="Pa vlerësime", phone_number="222")
+        customers = [User.objects.create_user(email=f"reconcile{i}@test.com", password="password") for i in range(3)]
+        Review.objects.bulk_create([ # bulk_create anashkalon Review.save
+            Review(restaurant=restaurant, user=customer, rating=rating) for customer, rating in zip(customers, [5, 3, 3])
+        ])
+        Restaurant.objects.filter(pk=untouched.pk).update(rating_sum=7, rating_count=2)
+
+        out = StringIO()
+        call_command('reconcile_ratings', '--dry-run', stdout=out)
+        self.assertIn("2 do të korrigjoheshin", out.getvalue())
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.rating_count, 0)
+
+        updated_at = restaurant.updated_at
+        call_command('reconcile_ratings', '--batch-size', '1', stdout=out)
+        restaurant.refresh_from_db()
+        self.assertGreater(restaurant.updated_at, updated_at)
+        untouched.refresh_from_db()
+        self.assertEqual((restaurant.rating_sum, restaurant.rating_count, str(restaurant.average_rating)), (11, 3, "3.67"))
+        self.assertEqual(restaurant.rating_histogram, {1: 0, 2: 0, 3: 2, 4: 0, 5: 1})
+        self.assertEqual((untouched.rating_sum, untouched.rating_count), (0, 0))
+
+        out = StringIO()
+        call_command('reconcile_ratings', stdout=out)
+        self.assertIn("0 u korrigjuan", out.getvalue())
+
+
+class ReplicaLagCommandTests(TestCase):
+    def test_requires_configured_replicas(self):
+        with self.assertRaises(CommandError):
+            call_command('replica_lag', stdout=StringIO())
+
+    @override_settings(DATABASE_REPLICAS=['default']) # "Replika" është vetë primarja: heartbeat-i shihet menjëherë
+    def test_measures_heartbeat_lag(self):
+        out = StringIO()
+        call_command('replica_lag', '--timeout', '1', stdout=out)
+        self.assertIn("default: vonesa", out.getvalue())
+
+
+class DispatchCommandsTests(TestCase):
+    def test_dispatch_orders_without_candidates(self):
+        out = StringIO()
+        call_command('dispatch_orders', '--dry-run', stdout=out)
+        self.assertIn("0 porosi gati, 0 shoferë të lirë: 0 do të caktoheshin", out.getvalue())
+
+    def test_simulate_dispatch_reports_pickup_wait(self):
+        out = StringIO()
+        call_command('simulate_dispatch', '--orders', '40', '--drivers', '10', '--restaurants', '5', '--duration', '10', stdout=out)
+        self.assertIn("policy=batch", out.getvalue())
+        self.assertIn("policy=oldest", out.getvalue())
+        self.assertEqual(out.getvalue().count("pritja te restoranti: mesatarja"), 2)
+
+    def test_simulate_dispatch_stops_when_orders_are_out_of_reach(self):
+        out = StringIO()
+        call_command('simulate_dispatch', '--orders', '40', '--drivers', '3', '--restaurants', '10', '--area-km', '200', '--policy', 'batch', stdout=out)
+        self.assertIn("porosi mbetën pa shofer", out.getvalue())
+
+
+class RebuildEtaSketchesCommandTests(TestCase):
+    def test_rebuilds_from_order_timestamps(self):
+        owner = User.objects.create_user(email="eta-cmd@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        restaurant = Restaurant.objects.create(owner=owner, name="ETA", phone_number="111", is_active=True, is_approved=True)
+        now = timezone.now()
+        order = Order.objects.create(
+            customer=owner, restaurant=restaurant, order_total="10.00", status=Order.OrderStatus.DELIVERED,
+            ready_for_pickup_at=now + timedelta(minutes=20), actual_delivery_time=now + timedelta(minutes=35),
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+        Order.objects.filter(pk=order.pk).update(created_at=now) # auto_now_add
+        EtaSketch.objects.create(restaurant=restaurant, stage=EtaSketch.Stage.PREP, count=99) # Zëvendësohet
+
+        out = StringIO()
+        call_command('rebuild_eta_sketches', stdout=out)
+        self.assertIn("2 kohëzgjatje nga 1 restorante, 4 sketch-e u rindërtuan.", out.getvalue())
+        prep = EtaSketch.objects.get(restaurant=restaurant, stage=EtaSketch.Stage.PREP)
+        self.assertEqual(prep.count, 1)
+        self.assertAlmostEqual(prep.estimate_seconds, 20 * 60, delta=20 * 60 * 0.02)
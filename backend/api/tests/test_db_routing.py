@@ -0,0 +1,76 @@
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.db_routing import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, use_primary
+from api.models import Order, Restaurant, Review, User
+
+# Vetëm vendimet e router-it: asnjë query nuk ekzekutohet te 'replica'
+with_replica = override_settings(
+    DATABASES={**settings.DATABASES, 'replica': {**settings.DATABASES['default'], 'TEST': {'MIRROR': DEFAULT_DB_ALIAS}}},
+    DATABASE_REPLICAS=['replica'],
+)
+
+
+@with_replica
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.routed = {}
+
+        def view(request):
+            self.routed = {
+                'restaurant': self.router.db_for_read(Restaurant),
+                'order': self.router.db_for_read(Order),
+            }
+            with use_primary():
+                self.routed['restaurant_in_use_primary'] = self.router.db_for_read(Restaurant)
+            if request.method == 'POST':
+                self.router.db_for_write(Review)
+                self.routed['restaurant_after_write'] = self.router.db_for_read(Restaurant)
+            return HttpResponse(status=201 if request.method == 'POST' else 200)
+
+        self.middleware = ReplicaRoutingMiddleware(view)
+        self.token = str(AccessToken.for_user(User(pk=4242, email="routing@test.com")))
+
+    def test_catalog_reads_in_safe_requests_use_replica(self):
+        self.middleware(self.factory.get('/api/restaurants/'))
+        self.assertEqual(self.routed['restaurant'], 'replica')
+        self.assertIsNone(self.routed['order']) # Jo model katalogu
+        self.assertIsNone(self.routed['restaurant_in_use_primary'])
+        self.assertIsNone(self.router.db_for_read(Restaurant)) # Jashtë kërkesës
+
+    def test_write_sticks_to_primary_by_cookie(self):
+        response = self.middleware(self.factory.post('/api/restaurants/1/reviews/'))
+        self.assertIsNone(self.routed['restaurant'])
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get('/api/restaurants/')
+        request.COOKIES[STICKY_COOKIE] = response.cookies[STICKY_COOKIE].value
+        self.middleware(request)
+        self.assertIsNone(self.routed['restaurant'])
+
+        request.COOKIES[STICKY_COOKIE] = str(time.time() - 1) # Dritarja ka kaluar
+        self.middleware(request)
+        self.assertEqual(self.routed['restaurant'], 'replica')
+
+    def test_write_sticks_to_primary_by_jwt_user(self):
+        self.middleware(self.factory.post('/api/restaurants/1/reviews/', HTTP_AUTHORIZATION=f"Bearer {self.token}"))
+        self.middleware(self.factory.get('/api/restaurants/', HTTP_AUTHORIZATION=f"Bearer {self.token}")) # Pa cookie
+        self.assertIsNone(self.routed['restaurant'])
+
+        other = str(AccessToken.for_user(User(pk=4343, email="other@test.com")))
+        self.middleware(self.factory.get('/api/restaurants/', HTTP_AUTHORIZATION=f"Bearer {other}"))
+        self.assertEqual(self.routed['restaurant'], 'replica')
+
+    def test_write_pins_rest_of_request(self):
+        self.router.db_for_write(Review) # Jashtë kërkesës: pa efekt
+        self.middleware(self.factory.get('/api/restaurants/'))
+        self.assertEqual(self.routed['restaurant'], 'replica')
+        self.middleware(self.factory.post('/api/restaurants/1/log-view/'))
+        self.assertIsNone(self.routed['restaurant_after_write'])
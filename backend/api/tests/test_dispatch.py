@@ -0,0 +1,87 @@
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import dispatch
+from api.models import Address, DriverProfile, Order, Restaurant
+
+User = get_user_model()
+
+
+class SolveAssignmentTests(SimpleTestCase):
+
+    def test_matches_brute_force(self):
+        rng = random.Random(3)
+        for _ in range(200):
+            order_count = rng.randint(1, 5)
+            candidates = [
+                [(rng.randint(0, 20), order) for order in rng.sample(range(order_count), rng.randint(0, order_count))]
+                for _ in range(rng.randint(1, 4))
+            ]
+            costs = {(driver, order): cost for driver, arcs in enumerate(candidates) for cost, order in arcs}
+            assignment = dispatch.solve_assignment(candidates, order_count)
+            self.assertEqual(len(set(assignment.values())), len(assignment))
+            self.assertTrue(all(pair in costs for pair in assignment.items()))
+
+            best = None # Sa më shumë shoferë të caktuar, pastaj kosto minimale
+            for choice in itertools.product(*[[None, *(order for _, order in arcs)] for arcs in candidates]):
+                chosen = [(driver, order) for driver, order in enumerate(choice) if order is not None]
+                if len({order for _, order in chosen}) == len(chosen):
+                    key = (-len(chosen), sum(costs[pair] for pair in chosen))
+                    best = key if best is None else min(best, key)
+            self.assertEqual((-len(assignment), sum(costs[pair] for pair in assignment.items())), best, candidates)
+
+    def test_plan_prefers_nearby_and_older_orders(self):
+        drivers = [(42.66, 21.16)]
+        # E dyta është pak më larg, por ka pritur shumë më gjatë
+        orders = [(42.661, 21.16, 0), (42.662, 21.16, 20), (42.90, 21.16, 60)]
+        self.assertEqual([order for _, order, _ in dispatch.plan(drivers, orders)], [1])
+        self.assertEqual(dispatch.plan(drivers, [orders[2]]), []) # Përtej MAX_PICKUP_KM
+
+
+class RunBatchTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email="dp-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        customer = User.objects.create_user(email="dp-customer@test.com", password="password")
+        self.orders = []
+        for n, lat in enumerate((42.66, 42.70)):
+            address = Address.objects.create(user=owner, street=f"R{n}", city="Prishtinë", postal_code="10000", latitude=lat, longitude=21.16)
+            restaurant = Restaurant.objects.create(owner=owner, name=f"R{n}", phone_number="111", address=address, is_active=True, is_approved=True)
+            self.orders.append(Order.objects.create(
+                customer=customer, restaurant=restaurant, order_total="10.00", status=Order.OrderStatus.READY_FOR_PICKUP,
+                delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+            ))
+        self.drivers = []
+        for n in range(3):
+            driver = User.objects.create_user(
+                email=f"dp-driver{n}@test.com", password="password", role=User.Role.DRIVER, is_available_for_delivery=True,
+            )
+            DriverProfile.objects.create(user=driver)
+            self.drivers.append(driver)
+        client = APIClient()
+        for driver, lat in zip(self.drivers, (42.701, 42.661, 42.66)): # Pozicioni vjen nga aplikacioni i shoferit
+            client.force_authenticate(user=driver)
+            client.patch(reverse('driverprofile-detail', kwargs={'pk': driver.pk}), {'current_location_lat': lat, 'current_location_lon': 21.16}, format='json')
+
+    def test_assigns_nearest_available_drivers(self):
+        DriverProfile.objects.filter(user=self.drivers[2]).update(location_updated_at=timezone.now() - timedelta(hours=1))
+        orders, drivers, pairs = dispatch.run_batch()
+        self.assertEqual((len(orders), len(drivers)), (2, 2)) # Pozicioni i shoferit të tretë është i vjetër
+        self.assertEqual({(driver.pk, order.pk) for driver, order, _ in pairs},
+                         {(self.drivers[0].pk, self.orders[1].pk), (self.drivers[1].pk, self.orders[0].pk)})
+        for order in self.orders:
+            order.refresh_from_db()
+            self.assertEqual(order.status, Order.OrderStatus.CONFIRMED)
+        self.assertEqual(dispatch.run_batch()[2], []) # Asgjë për të caktuar më
+
+    def test_skips_drivers_that_took_an_order_meanwhile(self):
+        pairs = [(self.drivers[0], self.orders[1]), (self.drivers[1], self.orders[0])]
+        Order.claim_for_driver(self.drivers[0], order_id=self.orders[1].pk)
+        assigned = dispatch.commit_assignments(pairs)
+        self.assertEqual([order.pk for order in assigned], [self.orders[0].pk])
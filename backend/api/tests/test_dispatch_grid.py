@@ -0,0 +1,70 @@
+import random
+
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+
+from api import dispatch_grid
+from api.dispatch_grid import ReadyOrderGrid, distance_km
+from api.models import Address, Order, Restaurant
+
+User = get_user_model()
+
+
+class ReadyOrderGridTests(SimpleTestCase):
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(7)
+        grid = ReadyOrderGrid()
+        points = {}
+        for order_id in range(3000): # Një qytet i dendur dhe disa porosi larg tij
+            points[order_id] = (42.66 + rng.uniform(-0.2, 0.2), 21.16 + rng.uniform(-0.3, 0.3))
+        for order_id in range(3000, 3010):
+            points[order_id] = (rng.uniform(-80, 80), rng.uniform(-180, 180))
+        for order_id, (lat, lon) in points.items():
+            grid.add(order_id, lat, lon)
+
+        queries = [(42.66 + rng.uniform(-0.25, 0.25), 21.16 + rng.uniform(-0.35, 0.35)) for _ in range(50)]
+        queries += [(0.0, 0.0), (70.0, 179.9)]
+        for lat, lon in queries:
+            expected = sorted((distance_km(lat, lon, *point), order_id) for order_id, point in points.items())[:10]
+            self.assertEqual([order_id for _, order_id in grid.nearest(lat, lon, 10)], [order_id for _, order_id in expected])
+
+    def test_add_remove_and_max_distance(self):
+        grid = ReadyOrderGrid()
+        grid.add(1, 42.660, 21.160)
+        grid.add(2, 42.670, 21.160) # ~1.1 km
+        grid.add(3, 42.900, 21.160) # ~27 km
+        grid.add(4, None, None, ready_at=None)
+        self.assertEqual(len(grid), 4)
+        self.assertEqual([order_id for _, order_id in grid.nearest(42.66, 21.16, 5, max_km=5)], [1, 2])
+        self.assertEqual(grid.oldest_unlocated(5), [4])
+
+        grid.remove(1)
+        grid.add(2, 42.900, 21.170) # Restoranti ndryshoi vendndodhje: zëvendësohet, nuk dyfishohet
+        self.assertEqual([order_id for _, order_id in grid.nearest(42.66, 21.16, 5)], [3, 2])
+        self.assertEqual(grid.nearest(42.66, 21.16, 0), [])
+
+
+class DispatchGridSyncTests(TestCase):
+
+    def setUp(self):
+        owner = User.objects.create_user(email="dg-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        address = Address.objects.create(user=owner, street="Rruga", city="Prishtinë", postal_code="10000", latitude=42.66, longitude=21.16)
+        restaurant = Restaurant.objects.create(owner=owner, name="Grid", phone_number="111", address=address, is_active=True, is_approved=True)
+        customer = User.objects.create_user(email="dg-customer@test.com", password="password")
+        self.order = Order.objects.create(
+            customer=customer, restaurant=restaurant, order_total="10.00", status=Order.OrderStatus.PREPARING,
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+        dispatch_grid.rebuild()
+
+    def test_transitions_update_grid_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.transition_to(Order.OrderStatus.READY_FOR_PICKUP, Order.Actor.RESTAURANT)
+            self.assertNotIn(self.order.pk, dispatch_grid.grid.cells) # Jo para commit-it
+        self.assertEqual(dispatch_grid.grid.nearest(42.66, 21.16, 1)[0][1], self.order.pk)
+
+        driver = User.objects.create_user(email="dg-driver@test.com", password="password", role=User.Role.DRIVER)
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.claim_for_driver(driver)
+        self.assertEqual(dispatch_grid.grid.nearest(42.66, 21.16, 1), [])
@@ -0,0 +1,101 @@
+import random
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db.models.query import QuerySet
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from api import eta
+from api.eta import QuantileSketch
+from api.models import EtaSketch, Order, Restaurant
+
+User = get_user_model()
+
+
+class QuantileSketchTests(SimpleTestCase):
+
+    def test_quantiles_within_relative_accuracy(self):
+        rng = random.Random(5)
+        values = sorted(rng.lognormvariate(7, 0.5) for _ in range(999)) # Rreth 18 minuta
+        sketch = QuantileSketch()
+        for value in values:
+            sketch.add(value)
+        for q in (0.1, 0.5, 0.9):
+            exact = values[int(q * (len(values) - 1))]
+            self.assertLessEqual(abs(sketch.quantile(q) - exact) / exact, eta.RELATIVE_ACCURACY + 1e-9)
+        self.assertEqual(QuantileSketch(sketch.to_json()).quantile(0.5), sketch.quantile(0.5))
+        self.assertIsNone(QuantileSketch().quantile(0.5))
+
+    def test_old_samples_decay(self):
+        sketch = QuantileSketch()
+        for _ in range(eta.MAX_SAMPLES):
+            sketch.add(600)
+        for _ in range(eta.MAX_SAMPLES):
+            sketch.add(1800)
+        self.assertLessEqual(sketch.count, eta.MAX_SAMPLES)
+        self.assertAlmostEqual(sketch.quantile(0.5), 1800, delta=1800 * eta.RELATIVE_ACCURACY)
+
+
+class EtaTransitionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email="eta-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.customer = User.objects.create_user(email="eta-customer@test.com", password="password")
+        self.driver = User.objects.create_user(email="eta-driver@test.com", password="password", role=User.Role.DRIVER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="ETA", phone_number="111", is_active=True, is_approved=True)
+        self.other = Restaurant.objects.create(owner=self.owner, name="ETA 2", phone_number="111", is_active=True, is_approved=True)
+
+    def deliver(self, restaurant, prep_minutes, delivery_minutes):
+        """Kalon një porosi nëpër të gjitha tranzicionet me kohët e dhëna."""
+        order = Order.objects.create(
+            customer=self.customer, restaurant=restaurant, order_total="10.00", status=Order.OrderStatus.PREPARING,
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+        order.created_at = timezone.now() - timedelta(minutes=prep_minutes)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.transition_to(Order.OrderStatus.READY_FOR_PICKUP, Order.Actor.RESTAURANT)
+        order.transition_to(Order.OrderStatus.CONFIRMED, Order.Actor.DRIVER, driver=self.driver)
+        order.transition_to(Order.OrderStatus.ON_THE_WAY, Order.Actor.DRIVER)
+        order.ready_for_pickup_at -= timedelta(minutes=delivery_minutes)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.transition_to(Order.OrderStatus.DELIVERED, Order.Actor.DRIVER)
+
+    def estimate_minutes(self, restaurant):
+        start = timezone.now()
+        return (eta.estimate_delivery_time(restaurant.pk, start) - start).total_seconds() / 60
+
+    def test_estimate_uses_restaurant_then_global_then_defaults(self):
+        self.assertAlmostEqual(self.estimate_minutes(self.restaurant), 40) # DEFAULT_STAGE_SECONDS
+        for _ in range(3):
+            self.deliver(self.restaurant, prep_minutes=30, delivery_minutes=10)
+        self.assertEqual(EtaSketch.objects.get(restaurant=self.restaurant, stage=EtaSketch.Stage.PREP).count, 3)
+        # Më pak se MIN_SAMPLES: edhe restoranti vetë përdor sketch-in e përgjithshëm
+        self.assertAlmostEqual(self.estimate_minutes(self.other), 40, delta=40 * eta.RELATIVE_ACCURACY)
+
+        with mock.patch.object(eta, 'MIN_SAMPLES', 3):
+            self.deliver(self.other, prep_minutes=5, delivery_minutes=5)
+            self.assertAlmostEqual(self.estimate_minutes(self.restaurant), 40, delta=40 * eta.RELATIVE_ACCURACY)
+            self.assertAlmostEqual(self.estimate_minutes(self.other), 40, delta=1) # Mediana e përgjithshme: 30 + 10
+
+    def test_estimate_is_a_single_query(self):
+        for _ in range(2):
+            self.deliver(self.restaurant, prep_minutes=25, delivery_minutes=15)
+        with self.assertNumQueries(1):
+            estimate = eta.estimate_delivery_time(self.restaurant.pk, timezone.now())
+        self.assertAlmostEqual((estimate - timezone.now()).total_seconds() / 60, 40, delta=1)
+
+    def test_only_the_restaurant_row_is_locked(self):
+        locked = []
+        select_for_update = QuerySet.select_for_update
+
+        def spy(queryset, *args, **kwargs):
+            locked.append(str(queryset.query))
+            return select_for_update(queryset, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, 'select_for_update', autospec=True, side_effect=spy):
+            eta.record_duration(self.restaurant.pk, EtaSketch.Stage.PREP, 600)
+            eta.record_duration(self.other.pk, EtaSketch.Stage.PREP, 1200)
+        self.assertEqual(len(locked), 2)
+        self.assertFalse(any('IS NULL' in sql for sql in locked))
+        self.assertEqual(EtaSketch.objects.get(restaurant__isnull=True, stage=EtaSketch.Stage.PREP).count, 2)
@@ -1,6 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from api.models import CuisineType, Restaurant, Address
+from decimal import Decimal
+
+from api.models import CuisineType, Restaurant, Address, Order, OrderTransitionError, OrderTransitionConflict, Review
 
 User = get_user_model()
 
@@ -58,3 +60,130 @@ class RestaurantModelTests(TestCase):
         self.assertEqual(restaurant.owner, self.owner)
         self.assertEqual(str(restaurant), "Test Restaurant")
 
+
+class RestaurantRatingAggregateTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(email='rating-owner@example.com', password='password123', role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=owner, name="Yje", phone_number="111")
+        self.other = Restaurant.objects.create(owner=owner, name="Tjetri", phone_number="222")
+        self.customers = [User.objects.create_user(email=f'rating{i}@example.com', password='password123') for i in range(3)]
+
+    def assert_aggregates(self, restaurant, total, count, histogram, average):
+        restaurant.refresh_from_db()
+        self.assertEqual((restaurant.rating_sum, restaurant.rating_count), (total, count))
+        self.assertEqual(restaurant.rating_histogram, dict(zip(range(1, 6), histogram)))
+        self.assertEqual(restaurant.average_rating, Decimal(average))
+
+    def test_create_update_and_delete_keep_aggregates_in_sync(self):
+        first = Review.objects.create(restaurant=self.restaurant, user=self.customers[0], rating=5)
+        Review.objects.create(restaurant=self.restaurant, user=self.customers[1], rating=4)
+        second = Review.objects.create(restaurant=self.restaurant, user=self.customers[2], rating=4)
+        self.assert_aggregates(self.restaurant, 13, 3, [0, 0, 0, 2, 1], "4.33")
+
+        first.rating = 1
+        first.save()
+        second.comment = "Vetëm komenti"
+        second.save()
+        self.assert_aggregates(self.restaurant, 9, 3, [1, 0, 0, 2, 0], "3.00")
+
+        second.restaurant = self.other
+        second.save()
+        self.assert_aggregates(self.restaurant, 5, 2, [1, 0, 0, 1, 0], "2.50")
+        self.assert_aggregates(self.other, 4, 1, [0, 0, 0, 1, 0], "4.00")
+
+        first.delete()
+        Review.objects.filter(restaurant=self.restaurant).delete() # Fshirje me queryset
+        self.assert_aggregates(self.restaurant, 0, 0, [0, 0, 0, 0, 0], "0.00")
+
+    def test_deleting_author_updates_restaurant(self):
+        Review.objects.create(restaurant=self.restaurant, user=self.customers[0], rating=2)
+        Review.objects.create(restaurant=self.restaurant, user=self.customers[1], rating=5)
+        self.customers[0].delete() # Vlerësimi fshihet me kaskadë
+        self.assert_aggregates(self.restaurant, 5, 1, [0, 0, 0, 0, 1], "5.00")
+
+    def test_stale_restaurant_save_keeps_concurrent_ratings(self):
+        stale = Restaurant.objects.get(pk=self.restaurant.pk) # Lexuar para vlerësimit, p.sh. nga approve_restaurant
+        Review.objects.create(restaurant=self.restaurant, user=self.customers[0], rating=4)
+        self.restaurant.refresh_from_db()
+        self.assertGreater(self.restaurant.updated_at, stale.updated_at) # Validatorët e restorantit e shohin vlerësimin
+        stale.is_approved = True
+        stale.save()
+        self.assert_aggregates(self.restaurant, 4, 1, [0, 0, 0, 1, 0], "4.00")
+        self.assertTrue(self.restaurant.is_approved)
+
+
+class OrderStateMachineTests(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='sm-customer@example.com', password='password123')
+        self.owner = User.objects.create_user(email='sm-owner@example.com', password='password123', role=User.Role.RESTAURANT_OWNER)
+        self.driver = User.objects.create_user(email='sm-driver@example.com', password='password123', role=User.Role.DRIVER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Gjendje", phone_number="111")
+        self.order = Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, order_total="10.00",
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+
+    def test_transition_is_a_single_conditional_update_with_timestamp(self):
+        updated_at = self.order.updated_at
+        with self.assertNumQueries(1):
+            self.order.transition_to(Order.OrderStatus.CONFIRMED, Order.Actor.RESTAURANT)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.OrderStatus.CONFIRMED)
+        self.assertIsNotNone(self.order.confirmed_at)
+        self.assertGreater(self.order.updated_at, updated_at)
+
+    def test_disallowed_transitions_are_rejected(self):
+        with self.assertRaises(OrderTransitionError):
+            self.order.transition_to(Order.OrderStatus.READY_FOR_PICKUP, Order.Actor.RESTAURANT) # Kapërcen hapa
+        with self.assertRaises(OrderTransitionError):
+            self.order.transition_to(Order.OrderStatus.ON_THE_WAY, Order.Actor.RESTAURANT) # Jo për restorantin
+
+    def test_stale_instance_loses_the_race(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.order.transition_to(Order.OrderStatus.CANCELLED_BY_RESTAURANT, Order.Actor.RESTAURANT)
+        with self.assertRaises(OrderTransitionConflict):
+            stale.transition_to(Order.OrderStatus.CONFIRMED, Order.Actor.RESTAURANT)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, Order.OrderStatus.CANCELLED_BY_RESTAURANT)
+
+    def test_save_sets_timestamp_without_extra_select(self):
+        order = Order.objects.select_related('restaurant').get(pk=self.order.pk) # Invalidimi i cache-it lexon pronarin
+        order.status = Order.OrderStatus.PREPARING
+        with self.assertNumQueries(1):
+            order.save()
+        self.assertIsNotNone(order.preparation_started_at)
+
+
+class DriverClaimTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='claim-owner@example.com', password='password123', role=User.Role.RESTAURANT_OWNER)
+        self.driver = User.objects.create_user(email='claim-driver@example.com', password='password123', role=User.Role.DRIVER)
+        self.other_driver = User.objects.create_user(email='claim-driver2@example.com', password='password123', role=User.Role.DRIVER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Claim", phone_number="111")
+        self.orders = [
+            Order.objects.create(
+                customer=self.owner, restaurant=self.restaurant, order_total="10.00", status=Order.OrderStatus.READY_FOR_PICKUP,
+                delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+            )
+            for _ in range(2)
+        ]
+
+    def test_claims_oldest_ready_order(self):
+        order = Order.claim_for_driver(self.driver)
+        self.assertEqual(order.pk, self.orders[0].pk)
+        self.assertEqual(order.status, Order.OrderStatus.CONFIRMED)
+        self.assertEqual(Order.objects.get(pk=order.pk).driver, self.driver)
+        # Shoferi tjetër merr porosinë tjetër, jo të njëjtën
+        self.assertEqual(Order.claim_for_driver(self.other_driver).pk, self.orders[1].pk)
+
+    def test_driver_with_active_delivery_cannot_claim(self):
+        Order.claim_for_driver(self.driver)
+        with self.assertRaises(OrderTransitionError):
+            Order.claim_for_driver(self.driver, order_id=self.orders[1].pk)
+        self.assertIsNone(Order.objects.get(pk=self.orders[1].pk).driver)
+
+    def test_taken_order_is_not_claimed_again(self):
+        Order.claim_for_driver(self.driver, order_id=self.orders[0].pk)
+        self.assertIsNone(Order.claim_for_driver(self.other_driver, order_id=self.orders[0].pk))
+        Order.claim_for_driver(self.other_driver)
+        self.assertIsNone(Order.claim_for_driver(User.objects.create_user(email='claim-driver3@example.com', password='x', role=User.Role.DRIVER)))
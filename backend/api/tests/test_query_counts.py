@@ -0,0 +1,311 @@
+"""
+Kufijtë e numrit të query-ve për çdo route të api/urls.py.
+
+Të dhënat janë me vëllim real (disa restorante me 21 artikuj secili, porosi me artikuj, vlerësime me
+përgjigje), kështu që një N+1 i ri e kalon kufirin menjëherë. Cache-i pastrohet para çdo kërkese:
+matet rruga e ftohtë, ajo që godet databazën. Kur një kufi kalohet, testi shfaq SQL-në e ekzekutuar.
+"""
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from api import cache_utils, dispatch_grid, urls
+from api.models import (
+    Address, Cart, CartItem, CuisineType, DriverProfile, MenuCategory, MenuItem, OperatingHours, Order,
+    OrderItem, PageViewLog, Restaurant, Review, ReviewReply,
+)
+
+User = get_user_model()
+
+RESTAURANTS = 6
+CATEGORIES_PER_RESTAURANT = 3
+ITEMS_PER_CATEGORY = 7
+ORDERS_PER_CUSTOMER = 6
+ITEMS_PER_ORDER = 3
+
+# Numri maksimal i query-ve për çdo route. Variantet e së njëjtës route (p.sh. sipas rolit) shënohen me [..].
+# Kur një route e re shtohet te api/urls.py, test_every_route_has_a_budget kërkon një kufi këtu.
+QUERY_BUDGETS = {
+    'auth_register': 4,
+    'auth_login': 3,
+    'token_refresh': 1,
+    'auth_me': 1,
+    'auth_logout': 0,
+    'admin_cache_metrics': 0,
+    'user-admin-management-list': 3,
+    'user-admin-management-detail': 2,
+    'user-admin-management-reset-password-admin': 2,
+    'user-admin-management-set-password-admin': 4,
+    'address-list': 2,
+    'address-detail': 1,
+    'cuisinetype-list': 1,
+    'cuisinetype-detail': 1,
+    'restaurant-list': 4,
+    'restaurant-list[admin]': 4,
+    'restaurant-list[owner]': 4,
+    'restaurant-detail': 4,
+    'restaurant-detail[owner]': 4,
+    'restaurant-approve-restaurant': 5,
+    'restaurant-log-page-view': 2,
+    'restaurant-menu-categories-for-restaurant': 3,
+    'restaurant-menu-items-for-restaurant': 2,
+    'restaurant-toggle-active-status': 5,
+    'order-list[customer]': 2,
+    'order-list[owner]': 2,
+    'order-list[driver]': 2,
+    'order-list[admin]': 2,
+    'order-list[keyset]': 1,
+    'order-list[create]': 13,
+    'order-detail': 6,
+    'order-claim-next': 15,
+    'order-my-active-delivery': 1,
+    'order-available-for-driver': 4,
+    'order-available-for-driver[nearest]': 4,
+    'order-accept-delivery': 15,
+    'order-update-status-driver': 6,
+    'order-update-status-restaurant': 5,
+    'driverprofile-list': 4,
+    'driverprofile-detail': 2,
+    'cart-my-cart': 5,
+    'cart-add-item': 10,
+    'cart-update-item-quantity': 7,
+    'cart-remove-item': 8,
+    'cart-clear-cart': 7,
+    'restaurant-menucategory-list': 3,
+    'restaurant-menucategory-detail': 2,
+    'restaurant-menuitem-list': 2,
+    'restaurant-menuitem-detail': 1,
+    'restaurant-operating-hours-list': 3,
+    'restaurant-operating-hours-detail': 2,
+    'restaurant-reviews-list': 5,
+    'restaurant-reviews-detail': 4,
+    'review-replies-list': 3,
+    'review-replies-detail': 2,
+}
+UNBUDGETED_ROUTES = {'api-root'} # Faqja e DefaultRouter, pa databazë
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+@override_settings(API_CACHE_MAX_STALENESS={
+    cache_utils.NS_CUISINE_TYPES_LIST: 0,
+    cache_utils.NS_RESTAURANTS_LIST_PUBLIC: 0,
+})
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(email="qb-admin@test.com", password="password", first_name="A", last_name="D")
+        cls.owner = User.objects.create_user(email="qb-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        cls.other_owner = User.objects.create_user(email="qb-owner2@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        cls.driver = User.objects.create_user(email="qb-driver@test.com", password="password", role=User.Role.DRIVER)
+        cls.idle_driver = User.objects.create_user(email="qb-driver2@test.com", password="password", role=User.Role.DRIVER)
+        cls.customers = [
+            User.objects.create_user(email=f"qb-customer{i}@test.com", password="password", first_name=f"K{i}", last_name="K")
+            for i in range(3)
+        ]
+        cls.customer = cls.customers[0]
+        DriverProfile.objects.create(user=cls.driver, vehicle_type="Motor", license_plate="01-111-AA")
+        DriverProfile.objects.create(user=cls.idle_driver, vehicle_type="Makinë", license_plate="01-222-BB")
+        for user in cls.customers + [cls.driver]:
+            for n in range(2):
+                Address.objects.create(user=user, street=f"Rruga {n}", city="Prishtinë", postal_code="10000", is_default_shipping=n == 0)
+
+        cuisines = [CuisineType.objects.create(name=name) for name in ("Italiane", "Shqiptare", "Turke")]
+        cls.restaurants = []
+        for r in range(RESTAURANTS):
+            owner = cls.owner if r % 2 == 0 else cls.other_owner
+            address = Address.objects.create(
+                user=owner, street=f"Bulevardi {r}", city="Prishtinë", postal_code="10000", latitude=42.66 + r / 100, longitude=21.16,
+            )
+            restaurant = Restaurant.objects.create(
+                owner=owner, name=f"Restoranti {r}", phone_number="044000000", address=address, is_active=True, is_approved=True,
+            )
+            restaurant.cuisine_types.set(cuisines[:2])
+            for day in OperatingHours.DayOfWeek.values:
+                OperatingHours.objects.create(restaurant=restaurant, day_of_week=day, open_time="09:00", close_time="22:00")
+            for c in range(CATEGORIES_PER_RESTAURANT):
+                category = MenuCategory.objects.create(restaurant=restaurant, name=f"Kategoria {c}", display_order=c)
+                MenuItem.objects.bulk_create([
+                    MenuItem(category=category, restaurant=restaurant, name=f"Artikulli {c}-{i}", price="4.50", is_available=i != 0)
+                    for i in range(ITEMS_PER_CATEGORY)
+                ])
+            PageViewLog.objects.bulk_create([PageViewLog(restaurant=restaurant) for _ in range(5)])
+            cls.restaurants.append(restaurant)
+        cls.restaurant = cls.restaurants[0]
+        cls.menu_items = list(MenuItem.objects.filter(restaurant=cls.restaurant, is_available=True))
+
+        cls.orders = []
+        for customer in cls.customers:
+            for n in range(ORDERS_PER_CUSTOMER):
+                restaurant = cls.restaurants[n % RESTAURANTS]
+                order = Order.objects.create(
+                    customer=customer, restaurant=restaurant, order_total="13.50", status=Order.OrderStatus.DELIVERED,
+                    driver=cls.driver, delivery_address_street="Rruga 0", delivery_address_city="Prishtinë",
+                    delivery_address_postal_code="10000",
+                )
+                items = list(MenuItem.objects.filter(restaurant=restaurant, is_available=True)[:ITEMS_PER_ORDER])
+                OrderItem.objects.bulk_create([
+                    OrderItem(order=order, menu_item=item, item_name_at_purchase=item.name, item_price_at_purchase=item.price, quantity=2)
+                    for item in items
+                ])
+                cls.orders.append(order)
+        cls.order = cls.orders[0]
+        # Porositë në tranzicion: një për restorantin, dy gati për shofer
+        cls.pending_order = Order.objects.create(
+            customer=cls.customer, restaurant=cls.restaurant, order_total="9.00", status=Order.OrderStatus.PREPARING,
+            delivery_address_street="Rruga 0", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+        cls.ready_orders = [
+            Order.objects.create(
+                customer=cls.customer, restaurant=cls.restaurant, order_total="9.00", status=Order.OrderStatus.READY_FOR_PICKUP,
+                delivery_address_street="Rruga 0", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+            )
+            for _ in range(2)
+        ]
+
+        for restaurant in cls.restaurants:
+            for customer in cls.customers:
+                review = Review.objects.create(restaurant=restaurant, user=customer, rating=4, comment="Shumë mirë")
+                for _ in range(2):
+                    ReviewReply.objects.create(review=review, user=restaurant.owner, text="Faleminderit!")
+        cls.review = Review.objects.filter(restaurant=cls.restaurant).first()
+
+        cls.cart = Cart.objects.create(user=cls.customer, restaurant=cls.restaurant)
+        cls.cart_items = [CartItem.objects.create(cart=cls.cart, menu_item=item, quantity=1) for item in cls.menu_items[:3]]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def request_within_budget(self, budget_key, method='get', user=None, kwargs=None, data=None, expected_status=status.HTTP_200_OK):
+        """Ekzekuton kërkesën me cache bosh dhe dështon me SQL-në e plotë nëse kalohet kufiri."""
+        route = re.sub(r'\[.*\]$', '', budget_key)
+        budget = QUERY_BUDGETS[budget_key]
+        url = reverse(route, kwargs=kwargs)
+        self.client.force_authenticate(user=user)
+        cache.clear()
+        cache_utils.clear_local_cache()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json') if method != 'get' else self.client.get(url, data)
+        if expected_status is not None:
+            self.assertEqual(response.status_code, expected_status, f"{budget_key}: {getattr(response, 'data', response)}")
+        if len(queries) > budget:
+            sql = "\n".join(f"  {n}. {query['sql']}" for n, query in enumerate(queries.captured_queries, 1))
+            self.fail(f"{budget_key} ({method.upper()} {url}): {len(queries)} query > kufiri {budget}\n{sql}")
+        return response
+
+    def test_every_route_has_a_budget(self):
+        budgeted = {re.sub(r'\[.*\]$', '', key) for key in QUERY_BUDGETS}
+        missing = set(route_names(urls.urlpatterns)) - budgeted - UNBUDGETED_ROUTES
+        self.assertFalse(missing, f"Route pa kufi query-sh te QUERY_BUDGETS: {sorted(missing)}")
+
+    def test_auth_routes(self):
+        self.request_within_budget('auth_register', 'post', data={
+            'email': 'qb-new@test.com', 'first_name': 'N', 'last_name': 'U',
+            'password': 'password123', 'password_confirm': 'password123', 'role': User.Role.CUSTOMER,
+        }, expected_status=status.HTTP_201_CREATED)
+        self.request_within_budget('auth_login', 'post', data={'email': self.customer.email, 'password': 'password'})
+        refresh = str(RefreshToken.for_user(self.customer))
+        self.request_within_budget('token_refresh', 'post', data={'refresh': refresh})
+        self.request_within_budget('auth_me', user=self.customer)
+        self.request_within_budget('auth_logout', 'post', user=self.customer, data={'refresh': refresh}, expected_status=None)
+
+    def test_admin_user_routes(self):
+        self.request_within_budget('admin_cache_metrics', user=self.admin)
+        self.request_within_budget('user-admin-management-list', user=self.admin)
+        user_kwargs = {'pk': self.customer.pk}
+        self.request_within_budget('user-admin-management-detail', user=self.admin, kwargs=user_kwargs)
+        self.request_within_budget('user-admin-management-reset-password-admin', 'post', user=self.admin, kwargs=user_kwargs)
+        self.request_within_budget('user-admin-management-set-password-admin', 'post', user=self.admin, kwargs=user_kwargs,
+                                   data={'new_password': 'fjalekalim-i-ri'})
+
+    def test_address_and_cuisine_routes(self):
+        self.request_within_budget('address-list', user=self.customer)
+        address = self.customer.addresses.first()
+        self.request_within_budget('address-detail', user=self.customer, kwargs={'pk': address.pk})
+        self.request_within_budget('cuisinetype-list')
+        self.request_within_budget('cuisinetype-detail', kwargs={'pk': CuisineType.objects.first().pk})
+
+    def test_restaurant_routes(self):
+        restaurant_kwargs = {'pk': self.restaurant.pk}
+        self.request_within_budget('restaurant-list')
+        self.request_within_budget('restaurant-list[admin]', user=self.admin)
+        self.request_within_budget('restaurant-list[owner]', user=self.owner)
+        self.request_within_budget('restaurant-detail', kwargs=restaurant_kwargs)
+        self.request_within_budget('restaurant-detail[owner]', user=self.owner, kwargs=restaurant_kwargs)
+        self.request_within_budget('restaurant-menu-categories-for-restaurant', kwargs=restaurant_kwargs)
+        self.request_within_budget('restaurant-menu-items-for-restaurant', kwargs=restaurant_kwargs)
+        self.request_within_budget('restaurant-log-page-view', 'post', kwargs=restaurant_kwargs, expected_status=None)
+        self.request_within_budget('restaurant-approve-restaurant', 'patch', user=self.admin, kwargs=restaurant_kwargs, data={'is_approved': True})
+        self.request_within_budget('restaurant-toggle-active-status', 'patch', user=self.owner, kwargs=restaurant_kwargs)
+
+    def test_menu_and_operating_hours_routes(self):
+        nested = {'restaurant_pk': self.restaurant.pk}
+        category = self.restaurant.menu_categories.first()
+        self.request_within_budget('restaurant-menucategory-list', kwargs=nested)
+        self.request_within_budget('restaurant-menucategory-detail', kwargs={**nested, 'pk': category.pk})
+        self.request_within_budget('restaurant-menuitem-list', kwargs=nested)
+        self.request_within_budget('restaurant-menuitem-detail', kwargs={**nested, 'pk': self.menu_items[0].pk})
+        self.request_within_budget('restaurant-operating-hours-list', kwargs=nested)
+        hours = self.restaurant.operating_hours.first()
+        self.request_within_budget('restaurant-operating-hours-detail', kwargs={**nested, 'pk': hours.pk})
+
+    def test_review_routes(self):
+        nested = {'restaurant_pk': self.restaurant.pk}
+        self.request_within_budget('restaurant-reviews-list', kwargs=nested)
+        self.request_within_budget('restaurant-reviews-detail', kwargs={**nested, 'pk': self.review.pk})
+        replies = {**nested, 'review_pk': self.review.pk}
+        self.request_within_budget('review-replies-list', kwargs=replies)
+        self.request_within_budget('review-replies-detail', kwargs={**replies, 'pk': self.review.replies.first().pk})
+
+    def test_order_read_routes(self):
+        self.request_within_budget('order-list[customer]', user=self.customer)
+        self.request_within_budget('order-list[owner]', user=self.owner)
+        self.request_within_budget('order-list[driver]', user=self.driver)
+        self.request_within_budget('order-list[admin]', user=self.admin)
+        self.request_within_budget('order-list[keyset]', user=self.customer, data={'pagination': 'keyset'})
+        self.request_within_budget('order-detail', user=self.customer, kwargs={'pk': self.order.pk})
+        self.request_within_budget('order-my-active-delivery', user=self.driver)
+        self.request_within_budget('order-available-for-driver', user=self.idle_driver)
+        dispatch_grid.rebuild() # Rindërtimi (një query) bëhet rrallë, jo në çdo kërkesë
+        self.request_within_budget('order-available-for-driver[nearest]', user=self.idle_driver, data={'lat': 42.66, 'lon': 21.16})
+
+    def test_order_write_routes(self):
+        self.request_within_budget('order-list[create]', 'post', user=self.customers[1], data={
+            'restaurant_id': self.restaurant.pk,
+            'delivery_address_id': self.customers[1].addresses.first().pk,
+            'items': [{'menu_item': item.pk, 'quantity': 1} for item in self.menu_items[:5]],
+        }, expected_status=status.HTTP_201_CREATED)
+        self.request_within_budget('order-update-status-restaurant', 'patch', user=self.owner,
+                                   kwargs={'pk': self.pending_order.pk}, data={'status': Order.OrderStatus.READY_FOR_PICKUP})
+        self.request_within_budget('order-claim-next', 'post', user=self.idle_driver)
+        Order.objects.filter(driver=self.idle_driver).update(status=Order.OrderStatus.DELIVERED)
+        self.request_within_budget('order-accept-delivery', 'patch', user=self.idle_driver, kwargs={'pk': self.ready_orders[1].pk})
+        self.request_within_budget('order-update-status-driver', 'patch', user=self.idle_driver,
+                                   kwargs={'pk': self.ready_orders[1].pk}, data={'status': Order.OrderStatus.ON_THE_WAY})
+
+    def test_driver_profile_routes(self):
+        self.request_within_budget('driverprofile-list', user=self.admin)
+        self.request_within_budget('driverprofile-detail', user=self.driver, kwargs={'pk': self.driver.pk})
+
+    def test_cart_routes(self):
+        self.request_within_budget('cart-my-cart', user=self.customer)
+        self.request_within_budget('cart-add-item', 'post', user=self.customer, data={'menu_item_id': self.menu_items[4].pk, 'quantity': 2})
+        item_kwargs = {'item_pk': self.cart_items[0].pk}
+        self.request_within_budget('cart-update-item-quantity', 'patch', user=self.customer, kwargs=item_kwargs, data={'quantity': 3})
+        self.request_within_budget('cart-remove-item', 'delete', user=self.customer, kwargs=item_kwargs)
+        self.request_within_budget('cart-clear-cart', 'delete', user=self.customer)
@@ -1,11 +1,24 @@
 from django.urls import reverse
+from django.test import override_settings
+from django.core.cache import cache
+from api import cache_metrics, cache_utils, dispatch_grid
 from rest_framework import status
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
+from api.views import MenuCategoryViewSet
 from django.contrib.auth import get_user_model
-from api.models import CuisineType, Restaurant, Address
+from api.models import CuisineType, Restaurant, Address, MenuCategory, MenuItem, Order, OrderItem, Cart, CartItem, DriverProfile
 
 User = get_user_model()
 
+# Këto teste kontrollojnë që leximi pas një shkrimi sheh ndryshimin menjëherë, pa stale-while-revalidate
+# (që përndryshe do ta rindërtonte listën në një thread në sfond).
+fresh_reads = override_settings(API_CACHE_MAX_STALENESS={
+    cache_utils.NS_CUISINE_TYPES_LIST: 0,
+    cache_utils.NS_RESTAURANTS_LIST_PUBLIC: 0,
+})
+
+
+@fresh_reads
 class CuisineTypeViewSetTests(APITestCase):
 
     def setUp(self):
@@ -70,6 +83,7 @@ class CuisineTypeViewSetTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(CuisineType.objects.count(), 1)
 
+@fresh_reads
 class RestaurantViewSetPublicTests(APITestCase):
     def setUp(self):
         self.client = APIClient()
@@ -95,3 +109,669 @@ class RestaurantViewSetPublicTests(APITestCase):
 
 # Këtu mund të shtoni më shumë teste për RestaurantViewSet duke simuluar role të ndryshme,
 # krijimin, modifikimin, fshirjen, dhe veprimet e personalizuara si 'approve_restaurant'.
+
+
+@fresh_reads
+class RestaurantListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner2@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Pica Roma", phone_number="111", is_active=True, is_approved=True)
+        Restaurant.objects.create(owner=self.owner, name="Burger Bar", phone_number="222", is_active=True, is_approved=True)
+        self.list_url = reverse('restaurant-list')
+
+    def test_public_list_is_served_from_cache(self):
+        self.client.get(self.list_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_public_filters_are_part_of_cache_key(self):
+        self.client.get(self.list_url)
+        response = self.client.get(self.list_url, {'name__icontains': 'pica'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['name'], "Pica Roma")
+
+    def test_restaurant_change_invalidates_public_list(self):
+        self.client.get(self.list_url)
+        self.restaurant.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.save()
+        response = self.client.get(self.list_url)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_owner_list_is_not_cached(self):
+        self.client.get(self.list_url)
+        self.client.force_authenticate(user=self.owner)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(name="Renamed") # update() nuk dërgon sinjale
+        response = self.client.get(self.list_url)
+        self.assertIn("Renamed", [r['name'] for r in response.data['results']])
+
+
+class RestaurantDetailCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner3@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.other_owner = User.objects.create_user(email="owner4@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.address = Address.objects.create(user=self.owner, street="1 Main", city="Test", postal_code="10000")
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Detail", address=self.address, phone_number="111", is_active=True, is_approved=True)
+        self.detail_url = reverse('restaurant-detail', kwargs={'pk': self.restaurant.pk})
+
+    def test_public_detail_is_cached_without_owner_details(self):
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('owner_details', response.data)
+
+    def test_private_variant_does_not_leak_to_public_or_other_owner(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['owner_details']['email'], self.owner.email)
+
+        self.client.force_authenticate(user=None)
+        self.assertNotIn('owner_details', self.client.get(self.detail_url).data)
+
+        self.client.force_authenticate(user=self.other_owner)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('owner_details', response.data)
+
+    def test_other_owner_on_cold_cache_gets_and_fills_public_variant(self):
+        self.client.force_authenticate(user=self.other_owner)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('owner_details', response.data)
+        private_key = cache_utils.get_restaurant_detail_cache_key(self.restaurant.pk, cache_utils.RESTAURANT_DETAIL_VARIANT_PRIVATE)
+        public_key = cache_utils.get_restaurant_detail_cache_key(self.restaurant.pk, cache_utils.RESTAURANT_DETAIL_VARIANT_PUBLIC)
+        self.assertIsNone(cache_utils.get_cached(private_key))
+        self.assertNotIn('owner_details', cache_utils.get_cached(public_key)['data'])
+
+        self.client.force_authenticate(user=self.owner) # Pronari nuk merr variantin publik nga cache-i
+        self.assertEqual(self.client.get(self.detail_url).data['owner_details']['email'], self.owner.email)
+
+    def test_other_owner_cannot_see_unapproved_restaurant(self):
+        self.restaurant.is_approved = False
+        self.restaurant.save()
+        self.client.force_authenticate(user=self.other_owner)
+        self.assertEqual(self.client.get(self.detail_url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_dependencies_invalidate_detail(self):
+        self.client.get(self.detail_url)
+        self.address.street = "2 Main"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.save()
+        self.assertEqual(self.client.get(self.detail_url).data['address_details']['street'], "2 Main")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.operating_hours.create(day_of_week=1, is_closed=True)
+        self.assertEqual(len(self.client.get(self.detail_url).data['operating_hours_details']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cuisine = CuisineType.objects.create(name="Albanian")
+            self.restaurant.cuisine_types.add(cuisine)
+        self.assertEqual(self.client.get(self.detail_url).data['cuisine_types_details'][0]['name'], "Albanian")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.address.delete()
+        self.assertIsNone(self.client.get(self.detail_url).data['address_details'])
+
+    def test_owner_change_invalidates_private_variant(self):
+        self.client.force_authenticate(user=self.owner)
+        self.client.get(self.detail_url)
+        self.owner.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.save()
+        self.assertEqual(self.client.get(self.detail_url).data['owner_details']['first_name'], "Renamed")
+
+
+class RestaurantMenuCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner5@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Menu", phone_number="111", is_active=True, is_approved=True)
+        self.category = MenuCategory.objects.create(restaurant=self.restaurant, name="Pica")
+        self.item = MenuItem.objects.create(category=self.category, restaurant=self.restaurant, name="Margherita", price="5.00")
+        self.categories_url = reverse('restaurant-menu-categories-for-restaurant', kwargs={'pk': self.restaurant.pk})
+        self.items_url = reverse('restaurant-menu-items-for-restaurant', kwargs={'pk': self.restaurant.pk})
+
+    def test_menu_reads_are_served_from_cache(self):
+        self.client.get(self.categories_url)
+        self.client.get(self.items_url)
+        with self.assertNumQueries(0):
+            categories = self.client.get(self.categories_url)
+            items = self.client.get(self.items_url)
+        self.assertEqual(categories.data[0]['menu_items'][0]['name'], "Margherita")
+        self.assertEqual(items.data[0]['name'], "Margherita")
+
+    def test_menu_changes_bump_menu_version(self):
+        self.client.get(self.items_url)
+        self.item.price = "6.50"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.save()
+        self.assertEqual(self.client.get(self.items_url).data[0]['price'], "6.50")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertEqual(self.client.get(self.categories_url).data, [])
+
+    def test_deactivated_restaurant_menu_is_not_served_from_cache(self):
+        self.client.get(self.items_url)
+        self.restaurant.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.restaurant.save()
+        self.assertEqual(self.client.get(self.items_url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@fresh_reads
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="owner6@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.customer = User.objects.create_user(email="customer6@test.com", password="password")
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Etag", phone_number="111", is_active=True, is_approved=True)
+        self.category = MenuCategory.objects.create(restaurant=self.restaurant, name="Pije")
+        self.item = MenuItem.objects.create(category=self.category, restaurant=self.restaurant, name="Ujë", price="1.00")
+
+    def assert_revalidates(self, url, change):
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_restaurant_list_and_detail(self):
+        def rename():
+            self.restaurant.name = "Etag 2"
+            self.restaurant.save()
+        self.assert_revalidates(reverse('restaurant-list'), rename)
+        self.assert_revalidates(reverse('restaurant-detail', kwargs={'pk': self.restaurant.pk}), rename)
+
+    def test_menu_and_cuisine_types(self):
+        def reprice():
+            self.item.price = "1.50"
+            self.item.save()
+        self.assert_revalidates(reverse('restaurant-menu-categories-for-restaurant', kwargs={'pk': self.restaurant.pk}), reprice)
+        self.assert_revalidates(reverse('cuisinetype-list'), lambda: CuisineType.objects.create(name="Greek"))
+
+    def test_my_cart_changes_when_items_change(self):
+        self.client.force_authenticate(user=self.customer)
+        url = reverse('cart-my-cart')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.client.post(reverse('cart-add-item'), {'menu_item_id': self.item.pk, 'quantity': 2}, format='json')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+
+class CacheMetricsEndpointTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        cache_metrics.metrics.reset()
+        self.client = APIClient()
+        self.url = reverse('admin_cache_metrics')
+        self.admin = User.objects.create_superuser(email="metrics-admin@test.com", password="password")
+        self.customer = User.objects.create_user(email="metrics-customer@test.com", password="password")
+
+    def test_only_admin_can_read_metrics(self):
+        self.client.force_authenticate(user=self.customer)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.get(reverse('cuisinetype-list'))
+        self.client.get(reverse('cuisinetype-list'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        cuisine_stats = response.data['namespaces'][cache_utils.NS_CUISINE_TYPES_LIST]
+        self.assertEqual((cuisine_stats['hits'], cuisine_stats['misses']), (1, 1))
+        self.assertEqual(response.data['ttls'][cache_utils.NS_RESTAURANTS_LIST_PUBLIC], cache_utils.RESTAURANT_LIST_CACHE_TTL)
+
+
+class OrderListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="order-customer@test.com", password="password")
+        self.other_customer = User.objects.create_user(email="order-other@test.com", password="password")
+        self.owner = User.objects.create_user(email="order-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.driver = User.objects.create_user(email="order-driver@test.com", password="password", role=User.Role.DRIVER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Porosi", phone_number="111", is_active=True, is_approved=True)
+        self.order = Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, driver=self.driver, order_total="10.00",
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+        self.url = reverse('order-list')
+
+    def list_statuses(self, user, **params):
+        self.client.force_authenticate(user=user)
+        return [order['status'] for order in self.client.get(self.url, params).data['results']]
+
+    def test_list_is_cached_per_user(self):
+        self.list_statuses(self.customer)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.list_statuses(self.customer), [Order.OrderStatus.PENDING])
+
+    def test_status_change_invalidates_customer_owner_and_driver_lists(self):
+        for user in (self.customer, self.owner, self.driver):
+            self.assertEqual(self.list_statuses(user), [Order.OrderStatus.PENDING])
+        self.list_statuses(self.other_customer)
+        other_version = cache_utils.get_user_orders_cache_version(self.other_customer.pk)
+
+        self.order.status = Order.OrderStatus.CONFIRMED
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+
+        for user in (self.customer, self.owner, self.driver):
+            self.assertEqual(self.list_statuses(user), [Order.OrderStatus.CONFIRMED])
+        self.assertEqual(cache_utils.get_user_orders_cache_version(self.other_customer.pk), other_version)
+
+    def test_transition_invalidates_lists_only_after_commit(self):
+        self.list_statuses(self.customer)
+        version = cache_utils.get_user_orders_cache_version(self.customer.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.transition_to(Order.OrderStatus.CONFIRMED, Order.Actor.RESTAURANT)
+            self.assertEqual(cache_utils.get_user_orders_cache_version(self.customer.pk), version)
+        self.assertEqual(self.list_statuses(self.customer), [Order.OrderStatus.CONFIRMED])
+
+    def test_filters_are_part_of_cache_key(self):
+        self.assertEqual(self.list_statuses(self.driver, status__in='DELIVERED'), [])
+        self.assertEqual(self.list_statuses(self.driver, status__in='PENDING'), [Order.OrderStatus.PENDING])
+
+
+class MenuQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="menu-queries@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Menu e madhe", phone_number="111", is_active=True, is_approved=True)
+        for c in range(10):
+            category = MenuCategory.objects.create(restaurant=self.restaurant, name=f"Kategoria {c}", display_order=c)
+            MenuItem.objects.bulk_create([
+                MenuItem(category=category, restaurant=self.restaurant, name=f"Artikulli {c}-{i:02d}", price="1.00", is_available=i != 0)
+                for i in range(20)
+            ])
+        self.url = reverse('restaurant-menu-categories-for-restaurant', kwargs={'pk': self.restaurant.pk})
+
+    def test_200_item_menu_is_served_in_constant_queries(self):
+        with self.assertNumQueries(3): # Restoranti, kategoritë, artikujt (një prefetch)
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data), 10)
+        first_category_items = response.data[0]['menu_items']
+        self.assertEqual(len(first_category_items), 19) # Vetëm artikujt e disponueshëm
+        self.assertEqual([item['name'] for item in first_category_items], sorted(item['name'] for item in first_category_items))
+        self.assertEqual(first_category_items[0]['category_name'], "Kategoria 0")
+
+    def test_menu_category_viewset_prefetches_items(self):
+        view = MenuCategoryViewSet.as_view({'get': 'list'})
+        request = APIRequestFactory().get('/')
+        with self.assertNumQueries(3): # COUNT i paginimit, kategoritë, artikujt
+            response = view(request, restaurant_pk=self.restaurant.pk)
+            response.render()
+        self.assertEqual(response.data['count'], 10)
+
+        self.client.force_authenticate(user=self.owner) # Pronari sheh edhe artikujt jo të disponueshëm
+        category = self.restaurant.menu_categories.first()
+        response = self.client.get(reverse('restaurant-menucategory-detail', kwargs={'restaurant_pk': self.restaurant.pk, 'pk': category.pk}))
+        self.assertEqual(len(response.data['menu_items']), 20)
+
+
+class OrderQueryCountTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="oq-customer@test.com", password="password")
+        self.owner = User.objects.create_user(email="oq-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.driver = User.objects.create_user(email="oq-driver@test.com", password="password", role=User.Role.DRIVER, first_name="Shofer")
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Porosi", phone_number="111", is_active=True, is_approved=True)
+        self.orders = [
+            Order.objects.create(
+                customer=self.customer, restaurant=self.restaurant, driver=self.driver, order_total="10.00",
+                delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+            )
+            for _ in range(8)
+        ]
+        self.client.force_authenticate(user=self.owner)
+
+    def test_list_uses_one_projected_query(self):
+        with self.assertNumQueries(2): # COUNT i paginimit + faqja me join-et
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(response.data['count'], 8)
+        first = response.data['results'][0]
+        self.assertEqual((first['customer_email'], first['restaurant_name'], first['driver_name']), ("oq-customer@test.com", "Porosi", "Shofer"))
+
+    def test_detail_query_count_does_not_depend_on_items(self):
+        order = self.orders[0]
+        category = MenuCategory.objects.create(restaurant=self.restaurant, name="Pica")
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, item_name_at_purchase=f"Artikulli {i}", item_price_at_purchase="2.00", quantity=1,
+                menu_item=MenuItem.objects.create(category=category, restaurant=self.restaurant, name=f"Artikulli {i}", price="2.00"),
+            )
+            for i in range(5)
+        ])
+        url = reverse('order-detail', kwargs={'pk': order.pk})
+        with self.assertNumQueries(6): # Porosia me join-et + prefetch: artikujt, adresat (klient, shofer), kuzhinat + validatori
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['items']), 5)
+        self.assertEqual(response.data['items'][0]['menu_item_details']['category_name'], "Pica")
+        self.assertEqual(response.data['driver']['email'], "oq-driver@test.com")
+
+
+class OrderDetailConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="ocg-customer@test.com", password="password")
+        self.driver = User.objects.create_user(email="ocg-driver@test.com", password="password", role=User.Role.DRIVER)
+        DriverProfile.objects.create(user=self.driver)
+        owner = User.objects.create_user(email="ocg-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=owner, name="Validator", phone_number="111", is_active=True, is_approved=True)
+        self.order = Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, driver=self.driver, order_total="10.00",
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+        self.url = reverse('order-detail', kwargs={'pk': self.order.pk})
+
+    def assert_revalidates(self, change):
+        self.client.force_authenticate(user=self.customer)
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        change()
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_embedded_driver_and_restaurant_changes_invalidate_etag(self):
+        def toggle_availability():
+            self.driver.is_available_for_delivery = True
+            self.driver.save()
+        self.assertTrue(self.assert_revalidates(toggle_availability).data['driver']['is_available_for_delivery'])
+
+        def rename_restaurant():
+            self.restaurant.name = "Validator 2"
+            self.restaurant.save()
+        self.assertEqual(self.assert_revalidates(rename_restaurant).data['restaurant']['name'], "Validator 2")
+
+        def add_customer_address():
+            Address.objects.create(user=self.customer, street="Rruga 2", city="Prishtinë", postal_code="10000")
+        self.assertEqual(len(self.assert_revalidates(add_customer_address).data['customer']['addresses']), 1)
+
+    def test_driver_location_update_invalidates_etag(self):
+        def move_driver(): # Pozicioni vjen nga aplikacioni i shoferit
+            self.client.force_authenticate(user=self.driver)
+            response = self.client.patch(reverse('driverprofile-detail', kwargs={'pk': self.driver.pk}),
+                                         {'current_location_lat': 42.66, 'current_location_lon': 21.16}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = self.assert_revalidates(move_driver).data['driver']['driver_profile']
+        self.assertEqual((float(profile['current_location_lat']), float(profile['current_location_lon'])), (42.66, 21.16))
+
+
+class OrderCreateViewTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="oc-customer@test.com", password="password")
+        owner = User.objects.create_user(email="oc-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=owner, name="Checkout", phone_number="111", is_active=True, is_approved=True)
+        other = Restaurant.objects.create(owner=owner, name="Tjetri", phone_number="222", is_active=True, is_approved=True)
+        self.address = Address.objects.create(user=self.customer, street="Rruga 1", city="Prishtinë", postal_code="10000")
+        category = MenuCategory.objects.create(restaurant=self.restaurant, name="Pica")
+        self.items = MenuItem.objects.bulk_create([
+            MenuItem(category=category, restaurant=self.restaurant, name=f"Artikulli {i}", price="3.00")
+            for i in range(10)
+        ])
+        other_category = MenuCategory.objects.create(restaurant=other, name="Tjetër")
+        self.foreign_item = MenuItem.objects.create(category=other_category, restaurant=other, name="I huaj", price="1.00")
+        cart = Cart.objects.create(user=self.customer, restaurant=self.restaurant)
+        CartItem.objects.create(cart=cart, menu_item=self.items[0], quantity=1)
+        self.client.force_authenticate(user=self.customer)
+
+    def checkout(self, items):
+        return self.client.post(reverse('order-list'), {
+            'restaurant_id': self.restaurant.pk, 'delivery_address_id': self.address.pk, 'payment_method': 'CASH_ON_DELIVERY',
+            'items': [{'menu_item': item.pk, 'quantity': quantity} for item, quantity in items],
+        }, format='json')
+
+    def test_creates_order_items_and_clears_cart(self):
+        response = self.checkout([(self.items[0], 2), (self.items[1], 1)])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['sub_total'], "9.00")
+        self.assertEqual(response.data['order_total'], "11.00")
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(response.data['items'][0]['menu_item_details']['category_name'], "Pica")
+        self.assertIsNotNone(response.data['estimated_delivery_time']) # Pa histori: kohët default të eta.py
+        self.assertFalse(Cart.objects.filter(user=self.customer).exists())
+
+    def test_query_count_does_not_depend_on_line_items(self):
+        # Shporta e plotë fshihet me një numër të fiksuar query-sh, pa UPDATE për çdo artikull
+        CartItem.objects.bulk_create([CartItem(cart=self.customer.cart, menu_item=item, quantity=1) for item in self.items[1:]])
+        with self.assertNumQueries(16): # Përfshirë leximin e ETA-së (eta.estimate_delivery_time)
+            self.checkout([(self.items[0], 1)])
+        with self.assertNumQueries(13): # Pa shportë: mungojnë leximi i artikujve dhe dy DELETE-t
+            response = self.checkout([(item, 1) for item in self.items])
+        self.assertEqual(len(response.data['items']), 10)
+
+    def test_invalid_item_rolls_back_everything(self):
+        for items in ([(self.items[0], 1), (self.foreign_item, 1)], [(self.items[0], 0)], []):
+            response = self.checkout(items)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.items[1].is_available = False
+        self.items[1].save()
+        response = self.checkout([(self.items[0], 1), (self.items[1], 1)])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertTrue(Cart.objects.filter(user=self.customer).exists())
+
+
+class CartReadModelTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="cr-customer@test.com", password="password")
+        owner = User.objects.create_user(email="cr-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=owner, name="Shporta", phone_number="111", is_active=True, is_approved=True)
+        self.restaurant.cuisine_types.add(CuisineType.objects.create(name="Italiane"))
+        category = MenuCategory.objects.create(restaurant=self.restaurant, name="Pica")
+        self.items = MenuItem.objects.bulk_create([
+            MenuItem(category=category, restaurant=self.restaurant, name=f"Artikulli {i}", price="2.50")
+            for i in range(8)
+        ])
+        self.cart = Cart.objects.create(user=self.customer, restaurant=self.restaurant)
+        self.client.force_authenticate(user=self.customer)
+
+    def test_my_cart_query_count_does_not_depend_on_items(self):
+        url = reverse('cart-my-cart')
+        CartItem.objects.create(cart=self.cart, menu_item=self.items[0], quantity=1)
+        with self.assertNumQueries(5): # Shporta, ETag-u, pastaj shporta me restorantin + artikujt + kuzhinat
+            self.client.get(url)
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, menu_item=item, quantity=2) for item in self.items[1:]])
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['items']), 8)
+        self.assertEqual(response.data['total_amount'], "37.50")
+        self.assertEqual(response.data['items'][0]['menu_item_details']['category_name'], "Pica")
+        self.assertEqual(response.data['restaurant_details']['cuisine_types'][0]['name'], "Italiane")
+
+    def test_total_amount_without_prefetch_is_one_aggregate(self):
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, menu_item=item, quantity=3) for item in self.items[:4]])
+        cart = Cart.objects.get(pk=self.cart.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.total_amount, 30)
+
+    def test_clear_touches_cart_once(self):
+        CartItem.objects.bulk_create([CartItem(cart=self.cart, menu_item=item, quantity=1) for item in self.items])
+        with self.assertNumQueries(7): # Pa një UPDATE të Cart.updated_at për çdo artikull të fshirë
+            response = self.client.delete(reverse('cart-clear-cart'))
+        self.assertEqual(response.data['items'], [])
+        self.assertEqual(response.data['total_amount'], "0.00")
+
+
+class OrderTransitionViewTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="ot-customer@test.com", password="password")
+        self.owner = User.objects.create_user(email="ot-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.driver = User.objects.create_user(email="ot-driver@test.com", password="password", role=User.Role.DRIVER)
+        self.restaurant = Restaurant.objects.create(owner=self.owner, name="Tranzicion", phone_number="111", is_active=True, is_approved=True)
+        self.order = Order.objects.create(
+            customer=self.customer, restaurant=self.restaurant, order_total="10.00",
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+
+    def patch(self, user, name, data=None):
+        self.client.force_authenticate(user=user)
+        return self.client.patch(reverse(f'order-{name}', kwargs={'pk': self.order.pk}), data or {}, format='json')
+
+    def test_full_delivery_flow(self):
+        for new_status in ('CONFIRMED', 'PREPARING', 'READY_FOR_PICKUP'):
+            self.assertEqual(self.patch(self.owner, 'update-status-restaurant', {'status': new_status}).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.patch(self.driver, 'accept-delivery').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.patch(self.driver, 'update-status-driver', {'status': 'ON_THE_WAY'}).status_code, status.HTTP_200_OK)
+        response = self.patch(self.driver, 'update-status-driver', {'status': 'DELIVERED'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['payment_status'], Order.PaymentStatus.PAID)
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.driver, self.driver)
+        self.assertIsNotNone(self.order.actual_delivery_time)
+
+    def test_invalid_transition_is_rejected(self):
+        response = self.patch(self.owner, 'update-status-restaurant', {'status': 'READY_FOR_PICKUP'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_accept_delivery_rejects_order_with_driver(self):
+        Order.objects.filter(pk=self.order.pk).update(status=Order.OrderStatus.READY_FOR_PICKUP)
+        self.assertEqual(self.patch(self.driver, 'accept-delivery').status_code, status.HTTP_200_OK)
+        other_driver = User.objects.create_user(email="ot-driver2@test.com", password="password", role=User.Role.DRIVER)
+        response = self.patch(other_driver, 'accept-delivery')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("shofer", response.data['detail'])
+
+    def test_claim_next_takes_a_ready_order(self):
+        self.client.force_authenticate(user=self.driver)
+        self.assertEqual(self.client.post(reverse('order-claim-next')).status_code, status.HTTP_404_NOT_FOUND)
+        Order.objects.filter(pk=self.order.pk).update(status=Order.OrderStatus.READY_FOR_PICKUP)
+        response = self.client.post(reverse('order-claim-next'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.order.pk)
+        self.assertEqual(response.data['status'], Order.OrderStatus.CONFIRMED)
+
+
+class AvailableForDriverTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(email="af-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.customer = User.objects.create_user(email="af-customer@test.com", password="password")
+        self.driver = User.objects.create_user(email="af-driver@test.com", password="password", role=User.Role.DRIVER)
+        # Restorantet në 0, ~1.1 dhe ~5.6 km nga shoferi, plus një pa koordinata
+        self.orders = [self.ready_order(f"R{n}", lat, 21.16) for n, lat in enumerate((42.66, 42.67, 42.71, None))]
+        Order.objects.filter(pk=self.orders[1].pk).update(driver=self.driver) # Jo e lirë
+        dispatch_grid.rebuild()
+        self.client.force_authenticate(user=self.driver)
+
+    def ready_order(self, name, lat, lon):
+        address = Address.objects.create(
+            user=self.owner, street=name, city="Prishtinë", postal_code="10000",
+            latitude=lat, longitude=lon if lat is not None else None,
+        )
+        restaurant = Restaurant.objects.create(owner=self.owner, name=name, phone_number="111", address=address, is_active=True, is_approved=True)
+        return Order.objects.create(
+            customer=self.customer, restaurant=restaurant, order_total="10.00", status=Order.OrderStatus.READY_FOR_PICKUP,
+            delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+        )
+
+    def test_nearest_orders_first_then_unlocated(self):
+        response = self.client.get(reverse('order-available-for-driver'), {'lat': 42.66, 'lon': 21.16, 'k': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in response.data], [self.orders[0].pk, self.orders[2].pk, self.orders[3].pk])
+        self.assertEqual(response.data[0]['distance_km'], 0)
+        self.assertAlmostEqual(response.data[1]['distance_km'], 5.56, places=1)
+        self.assertIsNone(response.data[2]['distance_km'])
+
+        response = self.client.get(reverse('order-available-for-driver'), {'lat': 42.72, 'lon': 21.16, 'k': 1})
+        self.assertEqual([order['id'] for order in response.data], [self.orders[2].pk])
+
+    def test_without_location_returns_oldest(self):
+        response = self.client.get(reverse('order-available-for-driver'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([order['id'] for order in response.data], [self.orders[0].pk, self.orders[2].pk, self.orders[3].pk])
+
+    def test_invalid_parameters_and_non_drivers(self):
+        url = reverse('order-available-for-driver')
+        for params in ({'lat': 42.66}, {'lat': 'x', 'lon': 21.16}, {'lat': 91, 'lon': 0}, {'k': 0}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST, params)
+        self.client.force_authenticate(user=self.customer)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+
+@fresh_reads
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.clear_local_cache()
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email="ks-customer@test.com", password="password")
+        self.admin = User.objects.create_superuser(email="ks-admin@test.com", password="password", first_name="A", last_name="B")
+        owner = User.objects.create_user(email="ks-owner@test.com", password="password", role=User.Role.RESTAURANT_OWNER)
+        self.restaurant = Restaurant.objects.create(owner=owner, name="Keyset", phone_number="111", is_active=True, is_approved=True)
+        orders = [
+            Order.objects.create(
+                customer=self.customer, restaurant=self.restaurant, order_total="10.00",
+                delivery_address_street="Rruga 1", delivery_address_city="Prishtinë", delivery_address_postal_code="10000",
+            )
+            for _ in range(5)
+        ]
+        # Tre porosi me të njëjtin created_at: id-ja vendos renditjen
+        Order.objects.filter(pk__in=[o.pk for o in orders[1:4]]).update(created_at=orders[1].created_at)
+        self.expected_ids = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def test_walks_all_pages_forward_and_back(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('order-list'), {'pagination': 'keyset', 'page_size': 2})
+        self.assertNotIn('count', response.data)
+        pages = [[order['id'] for order in response.data['results']]]
+        self.assertIsNone(response.data['previous'])
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append([order['id'] for order in response.data['results']])
+        self.assertEqual([pk for page in pages for pk in page], self.expected_ids)
+
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([order['id'] for order in response.data['results']], pages[-2])
+
+    def test_page_number_stays_the_default_and_page_size_is_bounded(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('order-list'), {'page_size': 2})
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(len(response.data['results']), 2)
+        response = self.client.get(reverse('order-list'), {'pagination': 'keyset', 'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_invalid_cursor_is_not_found(self):
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.get(reverse('order-list'), {'cursor': 'nuk-eshte-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_restaurant_keyset_only_for_admin(self):
+        response = self.client.get(reverse('restaurant-list'), {'pagination': 'keyset'})
+        self.assertIn('count', response.data) # Lista publike mbetet me numër faqeje
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('restaurant-list'), {'pagination': 'keyset'})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(response.data['results'][0]['id'], self.restaurant.pk)
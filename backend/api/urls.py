@@ -23,7 +23,8 @@ from .views import (
     DriverProfileViewSet, # Shto DriverProfileViewSet
     LogoutAPIView, # Shto LogoutAPIView
     ReviewReplyViewSet, # Shto këtë
-    CartViewSet # SHTO IMPORTIN E CARTVIEWSET
+    CartViewSet, # SHTO IMPORTIN E CARTVIEWSET
+    CacheMetricsAPIView,
 )
 
 # Router kryesor
@@ -72,6 +73,9 @@ urlpatterns = [
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/me/', UserMeAPIView.as_view(), name='auth_me'),
     path('auth/logout/', LogoutAPIView.as_view(), name='auth_logout'),
+
+    # Metrikat e cache-it (vetëm admin)
+    path('admin/cache-metrics/', CacheMetricsAPIView.as_view(), name='admin_cache_metrics'),
     
     # API endpoints të menaxhuara nga router-i kryesor dhe ato nested
     path('', include(router.urls)),
@@ -1,10 +1,16 @@
 # backend/api/views.py
+import time
+from datetime import datetime
+
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.utils import timezone 
 from django.utils.decorators import method_decorator 
 from django.core.cache import cache # Importo cache direkt
 from . import cache_utils # Importo modulin tonë ndihmës
+from . import cache_metrics
+from . import dispatch_grid
 
 from rest_framework import generics, permissions, viewsets, status
 from rest_framework.decorators import action
@@ -17,6 +23,7 @@ from rest_framework_simplejwt.tokens import RefreshToken, TokenError
 from .models import (
     User, Address, CuisineType, Restaurant, OperatingHours, 
     MenuCategory, MenuItem, Order, OrderItem, Review, DriverProfile,
+    OrderTransitionError, OrderTransitionConflict,
     ReviewReply, PageViewLog,
     Cart, CartItem # SHTO MODELET E SHPORTËS
 )
@@ -37,7 +44,10 @@ from .permissions import (
     IsOwnerOrAdminOrReadOnly,
     IsDriverPermission, IsDriverOfOrderPermission # Ensure IsRestaurantOwnerOrAdmin, IsCustomer, IsDriverPermission, IsDriverOfOrderPermission are here
 )
-from django.db.models import Count, Sum, F, ExpressionWrapper, fields # SHTO F, ExpressionWrapper, fields
+from .pagination import SelectablePagination
+from .conditional import build_etag, not_modified_response, set_validators
+from .db_routing import use_primary
+from django.db.models import Count, Sum, Max, F, Q, Prefetch, ExpressionWrapper, fields # SHTO F, ExpressionWrapper, fields
 
 User = get_user_model()
 
@@ -136,7 +146,7 @@ class UserViewSet(viewsets.ModelViewSet):
     Për create dhe update përdoret UserAdminManagementSerializer.
     Për list dhe retrieve përdoret UserDetailSerializer.
     """
-    queryset = User.objects.all().order_by('-date_joined')
+    queryset = User.objects.all().select_related('driver_profile').prefetch_related('addresses').order_by('-date_joined') # UserDetailSerializer
     # serializer_class = UserAdminManagementSerializer # Hiq këtë, përdor get_serializer_class
     permission_classes = [permissions.IsAdminUser]
 
@@ -223,18 +233,30 @@ class CuisineTypeViewSet(viewsets.ModelViewSet):
     # @method_decorator(cache_page(60 * 15)) # Hiq këtë
     def list(self, request, *args, **kwargs):
         cache_key = cache_utils.get_cuisine_types_list_cache_key()
-        cached_data = cache.get(cache_key)
+        etag = build_etag(cache_key)
+        not_modified = not_modified_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        def build_data():
+            queryset = self.filter_queryset(self.get_queryset())
+            serializer = self.get_serializer(queryset, many=True)
+            return serializer.data
+
+        # Vetëm një kërkesë e mbush cache-in pas një invalidimi; të tjerat marrin listën e mëparshme
+        response_data = cache_utils.get_or_compute(
+            cache_key, build_data, timeout=cache_utils.CUISINE_TYPES_LIST_CACHE_TTL,
+            stale_key=cache_utils.CUISINE_TYPES_LIST_STALE_KEY, namespace=cache_utils.NS_CUISINE_TYPES_LIST,
+        )
+        return set_validators(Response(response_data), etag=etag)
 
-        if cached_data:
-            print(f"Cache HIT for CuisineTypes: {cache_key}")
-            return Response(cached_data)
-        
-        print(f"Cache MISS for CuisineTypes: {cache_key}")
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        response_data = serializer.data
-        cache.set(cache_key, response_data, timeout=60 * 15) # Cache për 15 minuta
-        return Response(response_data)
+    def retrieve(self, request, *args, **kwargs):
+        # Çdo ndryshim i një lloji kuzhine rrit versionin e listës, prandaj mjafton si validator
+        etag = build_etag(cache_utils.get_cuisine_types_list_cache_key(), kwargs.get('pk'))
+        not_modified = not_modified_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        return set_validators(super().retrieve(request, *args, **kwargs), etag=etag)
 
 
 class RestaurantViewSet(viewsets.ModelViewSet):
@@ -244,7 +266,8 @@ class RestaurantViewSet(viewsets.ModelViewSet):
     - Pronarët e restoranteve mund të menaxhojnë restorantet e tyre.
     - Adminët mund të menaxhojnë të gjitha restorantet dhe të aprovojnë restorantet e reja.
     """
-    queryset = Restaurant.objects.all().select_related('owner', 'address').prefetch_related('cuisine_types', 'operating_hours')
+    queryset = Restaurant.objects.all().select_related('owner', 'address__user').prefetch_related('cuisine_types', 'operating_hours') # address__user: Address.__str__
+    pagination_class = SelectablePagination
 
     def get_serializer_class(self):
         if self.action == 'list':
@@ -277,11 +300,26 @@ class RestaurantViewSet(viewsets.ModelViewSet):
                 return queryset.order_by('-is_approved', 'is_active', '-created_at')
 
             if user.role == User.Role.RESTAURANT_OWNER:
+                if self.action == 'retrieve': # Detajet: restorantet e veta dhe ato publike të të tjerëve
+                    return queryset.filter(Q(owner=user) | Q(is_active=True, is_approved=True))
                 # Pronari sheh restorantet e veta
                 return queryset.filter(owner=user).order_by('-created_at')
         
         # Përdoruesit e tjerë (klientë, anonimë) shohin vetëm aktivët dhe të aprovuarit
-        return queryset.filter(is_active=True, is_approved=True).order_by('name')
+        queryset = queryset.filter(is_active=True, is_approved=True)
+
+        # Filtrat publikë (duhet të jenë edhe te cache_utils.RESTAURANTS_LIST_PUBLIC_QUERY_PARAMS)
+        name_filter = self.request.query_params.get('name__icontains')
+        cuisine_type_filter = self.request.query_params.get('cuisine_type_id')
+        price_range_filter = self.request.query_params.get('price_range')
+        if name_filter:
+            queryset = queryset.filter(name__icontains=name_filter.strip())
+        if cuisine_type_filter and cuisine_type_filter.strip().isdigit():
+            queryset = queryset.filter(cuisine_types__id=cuisine_type_filter.strip())
+        if price_range_filter:
+            queryset = queryset.filter(price_range=price_range_filter.strip())
+
+        return queryset.order_by('name')
 
     def get_permissions(self):
         # 'log_page_view' duhet të jetë një action i definuar në këtë ViewSet
@@ -300,72 +338,150 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         # Për veprimet e tjera si update, partial_update, destroy, toggle_active_status, etj.
         return [permissions.IsAuthenticated(), IsRestaurantOwnerOrAdmin()]
 
-    # @method_decorator(cache_page(60 * 15)) # Hiq këtë
-    def list(self, request, *args, **kwargs):
-        # ----- FILLIMI I KODIT TE CACHE PER TA KOMENTUAR PERKOHESISHT -----
-        # user = request.user
-        # is_public_view_eligible_for_cache = not user.is_authenticated or user.role == User.Role.CUSTOMER
-
-        # cache_key = None
-        # if is_public_view_eligible_for_cache: 
-        #     cache_key = cache_utils.get_restaurants_list_public_cache_key(request)
-        #     cached_response_data = cache.get(cache_key)
-        #     if cached_response_data:
-        #         print(f"Cache HIT for Restaurants (public): {cache_key}")
-        #         return Response(cached_response_data)
-        #     print(f"Cache MISS for Restaurants (public): {cache_key}")
-        # ----- FUNDI I KODIT TE CACHE PER TA KOMENTUAR PERKOHESISHT -----
+    def allows_keyset_pagination(self):
+        # Keyset vetëm për listën e adminit; lista publike renditet sipas emrit dhe ruhet në cache sipas faqes
+        return self.request.user.is_staff
+
+    def uses_public_list(self, user):
+        """Klientët, shoferët dhe anonimët shohin të njëjtën listë publike, prandaj ajo mund të ruhet në cache."""
+        if not user.is_authenticated:
+            return True
+        return not user.is_staff and user.role != User.Role.RESTAURANT_OWNER
 
+    def build_list_data(self):
         queryset = self.filter_queryset(self.get_queryset())
 
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            response = self.get_paginated_response(serializer.data)
-            # ----- FILLIMI I KODIT TE CACHE PER TA KOMENTUAR PERKOHESISHT -----
-            # if is_public_view_eligible_for_cache and cache_key:
-            #     cache.set(cache_key, response.data, timeout=cache_utils.RESTAURANT_LIST_CACHE_TTL) 
-            # ----- FUNDI I KODIT TE CACHE PER TA KOMENTUAR PERKOHESISHT -----
-            return response
+            return self.get_paginated_response(serializer.data).data
 
         serializer = self.get_serializer(queryset, many=True)
-        # ----- FILLIMI I KODIT TE CACHE PER TA KOMENTUAR PERKOHESISHT -----
-        # response_data = serializer.data
-        # if is_public_view_eligible_for_cache: 
-        #     all_items_cache_key = cache_utils.get_restaurants_list_public_all_items_cache_key()
-        #     cached_all_items = cache.get(all_items_cache_key)
-        #     if cached_all_items:
-        #         print(f"Cache HIT for Restaurants (public, all items): {all_items_cache_key}")
-        #         return Response(cached_all_items)
-            
-        #     print(f"Cache MISS for Restaurants (public, all items): {all_items_cache_key}")
-        #     cache.set(all_items_cache_key, response_data, timeout=cache_utils.RESTAURANT_LIST_CACHE_TTL)
-        # ----- FUNDI I KODIT TE CACHE PER TA KOMENTUAR PERKOHESISHT -----
-        return Response(serializer.data) # Sigurohu që kjo kthen serializer.data direkt
+        return serializer.data
+
+    def list(self, request, *args, **kwargs):
+        if not self.uses_public_list(request.user):
+            return Response(self.build_list_data())
+
+        cache_key = cache_utils.get_restaurants_list_public_cache_key(request)
+        etag = build_etag(cache_key)
+        not_modified = not_modified_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        # Vetëm një kërkesë e mbush cache-in pas një invalidimi; të tjerat marrin faqen e mëparshme
+        response_data = cache_utils.get_or_compute(
+            cache_key, self.build_list_data, timeout=cache_utils.RESTAURANT_LIST_CACHE_TTL,
+            stale_key=cache_utils.get_restaurants_list_public_stale_key(request),
+            namespace=cache_utils.NS_RESTAURANTS_LIST_PUBLIC,
+        )
+        return set_validators(Response(response_data), etag=etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Detajet e restorantit ruhen në cache për çdo restorant, në dy variante:
+        'private' për adminin dhe pronarin, 'public' (pa të dhënat e pronarit) për të tjerët.
+        """
+        user = request.user
+        restaurant_id = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if not restaurant_id.isdigit(): # Mos krijo çelësa cache nga input arbitrar
+            return super().retrieve(request, *args, **kwargs)
+        if not user.is_authenticated:
+            variants = (cache_utils.RESTAURANT_DETAIL_VARIANT_PUBLIC,)
+        elif user.is_staff:
+            variants = (cache_utils.RESTAURANT_DETAIL_VARIANT_PRIVATE,)
+        elif user.role == User.Role.RESTAURANT_OWNER:
+            # Pronari: varianti privat nëse restoranti është i tiji, përndryshe ai publik
+            variants = (cache_utils.RESTAURANT_DETAIL_VARIANT_PRIVATE, cache_utils.RESTAURANT_DETAIL_VARIANT_PUBLIC)
+        else:
+            variants = (cache_utils.RESTAURANT_DETAIL_VARIANT_PUBLIC,)
+
+        for variant in variants:
+            cache_key = cache_utils.get_restaurant_detail_cache_key(restaurant_id, variant)
+            cached = cache_utils.get_cached(cache_key)
+            if cached is None:
+                continue
+            is_own = user.is_authenticated and cached['owner_id'] == user.pk
+            # Privati vetëm për pronarin e këtij restoranti (ose adminin), publiku vetëm për të tjerët
+            if user.is_staff or is_own == (variant == cache_utils.RESTAURANT_DETAIL_VARIANT_PRIVATE):
+                cache_metrics.record_hit(cache_utils.NS_RESTAURANT_DETAIL)
+                etag = build_etag(cache_key)
+                not_modified = not_modified_response(request, etag=etag)
+                if not_modified is not None:
+                    return not_modified
+                return set_validators(Response(cached['data']), etag=etag)
+        cache_metrics.record_miss(cache_utils.NS_RESTAURANT_DETAIL)
+
+        started = time.monotonic()
+        with use_primary(): # Mbushja e cache-it lexon nga primarja (shih db_routing)
+            instance = self.get_object()
+            data = self.get_serializer(instance).data
+        # Varianti vendoset pas get_object(): privat vetëm për adminin dhe pronarin e këtij restoranti
+        if user.is_authenticated and (user.is_staff or instance.owner_id == user.pk):
+            variant = cache_utils.RESTAURANT_DETAIL_VARIANT_PRIVATE
+        else:
+            variant = cache_utils.RESTAURANT_DETAIL_VARIANT_PUBLIC
+            for field in cache_utils.RESTAURANT_DETAIL_PRIVATE_FIELDS:
+                data.pop(field, None)
+        cache_metrics.record_fill(cache_utils.NS_RESTAURANT_DETAIL, time.monotonic() - started)
+        cache_key = cache_utils.get_restaurant_detail_cache_key(restaurant_id, variant)
+        cache_utils.set_cached(cache_key, {'owner_id': instance.owner_id, 'data': data}, timeout=cache_utils.RESTAURANT_DETAIL_CACHE_TTL)
+        return set_validators(Response(data), etag=build_etag(cache_key))
 
     def perform_create(self, serializer):
         # RestaurantDetailSerializer.create e trajton logjikën e caktimit të owner-it
         # dhe statuset fillestare (is_approved, is_active) bazuar në rolin e userit.
         # Ai përdor self.context['request'].user.
-        serializer.save()
-        # Invalido cache pas krijimit të një restoranti të ri
-        cache_utils.increment_restaurants_list_public_cache_version()
+        serializer.save() # Cache-i invalidohet nga sinjalet (shih cache_utils.INVALIDATION_REGISTRY)
 
 
+    def get_cached_menu_response(self, request, pk, kind, build_data):
+        """
+        Kthen menunë e serializuar të restorantit nga cache-i (nën versionin e menusë),
+        ose e ndërton me `build_data(restaurant)` dhe e ruan.
+        """
+        if not str(pk).isdigit():
+            raise Http404
+        cache_key = cache_utils.get_restaurant_menu_cache_key(pk, kind)
+        etag = build_etag(cache_key)
+        cached_data = cache_utils.get_cached(cache_key, namespace=cache_utils.NS_RESTAURANT_MENU)
+        if cached_data is not None:
+            # Një hit i cache-it garanton që restoranti është ende publik (shih cache_utils)
+            not_modified = not_modified_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+            return set_validators(Response(cached_data), etag=etag)
+
+        started = time.monotonic()
+        with use_primary(): # Mbushja e cache-it lexon nga primarja (shih db_routing)
+            restaurant = get_object_or_404(Restaurant, pk=pk, is_active=True, is_approved=True) # Vetëm nga restorantet publike
+            data = build_data(restaurant)
+        cache_metrics.record_fill(cache_utils.NS_RESTAURANT_MENU, time.monotonic() - started)
+        cache_utils.set_cached(cache_key, data, timeout=cache_utils.RESTAURANT_MENU_CACHE_TTL)
+        return set_validators(Response(data), etag=etag)
+
     @action(detail=True, methods=['get'], url_path='menu-items', permission_classes=[permissions.AllowAny])
     def menu_items_for_restaurant(self, request, pk=None):
-        restaurant = get_object_or_404(Restaurant, pk=pk, is_active=True, is_approved=True) # Vetëm nga restorantet publike
-        items = MenuItem.objects.filter(restaurant=restaurant, is_available=True).order_by('category__display_order', 'name')
-        serializer = MenuItemSerializer(items, many=True, context={'request': request})
-        return Response(serializer.data)
+        def build_data(restaurant):
+            items = (
+                MenuItem.objects.filter(restaurant=restaurant, is_available=True)
+                .select_related('category') # category_name
+                .order_by('category__display_order', 'name')
+            )
+            return MenuItemSerializer(items, many=True, context={'request': request}).data
+        return self.get_cached_menu_response(request, pk, cache_utils.RESTAURANT_MENU_ITEMS, build_data)
 
     @action(detail=True, methods=['get'], url_path='menu-categories', permission_classes=[permissions.AllowAny])
     def menu_categories_for_restaurant(self, request, pk=None):
-        restaurant = get_object_or_404(Restaurant, pk=pk, is_active=True, is_approved=True)
-        categories = MenuCategory.objects.filter(restaurant=restaurant).order_by('display_order', 'name')
-        # Përdor MenuCategorySerializer që i ka menu_items nested
-        serializer = MenuCategorySerializer(categories, many=True, context={'request': request})
-        return Response(serializer.data)
+        def build_data(restaurant):
+            categories = (
+                MenuCategory.objects.filter(restaurant=restaurant)
+                .prefetch_related(menu_items_prefetch(available_only=True))
+                .order_by('display_order', 'name')
+            )
+            # Përdor MenuCategorySerializer që i ka menu_items nested
+            return MenuCategorySerializer(categories, many=True, context={'request': request}).data
+        return self.get_cached_menu_response(request, pk, cache_utils.RESTAURANT_MENU_CATEGORIES, build_data)
     
     @action(detail=True, methods=['patch'], url_path='approve', permission_classes=[permissions.IsAdminUser]) 
     def approve_restaurant(self, request, pk=None):
@@ -383,10 +499,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         if make_active: # Bëje aktiv vetëm nëse kërkohet dhe është aprovuar
             restaurant.is_active = True 
         
-        restaurant.save()
-        # Invalido cache
-        cache_utils.increment_restaurants_list_public_cache_version()
-        cache_utils.invalidate_restaurant_detail_cache(restaurant.id)
+        restaurant.save() # Sinjali post_save invalidon listën publike dhe detajet e restorantit
         return Response(RestaurantDetailSerializer(restaurant, context={'request': request}).data)
         
     @action(detail=True, methods=['patch'], url_path='toggle-active', permission_classes=[IsRestaurantOwnerOrAdmin])
@@ -409,10 +522,7 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Restoranti duhet të aprovohet nga administratori para se të mund të aktivizohet."}, status=status.HTTP_400_BAD_REQUEST)
 
         restaurant.is_active = new_is_active
-        restaurant.save()
-        # Invalido cache
-        cache_utils.increment_restaurants_list_public_cache_version()
-        cache_utils.invalidate_restaurant_detail_cache(restaurant.id)
+        restaurant.save() # Sinjali post_save invalidon listën publike dhe detajet e restorantit
         return Response(RestaurantDetailSerializer(restaurant, context={'request': request}).data)
 
     def perform_destroy(self, instance):
@@ -422,37 +532,13 @@ class RestaurantViewSet(viewsets.ModelViewSet):
             # por si një shtresë shtesë sigurie.
             raise permissions.PermissionDenied("Vetëm administratorët mund të fshijnë restorante.")
         
-        restaurant_id_for_cache = instance.id # Merr ID para fshirjes
-        super().perform_destroy(instance)
-        
-        # Invalido cache
-        cache_utils.increment_restaurants_list_public_cache_version()
-        cache_utils.invalidate_restaurant_detail_cache(restaurant_id_for_cache)
+        super().perform_destroy(instance) # Sinjali post_delete invalidon listën publike dhe detajet e restorantit
 
     @action(detail=True, methods=['post'], url_path='log-view', permission_classes=[permissions.AllowAny])
     def log_page_view(self, request, pk=None):
-        restaurant = get_object_or_404(Restaurant, pk=pk, is_active=True, is_approved=True)
-        
-        # Përdoruesi (mund të jetë anonim)
-        user = request.user if request.user.is_authenticated else None
-        
-        # IP Adresa
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip_address = x_forwarded_for.split(',')[0]
-        else:
-            ip_address = request.META.get('REMOTE_ADDR')
-            
-        # User Agent
-        user_agent = request.META.get('HTTP_USER_AGENT', '')
-
-        # Krijo log entry
-        PageViewLog.objects.create(
-            restaurant=restaurant,
-            user=user,
-            ip_address=ip_address,
-            user_agent=user_agent
-        )
+        restaurant = get_object_or_404(Restaurant.objects.only('pk'), pk=pk, is_active=True, is_approved=True)
+        # PageViewLog ruan vetëm restorantin dhe kohën (user/IP janë ende të komentuara te modeli)
+        PageViewLog.objects.create(restaurant=restaurant)
         return Response({"message": "Page view logged successfully."}, status=status.HTTP_201_CREATED)
 
 
@@ -492,6 +578,17 @@ class OperatingHoursViewSet(viewsets.ModelViewSet):
             
         serializer.save(restaurant=restaurant)
 
+def menu_items_prefetch(available_only):
+    """
+    Prefetch i artikujve të kategorive në rendin e menusë: një query e vetme për të gjitha kategoritë.
+    Prefetch-i vendos vetë `item.category`, kështu që category_name nuk kërkon query shtesë.
+    """
+    items = MenuItem.objects.order_by('name')
+    if available_only:
+        items = items.filter(is_available=True)
+    return Prefetch('menu_items', queryset=items)
+
+
 class MenuCategoryViewSet(viewsets.ModelViewSet):
     """
     Menaxhimi i Kategorive të Menusë për një restorant specifik (nested).
@@ -502,17 +599,56 @@ class MenuCategoryViewSet(viewsets.ModelViewSet):
     # Lejo pronarin e restorantit ose adminin të modifikojë, të tjerët lexojnë.
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsRestaurantOwnerOrAdmin]
 
+    def shows_unavailable_items(self):
+        """Admini dhe pronari e menaxhojnë menunë, prandaj shohin edhe artikujt jo të disponueshëm."""
+        if not hasattr(self, '_shows_unavailable_items'): # Thirret edhe nga ETag-u edhe nga queryset-i
+            user = self.request.user
+            restaurant_pk = self.kwargs.get('restaurant_pk')
+            self._shows_unavailable_items = user.is_authenticated and (
+                user.is_staff
+                or (user.role == User.Role.RESTAURANT_OWNER
+                    and (not restaurant_pk or Restaurant.objects.filter(pk=restaurant_pk, owner=user).exists()))
+            )
+        return self._shows_unavailable_items
+
     def get_queryset(self):
         restaurant_pk = self.kwargs.get('restaurant_pk') # Supozon nested route
         if restaurant_pk:
             # Leja IsRestaurantOwnerOrAdmin te has_permission duhet të verifikojë pronësinë e restorantit
-            return MenuCategory.objects.filter(restaurant_id=restaurant_pk).order_by('display_order', 'name')
+            queryset = MenuCategory.objects.filter(restaurant_id=restaurant_pk).order_by('display_order', 'name')
         # Nëse nuk është nested route, admini mund të shohë të gjitha, ose filtro sipas restoranteve të userit
         elif self.request.user.is_staff:
-            return MenuCategory.objects.all().order_by('restaurant__name', 'display_order')
+            queryset = MenuCategory.objects.all().order_by('restaurant__name', 'display_order')
         elif self.request.user.is_authenticated and self.request.user.role == User.Role.RESTAURANT_OWNER:
-             return MenuCategory.objects.filter(restaurant__owner=self.request.user).order_by('restaurant__name', 'display_order')
-        return MenuCategory.objects.none()
+            queryset = MenuCategory.objects.filter(restaurant__owner=self.request.user).order_by('restaurant__name', 'display_order')
+        else:
+            return MenuCategory.objects.none()
+        if self.request.method in permissions.SAFE_METHODS:
+            queryset = queryset.prefetch_related(menu_items_prefetch(available_only=not self.shows_unavailable_items()))
+        return queryset
+
+    def get_menu_etag(self, request, *parts):
+        # Kategoritë dhe artikujt e tyre ndryshojnë vetëm bashkë me versionin e menusë së restorantit
+        restaurant_pk = self.kwargs.get('restaurant_pk')
+        if not restaurant_pk or not str(restaurant_pk).isdigit():
+            return None
+        version = cache_utils.get_restaurant_menu_cache_version(restaurant_pk)
+        variant = 'all' if self.shows_unavailable_items() else 'available'
+        return build_etag('menu_categories', restaurant_pk, version, variant, request.query_params.urlencode(), *parts)
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_menu_etag(request)
+        not_modified = not_modified_response(request, etag=etag) if etag else None
+        if not_modified is not None:
+            return not_modified
+        return set_validators(super().list(request, *args, **kwargs), etag=etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_menu_etag(request, kwargs.get('pk'))
+        not_modified = not_modified_response(request, etag=etag) if etag else None
+        if not_modified is not None:
+            return not_modified
+        return set_validators(super().retrieve(request, *args, **kwargs), etag=etag)
 
     def perform_create(self, serializer):
         restaurant_pk = self.kwargs.get('restaurant_pk')
@@ -529,7 +665,7 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         category_pk = self.kwargs.get('category_pk') # Opsionale, nëse do të filtrosh edhe sipas kategorisë
 
         if restaurant_pk:
-            qs = MenuItem.objects.filter(restaurant_id=restaurant_pk)
+            qs = MenuItem.objects.filter(restaurant_id=restaurant_pk).select_related('category') # category_name
             if category_pk:
                 qs = qs.filter(category_id=category_pk)
             return qs.order_by('category__display_order', 'name')
@@ -570,12 +706,38 @@ class CartViewSet(viewsets.GenericViewSet): # Përdorim GenericViewSet për më
         cart, created = Cart.objects.get_or_create(user=request.user)
         return cart
 
+    def cart_read_queryset(self):
+        """
+        Shporta me gjithçka që lexon CartSerializer: artikujt me menu_item dhe kategorinë,
+        restoranti me adresën dhe kuzhinat. Tre query, pavarësisht numrit të artikujve.
+        """
+        return Cart.objects.select_related('restaurant__address__user').prefetch_related( # address__user: Address.__str__
+            Prefetch('items', queryset=CartItem.objects.select_related('menu_item__category')),
+            'restaurant__cuisine_types',
+        )
+
+    def cart_response(self, cart):
+        """Rilexon shportën me cart_read_queryset dhe e kthen të serializuar (përdoret nga çdo action)."""
+        cart = self.cart_read_queryset().get(pk=cart.pk)
+        return Response(CartSerializer(cart, context=self.get_serializer_context()).data, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='my-cart')
     def my_cart(self, request):
         """Kthen shportën aktuale të përdoruesit."""
         cart = self.get_cart_object(request)
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data)
+        # Cart.updated_at prek edhe ndryshimet e artikujve (shih signals.py); çmimet dhe
+        # restoranti kanë updated_at të tyre, që merren me një query të vetme.
+        changes = Cart.objects.filter(pk=cart.pk).aggregate(
+            menu_items_updated_at=Max('items__menu_item__updated_at'),
+            restaurant_updated_at=Max('restaurant__updated_at'),
+        )
+        last_modified = max(filter(None, [cart.updated_at, *changes.values()]))
+        etag = build_etag('cart', cart.pk, *(value.isoformat() if value else '' for value in [cart.updated_at, *changes.values()]))
+        not_modified = not_modified_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        return set_validators(self.cart_response(cart), etag=etag, last_modified=last_modified)
 
     @action(detail=False, methods=['post'], url_path='add-item')
     def add_item(self, request):
@@ -595,15 +757,15 @@ class CartViewSet(viewsets.GenericViewSet): # Përdorim GenericViewSet për më
             return Response({"detail": "Artikulli i menusë nuk u gjet ose nuk është i disponueshëm."}, status=status.HTTP_404_NOT_FOUND)
 
         # Kontrollo nëse shporta është bosh ose nëse artikulli i ri është nga i njëjti restorant
-        if cart.restaurant and cart.restaurant != menu_item.restaurant:
+        if cart.restaurant_id and cart.restaurant_id != menu_item.restaurant_id:
             return Response({
                 "detail": "Nuk mund të shtoni artikuj nga restorante të ndryshme në të njëjtën shportë. Ju lutem pastroni shportën aktuale ose përfundoni porosinë para se të shtoni nga një restorant tjetër.",
-                "current_cart_restaurant_id": cart.restaurant.id,
-                "new_item_restaurant_id": menu_item.restaurant.id
+                "current_cart_restaurant_id": cart.restaurant_id,
+                "new_item_restaurant_id": menu_item.restaurant_id
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        if not cart.restaurant: # Nëse shporta ishte bosh, cakto restorantin
-            cart.restaurant = menu_item.restaurant
+        if not cart.restaurant_id: # Nëse shporta ishte bosh, cakto restorantin
+            cart.restaurant_id = menu_item.restaurant_id
             cart.save()
 
         cart_item, created = CartItem.objects.get_or_create(
@@ -616,8 +778,7 @@ class CartViewSet(viewsets.GenericViewSet): # Përdorim GenericViewSet për më
             cart_item.quantity += quantity
             cart_item.save()
         
-        serializer = self.get_serializer(cart) # Kthe shportën e përditësuar
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.cart_response(cart) # Kthe shportën e përditësuar
 
     @action(detail=False, methods=['patch'], url_path='items/(?P<item_pk>[^/.]+)/update-quantity', serializer_class=CartItemSerializer) 
     def update_item_quantity(self, request, item_pk=None): 
@@ -642,8 +803,8 @@ class CartViewSet(viewsets.GenericViewSet): # Përdorim GenericViewSet për më
         cart_item.quantity = quantity
         cart_item.save()
         
-        cart_serializer = self.get_serializer(cart) # Kthe shportën e plotë
-        return Response(cart_serializer.data)
+        # serializer_class i këtij action-i është CartItemSerializer, por kthehet shporta e plotë
+        return self.cart_response(cart)
 
     @action(detail=False, methods=['delete'], url_path='items/(?P<item_pk>[^/.]+)/remove') 
     def remove_item(self, request, item_pk=None):
@@ -660,8 +821,7 @@ class CartViewSet(viewsets.GenericViewSet): # Përdorim GenericViewSet për më
         except CartItem.DoesNotExist:
             return Response({"detail": "Artikulli nuk u gjet në shportë."}, status=status.HTTP_404_NOT_FOUND)
         
-        serializer = self.get_serializer(cart) # Kthe shportën e plotë
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.cart_response(cart) # Kthe shportën e plotë
 
     @action(detail=False, methods=['delete'], url_path='clear')
     def clear_cart(self, request):
@@ -670,60 +830,77 @@ class CartViewSet(viewsets.GenericViewSet): # Përdorim GenericViewSet për më
         cart.items.all().delete()
         cart.restaurant = None # Pastro restorantin
         cart.save()
-        serializer = self.get_serializer(cart)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.cart_response(cart)
 
 # === FUNDI I VIEWSET PËR SHPORTËN ===
 
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().select_related(
-        'customer', 'restaurant', 'driver'
-    ).prefetch_related(
-        'items__menu_item' # Për të optimizuar query-n kur merren artikujt
+    # Queryset-i bazë që ndajnë të gjitha rolet te get_queryset
+    queryset = Order.objects.all().select_related('customer', 'restaurant', 'driver')
+    pagination_class = SelectablePagination # ?pagination=keyset për historikun e gjatë (pa OFFSET/COUNT)
+
+    # Vetëm kolonat që lexon OrderListSerializer (FK-të për join-et shtohen automatikisht)
+    LIST_ONLY_FIELDS = (
+        'id', 'order_total', 'status', 'payment_method', 'payment_status', 'created_at', 'estimated_delivery_time',
+        'customer__email', 'restaurant__name', 'driver__first_name', 'driver__last_name',
     )
 
+    AVAILABLE_FOR_DRIVER_DEFAULT = 10
+    AVAILABLE_FOR_DRIVER_MAX = 50
+
     def get_serializer_class(self):
         if self.action == 'list':
             return OrderListSerializer
         return OrderDetailSerializer
 
+    def get_base_queryset(self):
+        if self.action == 'list':
+            return self.queryset.only(*self.LIST_ONLY_FIELDS)
+        # OrderDetailSerializer: artikujt, klienti/shoferi me adresat dhe profilin, restoranti me adresën dhe kuzhinat
+        return self.queryset.select_related(
+            'restaurant__address__user', 'driver__driver_profile'
+        ).prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('menu_item__category')), # menu_item_details
+            'customer__addresses', 'driver__addresses', 'restaurant__cuisine_types',
+        )
+
     def get_queryset(self):
         user = self.request.user
         if not user.is_authenticated:
             return Order.objects.none()
 
+        queryset = self.get_base_queryset()
         if user.is_staff: # Admin sheh gjithçka
             # Mund të shtosh filtra nga query params këtu për adminin
             # p.sh., ?restaurant_id=X ose ?customer_id=Y
             restaurant_id_filter = self.request.query_params.get('restaurant_id')
             if restaurant_id_filter:
-                return Order.objects.filter(restaurant_id=restaurant_id_filter).order_by('-created_at')
-            return Order.objects.all().order_by('-created_at')
+                queryset = queryset.filter(restaurant_id=restaurant_id_filter)
+            return queryset.order_by('-created_at')
             
         elif user.role == User.Role.CUSTOMER:
-            return Order.objects.filter(customer=user).order_by('-created_at')
+            return queryset.filter(customer=user).order_by('-created_at')
             
         elif user.role == User.Role.RESTAURANT_OWNER:
             # Pronari sheh vetëm porositë për restorantet e tij
             # Nëse një pronar ka shumë restorante, mund të filtrosh sipas një ID specifike të restorantit
             # nga query params, por për fillim, le të shohë të gjitha të tijat.
             # Modifikoje këtë nëse RestaurantOwnerLayout në frontend dërgon gjithmonë ID-në e restorantit aktual.
+            queryset = queryset.filter(restaurant__owner=user)
             restaurant_id_filter = self.request.query_params.get('restaurant_id')
             if restaurant_id_filter:
-                 # Sigurohu që pronari ka akses te ky restorant
-                return Order.objects.filter(restaurant_id=restaurant_id_filter, restaurant__owner=user).order_by('-created_at')
-            
-            # Nëse nuk ka restaurant_id_filter, kthe porositë për të gjitha restorantet e pronarit
-            return Order.objects.filter(restaurant__owner=user).order_by('-created_at')
+                 # Filtri i pronarit më lart siguron që ai ka akses te ky restorant
+                queryset = queryset.filter(restaurant_id=restaurant_id_filter)
+            return queryset.order_by('-created_at')
             
         elif user.role == User.Role.DRIVER: # Ose User.Role.DELIVERY_PERSONNEL
             # Shoferi sheh porositë e tij aktive ose historikun (mund të filtrosh më tej)
+            queryset = queryset.filter(driver=user)
             status_filter = self.request.query_params.get('status__in')
             if status_filter:
-                statuses = status_filter.split(',')
-                return Order.objects.filter(driver=user, status__in=statuses).order_by('-created_at')
-            return Order.objects.filter(driver=user).order_by('-created_at')
+                queryset = queryset.filter(status__in=status_filter.split(','))
+            return queryset.order_by('-created_at')
             
         return Order.objects.none()
 
@@ -732,8 +909,9 @@ class OrderViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsCustomer()]
         # Për `update_status_restaurant`, leja vendoset te vetë action-i.
         # Për `update_status_driver`, leja vendoset te vetë action-i.
-        # Për `accept_delivery`, leja vendoset te vetë action-i.
-        # Për `available_for_driver`, leja vendoset te vetë action-i.
+        # Për `accept_delivery` dhe `claim_next`, leja vendoset te vetë action-i.
+        if self.action == 'available_for_driver': # GET: pa këtë do të binte te rasti SAFE_METHODS më poshtë
+            return super().get_permissions() # Leja vendoset te vetë action-i
         # Për `my_active_delivery`, leja vendoset te vetë action-i.
         if self.action == 'destroy': # Vetëm admini mund të fshijë porosi
             return [permissions.IsAdminUser()]
@@ -750,67 +928,85 @@ class OrderViewSet(viewsets.ModelViewSet):
              
         return super().get_permissions() # Fallback te lejet default të ViewSet-it (IsAuthenticated)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Dashboard-et e klientit, pronarit dhe shoferit e kërkojnë listën vazhdimisht, prandaj ajo
+        ruhet në cache për çdo përdorues, rol dhe filtra (shih cache_utils.get_user_orders_cache_key).
+        """
+        cache_key = cache_utils.get_user_orders_cache_key(request.user, request)
+        if cache_key is None:
+            return super().list(request, *args, **kwargs)
+        etag = build_etag(cache_key)
+        not_modified = not_modified_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        cached_data = cache_utils.get_cached(cache_key, namespace=cache_utils.NS_USER_ORDERS)
+        if cached_data is not None:
+            return set_validators(Response(cached_data), etag=etag)
+
+        started = time.monotonic()
+        response = super().list(request, *args, **kwargs)
+        cache_metrics.record_fill(cache_utils.NS_USER_ORDERS, time.monotonic() - started)
+        cache_utils.set_cached(cache_key, response.data, timeout=cache_utils.USER_ORDERS_CACHE_TTL)
+        return set_validators(response, etag=etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        order = self.get_object()
+        # OrderDetailSerializer përfshin klientin, shoferin (me profilin dhe pozicionin) dhe restorantin, që
+        # nuk prekin Order.updated_at: kohët e tyre merren me një query të vetme, si te my_cart.
+        # Numrat kapin fshirjet (p.sh. e një adrese), që nuk ndryshojnë maksimumin.
+        changes = Order.objects.filter(pk=order.pk).aggregate(
+            customer_updated_at=Max('customer__updated_at'),
+            customer_addresses_updated_at=Max('customer__addresses__updated_at'),
+            customer_addresses=Count('customer__addresses', distinct=True),
+            driver_updated_at=Max('driver__updated_at'),
+            driver_profile_updated_at=Max('driver__driver_profile__updated_at'),
+            driver_addresses_updated_at=Max('driver__addresses__updated_at'),
+            driver_addresses=Count('driver__addresses', distinct=True),
+            restaurant_updated_at=Max('restaurant__updated_at'),
+            restaurant_address_updated_at=Max('restaurant__address__updated_at'),
+            restaurant_cuisine_types=Count('restaurant__cuisine_types', distinct=True),
+        )
+        values = [order.updated_at, *changes.values()]
+        last_modified = max(value for value in values if isinstance(value, datetime))
+        etag = build_etag('order', order.pk, *(value.isoformat() if isinstance(value, datetime) else value for value in values))
+        not_modified = not_modified_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(order)
+        return set_validators(Response(serializer.data), etag=etag, last_modified=last_modified)
+
     def perform_create(self, serializer):
         # Logjika e krijimit të porosisë është te OrderDetailSerializer.create
         # Ai tashmë e merr customer-in nga request.user dhe pastron shportën.
         # Restoranti dhe adresa e dërgesës vijnë nga payload-i.
-        serializer.save() 
+        order = serializer.save()
+        # Përgjigja lexohet me queryset-in e detajeve, që artikujt dhe relacionet të mos ngarkohen një nga një
+        serializer.instance = self.get_base_queryset().get(pk=order.pk)
 
 
+    def transition_response(self, request, order, new_status, actor, **kwargs):
+        """Ekzekuton tranzicionin (shih Order.transition_to) dhe kthen porosinë ose gabimin përkatës."""
+        try:
+            order.transition_to(new_status, actor, **kwargs)
+        except OrderTransitionConflict as e:
+            return Response({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        except OrderTransitionError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # KËTU MUND TË SHTOSH DËRGIMIN E NJË SINJALI OSE NJË TASKU CELERY PËR TË NJOFGUAR KLIENTIN/SHOFERIN
+        return Response(OrderDetailSerializer(order, context={'request': request}).data)
+
     @action(detail=True, methods=['patch'], url_path='update-status-restaurant', 
             permission_classes=[permissions.IsAuthenticated, IsRestaurantOwnerOrAdmin])
     def update_status_restaurant(self, request, pk=None):
+        """
+        Restoranti kalon porosinë PENDING -> CONFIRMED -> PREPARING -> READY_FOR_PICKUP,
+        ose e anulon (CANCELLED_BY_RESTAURANT) para se të jetë gati. Shih Order.TRANSITIONS.
+        """
         order = self.get_object() # get_object do të përdorë queryset-in e viewset-it dhe lejet e objektit
-
-        # Sigurohu që useri që bën kërkesën është pronari i restorantit të kësaj porosie
-        # IsRestaurantOwnerOrAdmin e bën këtë te has_object_permission
-        # self.check_object_permissions(request, order) # Thërret has_object_permission eksplicitikisht
-
-        new_status = request.data.get('status')
-        
-        # Statuset që restoranti mund t'i vendosë
-        allowed_statuses_for_restaurant = [
-            Order.OrderStatus.CONFIRMED, 
-            Order.OrderStatus.PREPARING, 
-            Order.OrderStatus.READY_FOR_PICKUP, 
-            Order.OrderStatus.CANCELLED_BY_RESTAURANT
-        ]
-
-        # Logjika e tranzicionit të statusit (shembull bazik)
-        # Mund ta bësh më të sofistikuar me një state machine
-        current_status = order.status
-        valid_transition = False
-
-        if current_status == Order.OrderStatus.PENDING and new_status in [Order.OrderStatus.CONFIRMED, Order.OrderStatus.CANCELLED_BY_RESTAURANT]:
-            valid_transition = True
-        elif current_status == Order.OrderStatus.CONFIRMED and new_status in [Order.OrderStatus.PREPARING, Order.OrderStatus.CANCELLED_BY_RESTAURANT]:
-            valid_transition = True
-        elif current_status == Order.OrderStatus.PREPARING and new_status == Order.OrderStatus.READY_FOR_PICKUP:
-            valid_transition = True
-        # Lejo anulimin nga restoranti në disa faza të hershme
-        elif current_status in [Order.OrderStatus.PENDING, Order.OrderStatus.CONFIRMED, Order.OrderStatus.PREPARING] and new_status == Order.OrderStatus.CANCELLED_BY_RESTAURANT:
-             valid_transition = True
-        
-        # Mos lejo ndryshimin nëse porosia është marrë nga shoferi ose është finale
-        if current_status in [Order.OrderStatus.ON_THE_WAY, Order.OrderStatus.DELIVERED, Order.OrderStatus.FAILED_DELIVERY, Order.OrderStatus.CANCELLED_BY_USER]:
-            return Response({"detail": f"Statusi i porosisë nuk mund të ndryshohet nga restoranti pasi është '{order.get_status_display()}'."}, 
-                            status=status.HTTP_400_BAD_REQUEST)
-
-
-        if not valid_transition and new_status in allowed_statuses_for_restaurant:
-            # Nëse statusi i ri është i lejuar për restorantin, por nuk është tranzicion valid nga statusi aktual
-            # kthe një gabim më specifik
-             return Response({"detail": f"Nuk mund të kalohet nga statusi '{current_status}' direkt në '{new_status}' nga restoranti."}, status=status.HTTP_400_BAD_REQUEST)
-        elif new_status not in allowed_statuses_for_restaurant:
-            return Response({"detail": f"Statusi '{new_status}' nuk është valid ose nuk lejohet të vendoset nga restoranti."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        order.status = new_status
-        # Thirr metodën save të modelit Order për të përditësuar kohët e statusit
-        order.save() 
-        
-        # KËTU MUND TË SHTOSH DËRGIMIN E NJË SINJALI OSE NJË TASKU CELERY PËR TË NJOFGUAR KLIENTIN/SHOFERIN
-        
-        return Response(OrderDetailSerializer(order, context={'request': request}).data)
+        # IsRestaurantOwnerOrAdmin kontrollon te has_object_permission që useri është pronari i restorantit
+        return self.transition_response(request, order, request.data.get('status'), Order.Actor.RESTAURANT)
 
     @action(detail=True, methods=['patch'], url_path='accept-delivery', permission_classes=[permissions.IsAuthenticated, IsDriverPermission])
     def accept_delivery(self, request, pk=None):
@@ -819,33 +1015,35 @@ class OrderViewSet(viewsets.ModelViewSet):
         Shoferi nuk duhet të ketë një dërgesë tjetër aktive.
         Statusi i porosisë ndryshohet në 'CONFIRMED'.
         """
+        # Pranimi dhe kontrolli i dërgesës aktive bëhen në një transaksion (shih Order.claim_for_driver)
+        try:
+            order = Order.claim_for_driver(request.user, order_id=pk)
+        except OrderTransitionError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if order is not None:
+            return Response(OrderDetailSerializer(order, context={'request': request}).data)
+
+        # Claim-i dështoi: gjej arsyen vetëm tani, jashtë rrugës së suksesit
         order = get_object_or_404(Order, pk=pk)
-        user = request.user # Ky është shoferi potencial
-        
-        # if not user.is_available_for_delivery: # Kjo duhet të jetë pjesë e logjikës së shoferit, jo kusht për pranim
-        #     return Response({"detail": "Duhet të jeni online për të pranuar dërgesa."}, status=status.HTTP_400_BAD_REQUEST)
-            
-        if order.driver is not None: 
+        if order.driver_id is not None:
             return Response({"detail": "Kjo porosi tashmë ka një shofer të caktuar."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if order.status != Order.OrderStatus.READY_FOR_PICKUP: 
+        if order.status != Order.OrderStatus.READY_FOR_PICKUP:
             return Response({"detail": "Kjo porosi nuk është gati për dërgesë."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Kontrollo nëse shoferi ka tashmë një dërgesë aktive
-        active_statuses_for_driver = [Order.OrderStatus.CONFIRMED, Order.OrderStatus.ON_THE_WAY]
-        if Order.objects.filter(driver=user, status__in=active_statuses_for_driver).exists():
-            return Response({"detail": "Ju tashmë keni një dërgesë aktive."}, status=status.HTTP_400_BAD_REQUEST)
-            
-        order.driver = user
-        order.status = Order.OrderStatus.CONFIRMED # Kur shoferi pranon, statusi bëhet 'CONFIRMED' nga shoferi
-        order.save()
-
-        # Invalido cache
-        cache_utils.invalidate_cache_for_user_orders(order.customer)
-        if order.restaurant and order.restaurant.owner:
-            cache_utils.invalidate_cache_for_user_orders(order.restaurant.owner)
-        cache_utils.invalidate_cache_for_user_orders(request.user) # Shoferi
+        # E lirë por e bllokuar nga një shofer tjetër që po e merr në këtë moment
+        return Response({"detail": "Kjo porosi po merret nga një shofer tjetër."}, status=status.HTTP_409_CONFLICT)
 
+    @action(detail=False, methods=['post'], url_path='claim-next', permission_classes=[permissions.IsAuthenticated, IsDriverPermission])
+    def claim_next(self, request):
+        """
+        Shoferi merr porosinë më të vjetër 'READY_FOR_PICKUP' pa shofer, pa zgjedhur një ID.
+        Shoferët paralelë marrin porosi të ndryshme (SKIP LOCKED), jo 409 për të njëjtën.
+        """
+        try:
+            order = Order.claim_for_driver(request.user)
+        except OrderTransitionError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if order is None:
+            return Response({"detail": "Nuk ka porosi gati për dërgesë."}, status=status.HTTP_404_NOT_FOUND)
         return Response(OrderDetailSerializer(order, context={'request': request}).data)
 
     @action(detail=True, methods=['patch'], url_path='update-status/driver', permission_classes=[permissions.IsAuthenticated, IsDriverOfOrderPermission])
@@ -858,38 +1056,51 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         order = self.get_object() 
         new_status = request.data.get('status')
-        
-        allowed_statuses_by_driver = [Order.OrderStatus.ON_THE_WAY, Order.OrderStatus.DELIVERED, Order.OrderStatus.FAILED_DELIVERY]
-        
-        if new_status not in allowed_statuses_by_driver: 
-            return Response({"detail": f"Status invalid. Statuset e lejuara nga shoferi janë: {', '.join(allowed_statuses_by_driver)}"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Logjikë për tranzicionet e statusit
-        if order.status == Order.OrderStatus.CONFIRMED and new_status != Order.OrderStatus.ON_THE_WAY:
-            return Response({"detail": "Nga statusi 'CONFIRMED', hapi tjetër i lejuar është 'ON_THE_WAY'."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        if order.status == Order.OrderStatus.ON_THE_WAY and new_status not in [Order.OrderStatus.DELIVERED, Order.OrderStatus.FAILED_DELIVERY]:
-            return Response({"detail": "Nga statusi 'ON_THE_WAY', hapat e tjerë të lejuar janë 'DELIVERED' ose 'FAILED_DELIVERY'."}, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Parandalo ndryshimin e statusit nëse porosia tashmë është në një status final (p.sh., DELIVERED, CANCELLED)
-        if order.status in [Order.OrderStatus.DELIVERED, Order.OrderStatus.CANCELLED_BY_CUSTOMER, Order.OrderStatus.CANCELLED_BY_RESTAURANT, Order.OrderStatus.FAILED_DELIVERY]:
-             return Response({"detail": f"Porosia tashmë është në statusin '{order.get_status_display()}' dhe nuk mund të ndryshohet më tej nga shoferi."}, status=status.HTTP_400_BAD_REQUEST)
-
-        order.status = new_status
-        if new_status == Order.OrderStatus.DELIVERED:
-            order.actual_delivery_time = timezone.now()
-            if order.payment_method == Order.PaymentMethod.CASH_ON_DELIVERY:
-                order.payment_status = Order.PaymentStatus.PAID
-        order.save()
-
-        # Invalido cache
-        cache_utils.invalidate_cache_for_user_orders(order.customer)
-        if order.restaurant and order.restaurant.owner:
-            cache_utils.invalidate_cache_for_user_orders(order.restaurant.owner)
-        cache_utils.invalidate_cache_for_user_orders(request.user) # Shoferi
-
-        return Response(OrderDetailSerializer(order, context={'request': request}).data)
+        fields = {}
+        if new_status == Order.OrderStatus.DELIVERED and order.payment_method == Order.PaymentMethod.CASH_ON_DELIVERY:
+            fields['payment_status'] = Order.PaymentStatus.PAID
+        return self.transition_response(
+            request, order, new_status, Order.Actor.DRIVER, expected={'driver': request.user}, **fields,
+        )
     
+    @action(detail=False, methods=['get'], url_path='available-for-driver', permission_classes=[permissions.IsAuthenticated, IsDriverPermission])
+    def available_for_driver(self, request):
+        """
+        Porositë 'READY_FOR_PICKUP' pa shofer që shoferi mund të pranojë (lista e thjeshtë, pa paginim).
+        Me ?lat=&lon= (pozicioni i shoferit) kthehen ?k= (default 10, maks. 50) më të afërtat sipas
+        restorantit, nga grid-i në memorie (shih dispatch_grid), me `distance_km`; porositë e restoranteve
+        pa koordinata vijnë pas tyre. Pa pozicion kthehen më të vjetrat, si te claim-next.
+        """
+        params = request.query_params
+        try:
+            limit = int(params.get('k', self.AVAILABLE_FOR_DRIVER_DEFAULT))
+            location = None
+            if 'lat' in params or 'lon' in params:
+                location = (float(params['lat']), float(params['lon']))
+        except (KeyError, ValueError):
+            return Response({"detail": "Parametrat lat, lon dhe k duhet të jenë numra (lat dhe lon bashkë)."}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1 or (location and not (-90 <= location[0] <= 90 and -180 <= location[1] <= 180)):
+            return Response({"detail": "Vlerë e pavlefshme për lat, lon ose k."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(limit, self.AVAILABLE_FOR_DRIVER_MAX)
+
+        available = self.get_base_queryset().filter(status=Order.OrderStatus.READY_FOR_PICKUP, driver__isnull=True)
+        if location is None:
+            orders = available.order_by('ready_for_pickup_at', 'created_at', 'pk')[:limit]
+            return Response(OrderDetailSerializer(orders, many=True, context={'request': request}).data)
+
+        grid = dispatch_grid.ensure_fresh()
+        distances = {order_id: distance for distance, order_id in grid.nearest(location[0], location[1], limit)}
+        ranked_ids = [*distances, *grid.oldest_unlocated(limit - len(distances))]
+        # Grid-i mund të jetë disa sekonda prapa proceseve të tjera: databaza vendos cilat janë ende të lira
+        orders = available.order_by().in_bulk(ranked_ids)
+        data = []
+        for order_id in ranked_ids:
+            if order_id in orders:
+                item = OrderDetailSerializer(orders[order_id], context={'request': request}).data
+                item['distance_km'] = round(distances[order_id], 2) if order_id in distances else None
+                data.append(item)
+        return Response(data)
+
     @action(detail=False, methods=['get'], url_path='my-active-delivery', permission_classes=[permissions.IsAuthenticated, IsDriverPermission])
     def my_active_delivery(self, request):
         """
@@ -906,13 +1117,20 @@ class OrderViewSet(viewsets.ModelViewSet):
 
 class ReviewViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
+    pagination_class = SelectablePagination
     # permission_classes = [permissions.IsAuthenticatedOrReadOnly] # Default
 
     def get_queryset(self):
         # Kthe vlerësimet vetëm për restorantin e specifikuar në URL
         restaurant_pk = self.kwargs.get('restaurant_pk')
         if restaurant_pk:
-            return Review.objects.filter(restaurant_id=restaurant_pk)
+            # Autori dhe përgjigjet shfaqen me UserDetailSerializer (adresat, profili i shoferit)
+            replies = ReviewReply.objects.select_related('user__driver_profile').prefetch_related('user__addresses')
+            return (
+                Review.objects.filter(restaurant_id=restaurant_pk)
+                .select_related('user__driver_profile')
+                .prefetch_related('user__addresses', Prefetch('replies', queryset=replies))
+            )
         return Review.objects.none() # Ose hidh një gabim nëse nuk pritet të aksesohet pa restaurant_pk
 
     def get_permissions(self):
@@ -943,18 +1161,11 @@ class ReviewViewSet(viewsets.ModelViewSet):
         # Sigurohu që useri nuk po ndryshon restorantin ose përdoruesin e review-së
         # Kjo zakonisht bëhet duke i bërë ato fusha read_only në serializer për update
         # ose duke i hequr nga validated_data para se të thirret super().perform_update()
-        review = serializer.instance
         serializer.save(user=self.request.user) # Ruaj vetëm fushat e lejuara
-        # Invalido cache për listën e restoranteve pasi mund të ndryshojë average_rating
-        cache_utils.invalidate_restaurant_list_cache()
-        cache_utils.invalidate_restaurant_detail_cache(review.restaurant.id)
+        # Lista dhe detajet e restorantit invalidohen nga sinjali i Review (mund të ndryshojë average_rating)
     
     def perform_destroy(self, instance):
-        restaurant_pk = instance.restaurant.id
-        instance.delete()
-        # Invalido cache për listën e restoranteve pasi mund të ndryshojë average_rating
-        cache_utils.invalidate_restaurant_list_cache()
-        cache_utils.invalidate_restaurant_detail_cache(restaurant_pk)
+        instance.delete() # Cache-i invalidohet nga sinjali post_delete i Review
 
 
 class ReviewReplyViewSet(viewsets.ModelViewSet):
@@ -970,7 +1181,7 @@ class ReviewReplyViewSet(viewsets.ModelViewSet):
         # Kthe përgjigjet vetëm për vlerësimin e specifikuar në URL
         review_pk = self.kwargs.get('review_pk')
         if review_pk:
-            return ReviewReply.objects.filter(review_id=review_pk)
+            return ReviewReply.objects.filter(review_id=review_pk).select_related('user__driver_profile').prefetch_related('user__addresses')
         return ReviewReply.objects.none() # Ose hidh një gabim nëse nuk pritet të aksesohet pa review_pk
 
     def perform_create(self, serializer):
@@ -1017,5 +1228,29 @@ class DriverProfileViewSet(viewsets.ModelViewSet):
         # Useri nuk duhet të ndryshohet gjatë update.
         # Kjo sigurohet nga fakti që 'user' është primary_key dhe read_only pas krijimit,
         # ose nga logjika e lejeve.
-        serializer.save()
+        if {'current_location_lat', 'current_location_lon'} & set(serializer.validated_data):
+            serializer.save(location_updated_at=timezone.now()) # Dispatch-i injoron pozicionet e vjetra
+        else:
+            serializer.save()
+
+
+
+# --- Admin: Metrikat e cache-it ---
+class CacheMetricsAPIView(APIView):
+    """
+    Numëruesit e cache-it për çdo namespace (hit/miss, kohë mbushjeje, evictions,
+    invalidime sipas shkakut), të mbledhur nga të gjithë workers, bashkë me TTL-të aktuale.
+    """
+    permission_classes = [permissions.IsAdminUser]
 
+    def get(self, request):
+        return Response({
+            'namespaces': cache_metrics.metrics.snapshot(),
+            'ttls': {
+                cache_utils.NS_CUISINE_TYPES_LIST: cache_utils.CUISINE_TYPES_LIST_CACHE_TTL,
+                cache_utils.NS_RESTAURANTS_LIST_PUBLIC: cache_utils.RESTAURANT_LIST_CACHE_TTL,
+                cache_utils.NS_RESTAURANT_DETAIL: cache_utils.RESTAURANT_DETAIL_CACHE_TTL,
+                cache_utils.NS_RESTAURANT_MENU: cache_utils.RESTAURANT_MENU_CACHE_TTL,
+            },
+            'l1': cache_utils.local_cache.stats(), # Vetëm për procesin që u përgjigj
+        })
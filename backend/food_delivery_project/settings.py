@@ -1,8 +1,12 @@
 # backend/food_delivery_project/settings.py
 
+import atexit
+import os
+import shutil
+import sys
+import tempfile
 from pathlib import Path
 from datetime import timedelta
-# import os # Nëse do të përdorësh python-dotenv dhe os.getenv
 # from dotenv import load_dotenv # Nëse do të përdorësh python-dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.db_routing.ReplicaRoutingMiddleware', # Primare apo replikë për leximet e kësaj kërkese
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,9 +87,26 @@ DATABASES = {
         'PASSWORD': '',                 # Fjalëkalimi (bosh nëse nuk ka)
         'HOST': 'localhost',            # Ose '127.0.0.1'
         'PORT': '5432',                 # Porti standard
-    }
+    },
+    # Replikë vetëm-lexim (streaming replication). Lokalisht mund të jetë edhe një SQLite i dytë
+    # (p.sh. kopje e databazës) për të provuar drejtimin; në teste 'MIRROR' e lidh me 'default'.
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'food_delivery_db',
+    #     'USER': 'shpatmjeku',
+    #     'PASSWORD': '',
+    #     'HOST': 'replica.localhost',
+    #     'PORT': '5432',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+# Leximet e katalogut në kërkesat GET shkojnë te replikat; shkrimet dhe read-your-writes te 'default'
+# (shih api/db_routing.py). Pa replika të konfiguruara gjithçka mbetet te 'default'.
+DATABASE_ROUTERS = ['api.db_routing.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_PRIMARY_STICKY_SECONDS = 10 # Sa kohë pas një shkrimi përdoruesi lexon nga primarja (> vonesa e replikave)
+
 # Modeli i personalizuar i përdoruesit
 AUTH_USER_MODEL = 'api.User' # Ky duhet të jetë këtu para migrimit të parë me modelin User
 
@@ -120,10 +142,21 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # Caching Configuration
 # For a basic setup, we'll use local memory caching.
 # For production, consider using Redis or Memcached.
+# Cache i përbashkët mes të gjithë workers në të njëjtin host (skedar SQLite lokal).
+# LocMemCache është për çdo proces, kështu invalidimet nuk do t'i arrinin workers e tjerë.
+# Rruga mund të ndryshohet me API_CACHE_LOCATION; testet marrin një skedar të përkohshëm për çdo ekzekutim,
+# që të mos lexojnë çelësa të mbetur nga serveri i zhvillimit apo nga një ekzekutim tjetër.
+if len(sys.argv) > 1 and sys.argv[1] == 'test':
+    _test_cache_dir = tempfile.mkdtemp(prefix='food_delivery_cache_')
+    atexit.register(shutil.rmtree, _test_cache_dir, ignore_errors=True)
+    CACHE_LOCATION = os.path.join(_test_cache_dir, 'shared_cache.sqlite3')
+else:
+    CACHE_LOCATION = os.environ.get('API_CACHE_LOCATION', str(BASE_DIR / 'cache' / 'shared_cache.sqlite3'))
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake', # Emër unik për këtë instancë cache
+        'BACKEND': 'api.cache_backends.SQLiteSharedCache',
+        'LOCATION': CACHE_LOCATION,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
 }
 